@@ -1,8 +1,12 @@
 from flask import Flask
 from flask_cors import CORS
 from db import mysql
+from auth import load_principal
+import jobs
 from flasgger import Swagger
-from flask_socketio import SocketIO, emit
+from flask_socketio import emit
+import notifications
+from notifications import socketio
 import config
 from datetime import datetime
 import pytz
@@ -19,12 +23,13 @@ from routes.meal_routes import meal_bp
 from routes.community_routes import comm_bp
 from routes.testing import test_bp
 from routes.chat import chat_bp
+from routes.search_routes import search_bp
 
 app = Flask(__name__)
 CORS(app)
 
 swagger = Swagger(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+notifications.init_app(app)
 
 # loading google_application credentials from env variable
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
@@ -36,7 +41,13 @@ app.config['MYSQL_PASSWORD'] = config.MYSQL_PASSWORD
 app.config['MYSQL_DB'] = config.MYSQL_DB
 # app.config['MYSQL_PORT'] = 3306
 
+# session tokens
+app.config['SECRET_KEY'] = config.SECRET_KEY
+app.config['TOKEN_MAX_AGE'] = config.TOKEN_MAX_AGE
+app.before_request(load_principal)
+
 mysql.init_app(app)
+jobs.init_app(app)
 
 # Register routes
 app.register_blueprint(doctor_bp)
@@ -46,6 +57,7 @@ app.register_blueprint(test_bp)
 app.register_blueprint(meal_bp)
 app.register_blueprint(comm_bp)
 app.register_blueprint(chat_bp)
+app.register_blueprint(search_bp)
 
 @socketio.on('send_message')
 def handle_send_message(data):
@@ -0,0 +1,83 @@
+from flask import current_app, g, request
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+
+TOKEN_SALT = 'clinic-auth-token'
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=TOKEN_SALT)
+
+
+def issue_token(role, user_id=None, patient_id=None, doctor_id=None, pharmacy_id=None):
+    """
+    Sign a session token carrying everything a route needs to know about the caller,
+    so authenticated requests never have to look the USER row up again.
+    """
+    principal = {
+        'role': role,
+        'user_id': user_id,
+        'patient_id': patient_id,
+        'doctor_id': doctor_id,
+        'pharmacy_id': pharmacy_id
+    }
+    return _serializer().dumps(principal)
+
+
+def read_token(token):
+    """
+    The principal inside a session token.
+    Raises SignatureExpired or BadSignature for tokens that shouldn't be trusted.
+    """
+    return _serializer().loads(token, max_age=current_app.config['TOKEN_MAX_AGE'])
+
+
+def load_principal():
+    """
+    before_request hook: verify the bearer token (if any) and keep the principal on g.
+    An expired or invalid token is treated like no token at all, so a client holding a
+    stale one can still reach /login-* and the public routes and get a fresh token.
+    """
+    g.principal = None
+
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return None
+
+    token = header[len('Bearer '):].strip()
+    try:
+        g.principal = read_token(token)
+    except SignatureExpired:
+        print(f"expired session token on {request.path}; continuing without a principal")
+    except BadSignature:
+        print(f"invalid session token on {request.path}; continuing without a principal")
+    return None
+
+
+def current_principal():
+    return g.get('principal')
+
+
+def resolve_user_id(cursor, patient_id=None, doctor_id=None):
+    """
+    Map a patient_id or doctor_id to its USER id.
+    Uses the signed-in principal when it matches, and only falls back to a USER lookup otherwise.
+    """
+    principal = current_principal()
+    if principal and principal.get('user_id') is not None:
+        if patient_id and str(principal.get('patient_id')) == str(patient_id):
+            return principal['user_id']
+        if doctor_id and str(principal.get('doctor_id')) == str(doctor_id):
+            return principal['user_id']
+
+    if patient_id:
+        cursor.execute("SELECT user_id FROM USER WHERE patient_id = %s", (patient_id,))
+    elif doctor_id:
+        cursor.execute("SELECT user_id FROM USER WHERE doctor_id = %s", (doctor_id,))
+    else:
+        return None
+
+    row = cursor.fetchone()
+    if not row:
+        return None
+    # some callers use a DictCursor
+    return row['user_id'] if isinstance(row, dict) else row[0]
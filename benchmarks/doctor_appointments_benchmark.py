@@ -0,0 +1,195 @@
+"""
+Benchmark for the doctor appointment queries (/doc-appointments and friends).
+
+Builds a scratch database with just the columns these queries touch, fills it with
+--appointments rows, then prints EXPLAIN and timings for:
+
+  before  filter through PATIENT.doctor_id, INNER JOIN MEAL_PLAN
+  after   filter on PATIENT_APPOINTMENT.doctor_id, LEFT JOIN MEAL_PLAN,
+          with and without the (doctor_id, appointment_datetime) index
+
+Needs a MySQL 8 account allowed to create the scratch database (it is dropped
+and recreated on every run; never point it at clinic_db). Run from the repo root:
+
+    python -m benchmarks.doctor_appointments_benchmark [--appointments 1000000] [--doctors 500]
+"""
+import argparse
+import statistics
+import time
+
+import MySQLdb
+
+import config
+
+SCHEMA = [
+    """
+    CREATE TABLE MEAL_PLAN (
+        meal_plan_id INT AUTO_INCREMENT PRIMARY KEY,
+        meal_plan_title VARCHAR(100)
+    )
+    """,
+    """
+    CREATE TABLE PATIENT (
+        patient_id INT AUTO_INCREMENT PRIMARY KEY,
+        doctor_id INT,
+        first_name VARCHAR(50),
+        last_name VARCHAR(50),
+        KEY idx_patient_doctor (doctor_id)
+    )
+    """,
+    # same keys as production before this change: the doctor_id FK index only
+    """
+    CREATE TABLE PATIENT_APPOINTMENT (
+        patient_appt_id INT AUTO_INCREMENT PRIMARY KEY,
+        patient_id INT NOT NULL,
+        doctor_id INT NOT NULL,
+        appointment_datetime DATETIME NOT NULL,
+        reason_for_visit TEXT,
+        current_medications TEXT,
+        exercise_frequency VARCHAR(255),
+        doctor_appointment_note TEXT,
+        accepted TINYINT DEFAULT 0,
+        appt_status TINYINT DEFAULT 0,
+        meal_prescribed INT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        KEY idx_appt_patient (patient_id),
+        KEY idx_appt_doctor (doctor_id)
+    )
+    """,
+    "CREATE TABLE DIGITS (d INT PRIMARY KEY)",
+]
+
+COLUMNS = """
+    pa.patient_appt_id, pa.patient_id, pa.appointment_datetime, pa.reason_for_visit,
+    pa.current_medications, pa.exercise_frequency, pa.doctor_appointment_note,
+    pa.accepted, pa.created_at, pa.updated_at,
+    p.first_name AS patient_first_name, p.last_name AS patient_last_name,
+    mp.meal_plan_title AS meal_prescribed
+"""
+
+QUERIES = {
+    'before': f"""
+        SELECT {COLUMNS}
+        FROM PATIENT_APPOINTMENT pa
+        JOIN PATIENT p ON pa.patient_id = p.patient_id
+        JOIN MEAL_PLAN mp ON pa.meal_prescribed = mp.meal_plan_id
+        WHERE p.doctor_id = %s
+        ORDER BY pa.appointment_datetime DESC
+    """,
+    'after': f"""
+        SELECT {COLUMNS}
+        FROM PATIENT_APPOINTMENT pa
+        JOIN PATIENT p ON pa.patient_id = p.patient_id
+        LEFT JOIN MEAL_PLAN mp ON pa.meal_prescribed = mp.meal_plan_id
+        WHERE pa.doctor_id = %s AND TRUE
+        ORDER BY pa.appointment_datetime DESC, pa.patient_appt_id
+    """,
+}
+
+
+def _seed(cursor, appointments, doctors, patients):
+    cursor.executemany("INSERT INTO DIGITS (d) VALUES (%s)", [(d,) for d in range(10)])
+    cursor.executemany("INSERT INTO MEAL_PLAN (meal_plan_title) VALUES (%s)",
+                       [(f"Plan {i}",) for i in range(1, 21)])
+
+    # n = 0 .. 10^6-1 from six copies of DIGITS
+    numbers = """
+        SELECT a.d + 10 * b.d + 100 * c.d + 1000 * d.d + 10000 * e.d + 100000 * f.d AS n
+        FROM DIGITS a, DIGITS b, DIGITS c, DIGITS d, DIGITS e, DIGITS f
+    """
+    cursor.execute(f"""
+        INSERT INTO PATIENT (patient_id, doctor_id, first_name, last_name)
+        SELECT n + 1, MOD(n, %s) + 1, CONCAT('First', n), CONCAT('Last', n)
+        FROM ({numbers}) nums
+        WHERE n < %s
+    """, (doctors, patients))
+
+    # appointments are with a random doctor, not necessarily the patient's assigned one,
+    # and a third of them have no meal plan
+    cursor.execute(f"""
+        INSERT INTO PATIENT_APPOINTMENT (patient_id, doctor_id, appointment_datetime, reason_for_visit,
+                                         accepted, appt_status, meal_prescribed)
+        SELECT MOD(n, %s) + 1,
+               FLOOR(RAND(n) * %s) + 1,
+               NOW() - INTERVAL 730 DAY + INTERVAL MOD(n, 1051200) MINUTE,
+               'Check-up',
+               MOD(n, 3),
+               IF(MOD(n, 5) = 0, 2, 0),
+               IF(MOD(n, 3) = 0, NULL, MOD(n, 20) + 1)
+        FROM ({numbers}) nums
+        WHERE n < %s
+    """, (patients, doctors, appointments))
+
+
+def _time(cursor, query, doctor_ids):
+    samples = []
+    for doctor_id in doctor_ids:
+        start = time.perf_counter()
+        cursor.execute(query, (doctor_id,))
+        rows = cursor.fetchall()
+        samples.append(((time.perf_counter() - start) * 1000, len(rows)))
+    return samples
+
+
+def _report(cursor, name, query, doctor_ids):
+    cursor.execute("EXPLAIN " + query, (doctor_ids[0],))
+    columns = [desc[0] for desc in cursor.description]
+    print(f"\n{name}")
+    for row in cursor.fetchall():
+        plan = dict(zip(columns, row))
+        print(f"  {plan['table']:<4} type={plan['type']:<7} key={plan['key']} rows={plan['rows']} "
+              f"extra={plan['Extra']}")
+
+    samples = _time(cursor, query, doctor_ids)
+    times = sorted(ms for ms, _ in samples)
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    rows = statistics.mean(count for _, count in samples)
+    print(f"  median {statistics.median(times):9.3f} ms   p95 {p95:9.3f} ms   avg rows {rows:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--appointments', type=int, default=1_000_000)
+    parser.add_argument('--doctors', type=int, default=500)
+    parser.add_argument('--patients', type=int, default=50_000)
+    parser.add_argument('--samples', type=int, default=20)
+    parser.add_argument('--database', default='clinic_benchmark')
+    args = parser.parse_args()
+    if args.database == config.MYSQL_DB:
+        parser.error("--database must be a scratch database, not the application's.")
+
+    connection = MySQLdb.connect(host=config.MYSQL_HOST, user=config.MYSQL_USER,
+                                 passwd=config.MYSQL_PASSWORD)
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{args.database}`")
+    cursor.execute(f"CREATE DATABASE `{args.database}`")
+    cursor.execute(f"USE `{args.database}`")
+    for statement in SCHEMA:
+        cursor.execute(statement)
+
+    start = time.perf_counter()
+    _seed(cursor, args.appointments, args.doctors, args.patients)
+    connection.commit()
+    cursor.execute("ANALYZE TABLE PATIENT, PATIENT_APPOINTMENT, MEAL_PLAN")
+    cursor.fetchall()
+    print(f"Seeded {args.appointments} appointments in {time.perf_counter() - start:.1f}s")
+
+    step = max(1, args.doctors // args.samples)
+    doctor_ids = list(range(1, args.doctors + 1, step))[:args.samples]
+
+    _report(cursor, "before: PATIENT.doctor_id + INNER JOIN MEAL_PLAN", QUERIES['before'], doctor_ids)
+    _report(cursor, "after: PATIENT_APPOINTMENT.doctor_id + LEFT JOIN MEAL_PLAN", QUERIES['after'], doctor_ids)
+
+    cursor.execute("CREATE INDEX idx_appt_doctor_datetime ON PATIENT_APPOINTMENT (doctor_id, appointment_datetime)")
+    cursor.execute("ANALYZE TABLE PATIENT_APPOINTMENT")
+    cursor.fetchall()
+    _report(cursor, "after + (doctor_id, appointment_datetime) index", QUERIES['after'], doctor_ids)
+
+    cursor.execute(f"DROP DATABASE `{args.database}`")
+    cursor.close()
+    connection.close()
+
+
+if __name__ == '__main__':
+    main()
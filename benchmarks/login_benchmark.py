@@ -0,0 +1,87 @@
+"""
+Micro-benchmark for login_service.authenticate.
+
+Runs against an in-memory cursor so only the service's own cost is measured
+(one query round trip is a dict lookup here). Run from the repo root:
+
+    python -m benchmarks.login_benchmark [--rounds 20] [--threads 8]
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from login_service import authenticate
+
+
+class FakeCursor:
+    """Answers the single email lookup authenticate() issues."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+        self._row = None
+
+    def execute(self, query, params):
+        self.queries += 1
+        self._row = self.rows.get(params[0])
+
+    def fetchone(self):
+        return self._row
+
+
+def _time(fn, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{name:<22} median {statistics.median(samples):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    password = "SecurePass123!"
+    # same cost factor the register endpoints use
+    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    rows = {
+        'legacy@example.com': (1, '$2a$04$legacyseedvalue', 1),
+        'modern@example.com': (1000, hashed, 1000),
+    }
+    cursor = FakeCursor(rows)
+
+    _report("legacy plaintext", _time(
+        lambda: authenticate(cursor, 'patient', 'legacy@example.com', '$2a$04$legacyseedvalue'), args.rounds))
+    _report("bcrypt success", _time(
+        lambda: authenticate(cursor, 'doctor', 'modern@example.com', password), args.rounds))
+    _report("bcrypt wrong password", _time(
+        lambda: authenticate(cursor, 'doctor', 'modern@example.com', 'nope'), args.rounds))
+    _report("unknown email", _time(
+        lambda: authenticate(cursor, 'pharmacy', 'missing@example.com', password), args.rounds))
+
+    # concurrent logins share the bounded bcrypt pool
+    total = args.rounds * args.threads
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(lambda _: authenticate(cursor, 'doctor', 'modern@example.com', password), range(total)))
+    elapsed = time.perf_counter() - start
+    print(f"{'concurrent bcrypt':<22} {total / elapsed:8.1f} logins/s with {args.threads} request threads")
+
+    per_login = cursor.queries / (4 * args.rounds + total)
+    print(f"queries per login: {per_login:.0f}")
+
+
+if __name__ == '__main__':
+    main()
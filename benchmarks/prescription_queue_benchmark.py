@@ -0,0 +1,236 @@
+"""
+Benchmark for the pharmacy prescription queues (/unfilled_prescriptions, /pickup, /pharmacy/<id>/queue).
+
+Builds a scratch database with just the columns these queries touch, fills it with
+--prescriptions rows, then prints EXPLAIN and timings for the first page of each status:
+
+  before  nullable filled/picked_up, filtered with (filled = 0 OR filled IS NULL),
+          idx_prescription_queue (filled, picked_up, created_at, prescription_id) only
+  after   NOT NULL filled/picked_up, equality filters, one (status, created_at, prescription_id)
+          index per status
+
+The "after" plans should read PATIENT_PRESCRIPTION through the status index with no
+"Using filesort", and join PATIENT_APPOINTMENT and PATIENT by primary key.
+
+Needs a MySQL 8 account allowed to create the scratch database (it is dropped
+and recreated on every run; never point it at clinic_db). Run from the repo root:
+
+    python -m benchmarks.prescription_queue_benchmark [--prescriptions 1000000] [--pharmacies 50]
+"""
+import argparse
+import statistics
+import time
+
+import MySQLdb
+
+import config
+
+SCHEMA = [
+    """
+    CREATE TABLE DOCTOR (
+        doctor_id INT AUTO_INCREMENT PRIMARY KEY,
+        first_name VARCHAR(50),
+        last_name VARCHAR(50)
+    )
+    """,
+    """
+    CREATE TABLE MEDICINE (
+        medicine_id INT AUTO_INCREMENT PRIMARY KEY,
+        medicine_name VARCHAR(100)
+    )
+    """,
+    """
+    CREATE TABLE PATIENT (
+        patient_id INT AUTO_INCREMENT PRIMARY KEY,
+        pharmacy_id INT,
+        first_name VARCHAR(50),
+        last_name VARCHAR(50),
+        KEY idx_patient_pharmacy (pharmacy_id, patient_id)
+    )
+    """,
+    """
+    CREATE TABLE PATIENT_APPOINTMENT (
+        patient_appt_id INT AUTO_INCREMENT PRIMARY KEY,
+        patient_id INT NOT NULL,
+        doctor_id INT NOT NULL
+    )
+    """,
+    # same columns and keys as production before this change
+    """
+    CREATE TABLE PATIENT_PRESCRIPTION (
+        prescription_id INT AUTO_INCREMENT PRIMARY KEY,
+        appt_id INT NOT NULL,
+        medicine_id INT NOT NULL,
+        quantity INT NOT NULL,
+        picked_up TINYINT DEFAULT 0,
+        filled TINYINT DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        KEY idx_prescription_queue (filled, picked_up, created_at, prescription_id),
+        KEY idx_prescription_created (created_at, prescription_id)
+    )
+    """,
+    "CREATE TABLE DIGITS (d INT PRIMARY KEY)",
+]
+
+MIGRATION = [
+    "UPDATE PATIENT_PRESCRIPTION SET filled = 0 WHERE filled IS NULL",
+    "UPDATE PATIENT_PRESCRIPTION SET picked_up = 0 WHERE picked_up IS NULL",
+    """
+    ALTER TABLE PATIENT_PRESCRIPTION
+        MODIFY filled TINYINT NOT NULL DEFAULT 0,
+        MODIFY picked_up TINYINT NOT NULL DEFAULT 0
+    """,
+    "CREATE INDEX idx_prescription_unfilled ON PATIENT_PRESCRIPTION (filled, created_at, prescription_id)",
+    "CREATE INDEX idx_prescription_picked_up ON PATIENT_PRESCRIPTION (picked_up, created_at, prescription_id)",
+]
+
+FILTERS = {
+    'before': {
+        'unfilled': "(pp.filled = 0 OR pp.filled IS NULL)",
+        'ready': "pp.filled = 1 AND (pp.picked_up = 0 OR pp.picked_up IS NULL)",
+        'picked_up': "pp.picked_up = 1",
+    },
+    'after': {
+        'unfilled': "pp.filled = 0",
+        'ready': "pp.filled = 1 AND pp.picked_up = 0",
+        'picked_up': "pp.picked_up = 1",
+    },
+}
+
+QUERY = """
+    SELECT
+        pp.prescription_id,
+        pp.created_at,
+        CONCAT(d.first_name, ' ', d.last_name) AS doctor_name,
+        CONCAT(p.first_name, ' ', p.last_name) AS patient_name,
+        m.medicine_name,
+        pp.quantity,
+        pp.filled,
+        pp.picked_up
+    FROM PATIENT_PRESCRIPTION pp
+    JOIN PATIENT_APPOINTMENT pa ON pp.appt_id = pa.patient_appt_id
+    JOIN PATIENT p ON pa.patient_id = p.patient_id
+    JOIN MEDICINE m ON pp.medicine_id = m.medicine_id
+    LEFT JOIN DOCTOR d ON pa.doctor_id = d.doctor_id
+    WHERE p.pharmacy_id = %s AND {status_filter}
+    ORDER BY pp.created_at, pp.prescription_id
+    LIMIT %s
+"""
+
+
+def _seed(cursor, prescriptions, pharmacies, patients):
+    cursor.executemany("INSERT INTO DIGITS (d) VALUES (%s)", [(d,) for d in range(10)])
+    cursor.executemany("INSERT INTO DOCTOR (first_name, last_name) VALUES (%s, %s)",
+                       [(f"First{i}", f"Last{i}") for i in range(1, 101)])
+    cursor.executemany("INSERT INTO MEDICINE (medicine_name) VALUES (%s)",
+                       [(f"Medicine {i}",) for i in range(1, 201)])
+
+    # n = 0 .. 10^6-1 from six copies of DIGITS
+    numbers = """
+        SELECT a.d + 10 * b.d + 100 * c.d + 1000 * d.d + 10000 * e.d + 100000 * f.d AS n
+        FROM DIGITS a, DIGITS b, DIGITS c, DIGITS d, DIGITS e, DIGITS f
+    """
+    cursor.execute(f"""
+        INSERT INTO PATIENT (patient_id, pharmacy_id, first_name, last_name)
+        SELECT n + 1, MOD(n, %s) + 1, CONCAT('First', n), CONCAT('Last', n)
+        FROM ({numbers}) nums
+        WHERE n < %s
+    """, (pharmacies, patients))
+    cursor.execute(f"""
+        INSERT INTO PATIENT_APPOINTMENT (patient_appt_id, patient_id, doctor_id)
+        SELECT n + 1, MOD(n, %s) + 1, MOD(n, 100) + 1
+        FROM ({numbers}) nums
+        WHERE n < %s
+    """, (patients, patients))
+
+    # most prescriptions are old and picked up; the newest tenth are still in the queues,
+    # and legacy rows carry NULL instead of 0
+    cursor.execute(f"""
+        INSERT INTO PATIENT_PRESCRIPTION (appt_id, medicine_id, quantity, filled, picked_up, created_at)
+        SELECT MOD(n, %s) + 1,
+               MOD(n, 200) + 1,
+               MOD(n, 60) + 1,
+               CASE WHEN n < %s * 0.9 THEN 1 WHEN MOD(n, 4) = 0 THEN 1
+                    WHEN MOD(n, 7) = 0 THEN NULL ELSE 0 END,
+               CASE WHEN n < %s * 0.9 THEN 1 WHEN MOD(n, 7) = 0 THEN NULL ELSE 0 END,
+               NOW() - INTERVAL 730 DAY + INTERVAL MOD(n, 1051200) MINUTE
+        FROM ({numbers}) nums
+        WHERE n < %s
+    """, (patients, prescriptions, prescriptions, prescriptions))
+
+
+def _analyze(cursor):
+    cursor.execute("ANALYZE TABLE PATIENT, PATIENT_APPOINTMENT, PATIENT_PRESCRIPTION")
+    cursor.fetchall()
+
+
+def _report(cursor, name, query, pharmacy_ids, limit):
+    cursor.execute("EXPLAIN " + query, (pharmacy_ids[0], limit + 1))
+    columns = [desc[0] for desc in cursor.description]
+    print(f"\n{name}")
+    for row in cursor.fetchall():
+        plan = dict(zip(columns, row))
+        print(f"  {plan['table']:<4} type={plan['type']:<7} key={plan['key']} rows={plan['rows']} "
+              f"extra={plan['Extra']}")
+
+    times = []
+    for pharmacy_id in pharmacy_ids:
+        start = time.perf_counter()
+        cursor.execute(query, (pharmacy_id, limit + 1))
+        cursor.fetchall()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(f"  median {statistics.median(times):9.3f} ms   p95 {p95:9.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--prescriptions', type=int, default=1_000_000)
+    parser.add_argument('--pharmacies', type=int, default=50)
+    parser.add_argument('--patients', type=int, default=50_000)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--samples', type=int, default=20)
+    parser.add_argument('--database', default='clinic_benchmark')
+    args = parser.parse_args()
+    if args.database == config.MYSQL_DB:
+        parser.error("--database must be a scratch database, not the application's.")
+
+    connection = MySQLdb.connect(host=config.MYSQL_HOST, user=config.MYSQL_USER,
+                                 passwd=config.MYSQL_PASSWORD)
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{args.database}`")
+    cursor.execute(f"CREATE DATABASE `{args.database}`")
+    cursor.execute(f"USE `{args.database}`")
+    for statement in SCHEMA:
+        cursor.execute(statement)
+
+    start = time.perf_counter()
+    _seed(cursor, args.prescriptions, args.pharmacies, args.patients)
+    connection.commit()
+    _analyze(cursor)
+    print(f"Seeded {args.prescriptions} prescriptions in {time.perf_counter() - start:.1f}s")
+
+    step = max(1, args.pharmacies // args.samples)
+    pharmacy_ids = list(range(1, args.pharmacies + 1, step))[:args.samples]
+
+    for status, status_filter in FILTERS['before'].items():
+        _report(cursor, f"before: {status}", QUERY.format(status_filter=status_filter),
+                pharmacy_ids, args.limit)
+
+    for statement in MIGRATION:
+        cursor.execute(statement)
+    connection.commit()
+    _analyze(cursor)
+
+    for status, status_filter in FILTERS['after'].items():
+        _report(cursor, f"after: {status}", QUERY.format(status_filter=status_filter),
+                pharmacy_ids, args.limit)
+
+    cursor.execute(f"DROP DATABASE `{args.database}`")
+    cursor.close()
+    connection.close()
+
+
+if __name__ == '__main__':
+    main()
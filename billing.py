@@ -0,0 +1,157 @@
+from collections import defaultdict
+from ledger import lock_balances, post_entries_for_patients
+import config
+
+# Batch billing: closes out many appointments with a handful of set-based statements
+# per chunk instead of ~6 queries per appointment through /patient/bill.
+# Each chunk is its own transaction, so locks on PATIENT rows are held briefly.
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def find_unbilled_appointments(cursor, date_from, date_to):
+    """
+    Appointment ids in [date_from, date_to] that have no PATIENT_BILL row yet.
+    """
+    cursor.execute("""
+        SELECT pa.patient_appt_id
+        FROM PATIENT_APPOINTMENT pa
+        LEFT JOIN PATIENT_BILL pb ON pb.appt_id = pa.patient_appt_id
+        WHERE pa.appointment_datetime >= %s
+          AND pa.appointment_datetime < %s + INTERVAL 1 DAY
+          AND pb.bill_id IS NULL
+        ORDER BY pa.patient_appt_id
+    """, (date_from, date_to))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _bill_chunk(cursor, appt_ids):
+    ids = tuple(appt_ids)
+
+    # doctor fee + prescription total for every still-unbilled appointment in one pass;
+    # a doctor without a fee set bills nothing for the visit itself
+    cursor.execute(f"""
+        SELECT pa.patient_appt_id, pa.patient_id, IFNULL(d.payment_fee, 0), IFNULL(rx.pharm_bill, 0)
+        FROM PATIENT_APPOINTMENT pa
+        JOIN DOCTOR d ON pa.doctor_id = d.doctor_id
+        LEFT JOIN (
+            SELECT pp.appt_id, SUM(pp.quantity * m.medicine_price) AS pharm_bill
+            FROM PATIENT_PRESCRIPTION pp
+            JOIN MEDICINE m ON pp.medicine_id = m.medicine_id
+            WHERE pp.appt_id IN ({_placeholders(ids)})
+            GROUP BY pp.appt_id
+        ) rx ON rx.appt_id = pa.patient_appt_id
+        LEFT JOIN PATIENT_BILL pb ON pb.appt_id = pa.patient_appt_id
+        WHERE pa.patient_appt_id IN ({_placeholders(ids)})
+          AND pb.bill_id IS NULL
+        ORDER BY pa.patient_id, pa.appointment_datetime, pa.patient_appt_id
+    """, ids + ids)
+    charges = cursor.fetchall()
+    if not charges:
+        return []
+
+    patient_ids = sorted({row[1] for row in charges})
+    balances = lock_balances(cursor, patient_ids)
+
+    # Billing any appointment means holding its patient's row, so now that we do, a locking
+    # read sees every bill committed since the plain read above (another batch, /patient/bill)
+    charged_ids = tuple(row[0] for row in charges)
+    cursor.execute(f"""
+        SELECT appt_id
+        FROM PATIENT_BILL
+        WHERE appt_id IN ({_placeholders(charged_ids)})
+        FOR SHARE
+    """, charged_ids)
+    already_billed = {row[0] for row in cursor.fetchall()}
+
+    # article numbering continues from each patient's existing bill count
+    cursor.execute(f"""
+        SELECT pa.patient_id, COUNT(*)
+        FROM PATIENT_BILL pb
+        JOIN PATIENT_APPOINTMENT pa ON pb.appt_id = pa.patient_appt_id
+        WHERE pa.patient_id IN ({_placeholders(patient_ids)})
+        GROUP BY pa.patient_id
+    """, tuple(patient_ids))
+    bill_counts = dict(cursor.fetchall())
+
+    bills = []
+    for appt_id, patient_id, doctor_bill, pharm_bill in charges:
+        if patient_id not in balances or appt_id in already_billed:
+            continue
+        bill_counts[patient_id] = bill_counts.get(patient_id, 0) + 1
+        doctor_bill = float(doctor_bill)
+        pharm_bill = float(pharm_bill)
+        bills.append({
+            "appt_id": appt_id,
+            "patient_id": patient_id,
+            "doctor_bill": doctor_bill,
+            "pharm_bill": pharm_bill,
+            "current_bill": doctor_bill + pharm_bill,
+            "article": f"Appt {bill_counts[patient_id]}"
+        })
+
+    if not bills:
+        return []
+
+    cursor.executemany("""
+        INSERT INTO PATIENT_BILL (appt_id, doctor_bill, pharm_bill, current_bill, article)
+        VALUES (%s, %s, %s, %s, %s)
+    """, [(b["appt_id"], b["doctor_bill"], b["pharm_bill"], b["current_bill"], b["article"]) for b in bills])
+
+    billed_ids = tuple(b["appt_id"] for b in bills)
+    cursor.execute(f"""
+        SELECT appt_id, bill_id
+        FROM PATIENT_BILL
+        WHERE appt_id IN ({_placeholders(billed_ids)})
+    """, billed_ids)
+    bill_ids = dict(cursor.fetchall())
+
+    entries_by_patient = defaultdict(list)
+    for bill in bills:
+        bill["bill_id"] = bill_ids.get(bill["appt_id"])
+        entries_by_patient[bill["patient_id"]].append({
+            "entry_type": "charge",
+            "amount": bill["current_bill"],
+            "bill_id": bill["bill_id"]
+        })
+
+    new_balances = post_entries_for_patients(cursor, balances, entries_by_patient)
+    for bill in bills:
+        bill["balance"] = float(new_balances[bill["patient_id"]])
+    return bills
+
+
+def bill_appointments(connection, appt_ids, chunk_size=None):
+    """
+    Bill every appointment in appt_ids that isn't billed yet.
+    Commits after each chunk. A failing chunk is rolled back and reported, and the remaining
+    chunks still run, so callers always learn exactly what was committed.
+    Returns (bills, skipped_appt_ids, failures); each failure is {"appt_ids": [...], "error": str}
+    for a chunk that was rolled back (re-running bills it; committed chunks are skipped).
+    """
+    chunk_size = chunk_size or config.BILLING_BATCH_SIZE
+    appt_ids = list(dict.fromkeys(appt_ids))
+
+    billed = []
+    failures = []
+    cursor = connection.cursor()
+    try:
+        for start in range(0, len(appt_ids), chunk_size):
+            chunk = appt_ids[start:start + chunk_size]
+            try:
+                bills = _bill_chunk(cursor, chunk)
+                connection.commit()
+            except Exception as e:
+                connection.rollback()
+                failures.append({"appt_ids": chunk, "error": str(e)})
+                continue
+            billed.extend(bills)
+    finally:
+        cursor.close()
+
+    handled = {b["appt_id"] for b in billed}
+    handled.update(appt_id for failure in failures for appt_id in failure["appt_ids"])
+    skipped = [appt_id for appt_id in appt_ids if appt_id not in handled]
+    return billed, skipped, failures
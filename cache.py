@@ -0,0 +1,157 @@
+from threading import RLock
+from cachetools import TTLCache
+from flask import Response, current_app
+import config
+
+
+class ResponseCache:
+    """
+    Small thread-safe TTL cache holding already-serialized JSON bodies.
+    A hit goes straight back to the client without rebuilding dicts or calling jsonify.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = RLock()
+
+    def get(self, key):
+        with self._lock:
+            return self._cache.get(key)
+
+    def set(self, key, body):
+        with self._lock:
+            self._cache[key] = body
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._cache.pop(key, None)
+
+    def invalidate_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._cache.keys() if k.startswith(prefix)]:
+                self._cache.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+class SharedResponseCache:
+    """
+    ResponseCache interface backed by Redis, so every worker process shares one copy and
+    one invalidation. Redis trouble degrades to a cache miss, never to a failed request.
+    """
+
+    def __init__(self, client, namespace, ttl):
+        self._client = client
+        self._namespace = f'{namespace}:'
+        self._ttl = ttl
+
+    def get(self, key):
+        try:
+            return self._client.get(self._namespace + key)
+        except Exception as e:
+            print(f"shared cache get {key} failed: {e}")
+            return None
+
+    def set(self, key, body):
+        try:
+            self._client.set(self._namespace + key, body, ex=self._ttl)
+        except Exception as e:
+            print(f"shared cache set {key} failed: {e}")
+
+    def invalidate(self, *keys):
+        if not keys:
+            return
+        try:
+            self._client.delete(*[self._namespace + key for key in keys])
+        except Exception as e:
+            print(f"shared cache invalidate {keys} failed: {e}")
+
+    def invalidate_prefix(self, prefix):
+        try:
+            keys = list(self._client.scan_iter(match=f'{self._namespace}{prefix}*'))
+            if keys:
+                self._client.delete(*keys)
+        except Exception as e:
+            print(f"shared cache invalidate {prefix}* failed: {e}")
+
+    def clear(self):
+        self.invalidate_prefix('')
+
+
+def make_cache(namespace, maxsize, ttl):
+    """
+    Shared Redis cache when CACHE_REDIS_URL is set and the redis package is installed,
+    otherwise an in-process ResponseCache.
+    """
+    if config.CACHE_REDIS_URL:
+        try:
+            import redis
+        except ImportError:
+            print("CACHE_REDIS_URL is set but redis isn't installed; using an in-process cache")
+        else:
+            return SharedResponseCache(redis.Redis.from_url(config.CACHE_REDIS_URL), namespace, ttl)
+    return ResponseCache(maxsize=maxsize, ttl=ttl)
+
+
+def to_json_bytes(data):
+    # same encoder jsonify uses, so cached and uncached responses look identical
+    return current_app.json.dumps(data).encode('utf-8') + b"\n"
+
+
+def json_response(body, status=200):
+    return Response(body, status=status, mimetype='application/json')
+
+
+# /doctors, /doctor/<id> and /top-doctors
+doctor_cache = ResponseCache(maxsize=config.DOCTOR_CACHE_SIZE, ttl=config.DOCTOR_CACHE_TTL)
+
+
+def invalidate_doctor(doctor_id=None):
+    """
+    Drop everything a change to a doctor row can show up in.
+    """
+    doctor_cache.invalidate('doctors', 'top-doctors')
+    if doctor_id is not None:
+        doctor_cache.invalidate(f'doctor:{doctor_id}')
+    else:
+        doctor_cache.invalidate_prefix('doctor:')
+
+
+# /doctor/<id>/cohort, keyed 'cohort:<doctor_id>:<days>'
+cohort_cache = ResponseCache(maxsize=config.COHORT_CACHE_SIZE, ttl=config.COHORT_CACHE_TTL)
+# patient_id -> doctor whose cached cohort includes them, so a survey write can find
+# the entry to drop without looking the patient up
+_cohort_doctors = {}
+_cohort_lock = RLock()
+
+
+def remember_cohort(doctor_id, patient_ids):
+    with _cohort_lock:
+        for patient_id in patient_ids:
+            _cohort_doctors[patient_id] = doctor_id
+
+
+def invalidate_cohort(doctor_id):
+    cohort_cache.invalidate_prefix(f'cohort:{doctor_id}:')
+
+
+def invalidate_patient_cohort(patient_id):
+    """
+    Drop the cached cohort a patient's surveys or doctor assignment show up in.
+    """
+    with _cohort_lock:
+        doctor_id = _cohort_doctors.pop(patient_id, None)
+    if doctor_id is not None:
+        invalidate_cohort(doctor_id)
+
+
+# /patient/<id> and /init-patient-survey/<id>; every route that changes PATIENT, USER or
+# PATIENT_INIT_SURVEY fields shown there calls invalidate_patient after committing
+patient_cache = make_cache('patient', maxsize=config.PATIENT_CACHE_SIZE, ttl=config.PATIENT_CACHE_TTL)
+
+
+def invalidate_patient(patient_id):
+    patient_cache.invalidate(f'patient:{patient_id}', f'patient-survey:{patient_id}')
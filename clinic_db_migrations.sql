@@ -0,0 +1,218 @@
+-- Schema changes applied on top of clinic_db_create.sql / the live clinic_db.
+-- Run in order; each section notes what it supports.
+USE clinic_db;
+
+-- /top-doctors: ORDER BY doctor_rating DESC LIMIT 3 reads the index instead of sorting DOCTOR
+CREATE INDEX idx_doctor_rating ON DOCTOR (doctor_rating);
+
+-- /doctors/search: equality filters lead, the sort column (+ doctor_id tiebreak) follows
+-- so each page is an index range read of LIMIT rows
+CREATE INDEX idx_doctor_specialty_rating ON DOCTOR (specialty, accepting_patients, doctor_rating, doctor_id);
+CREATE INDEX idx_doctor_specialty_fee ON DOCTOR (specialty, accepting_patients, payment_fee, doctor_id);
+CREATE INDEX idx_doctor_location_rating ON DOCTOR (state, city, accepting_patients, doctor_rating, doctor_id);
+CREATE INDEX idx_doctor_location_fee ON DOCTOR (state, city, accepting_patients, payment_fee, doctor_id);
+CREATE INDEX idx_doctor_zipcode ON DOCTOR (zipcode, accepting_patients);
+CREATE INDEX idx_doctor_fee ON DOCTOR (payment_fee, doctor_id);
+
+-- /search: FULLTEXT indexes backing MATCH ... AGAINST (InnoDB keeps them current on every write)
+CREATE FULLTEXT INDEX ft_doctor_description ON DOCTOR (description);
+CREATE FULLTEXT INDEX ft_post_description ON COMMUNITY_POST (description);
+CREATE FULLTEXT INDEX ft_meal_description ON MEAL (meal_description);
+
+-- running rating totals; rate_appointment keeps them current, doctor_rating = rating_sum / rating_count.
+-- The UPDATE is the same backfill `flask --app app reconcile-ratings` runs (jobs.py).
+ALTER TABLE DOCTOR
+    ADD COLUMN rating_sum DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    ADD COLUMN rating_count INT NOT NULL DEFAULT 0;
+
+UPDATE DOCTOR d
+LEFT JOIN (
+    SELECT doctor_id, SUM(appt_rating) AS rating_sum, COUNT(appt_rating) AS rating_count
+    FROM PATIENT_APPOINTMENT
+    WHERE appt_rating IS NOT NULL
+    GROUP BY doctor_id
+) r ON r.doctor_id = d.doctor_id
+SET d.rating_sum = COALESCE(r.rating_sum, 0),
+    d.rating_count = COALESCE(r.rating_count, 0),
+    d.doctor_rating = COALESCE(r.rating_sum / r.rating_count, d.doctor_rating);
+
+-- append-only billing ledger; PATIENT.acct_balance mirrors the latest balance_after.
+-- `flask --app app verify-ledger` checks the three stay in agreement.
+CREATE TABLE PATIENT_LEDGER (
+    entry_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    patient_id INT NOT NULL,
+    entry_type ENUM('charge', 'credit') NOT NULL,
+    bill_id INT NULL,
+    credit_id INT NULL,
+    amount DECIMAL(10, 2) NOT NULL, -- signed: charges negative, credits positive
+    balance_after DECIMAL(12, 2) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (patient_id) REFERENCES PATIENT(patient_id) ON DELETE CASCADE,
+    INDEX idx_ledger_patient (patient_id, entry_id),
+    INDEX idx_ledger_patient_created (patient_id, created_at, entry_id)
+);
+
+-- backfill from existing bills and credits in created_at order
+INSERT INTO PATIENT_LEDGER (patient_id, entry_type, bill_id, credit_id, amount, balance_after, created_at)
+SELECT patient_id, entry_type, bill_id, credit_id, amount,
+       SUM(amount) OVER (PARTITION BY patient_id ORDER BY created_at, entry_type, source_id
+                         ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW),
+       created_at
+FROM (
+    SELECT pa.patient_id, 'charge' AS entry_type, pb.bill_id, NULL AS credit_id,
+           -pb.charge AS amount, pb.created_at, pb.bill_id AS source_id
+    FROM PATIENT_BILL pb
+    JOIN PATIENT_APPOINTMENT pa ON pb.appt_id = pa.patient_appt_id
+    UNION ALL
+    SELECT pc.patient_id, 'credit', NULL, pc.credit_id,
+           pc.amount, pc.created_at, pc.credit_id
+    FROM PATIENT_CREDIT pc
+) entries
+ORDER BY patient_id, created_at, entry_type, source_id;
+
+UPDATE PATIENT p
+LEFT JOIN (
+    SELECT patient_id, SUM(amount) AS balance
+    FROM PATIENT_LEDGER
+    GROUP BY patient_id
+) l ON l.patient_id = p.patient_id
+SET p.acct_balance = IFNULL(l.balance, 0);
+
+-- batch billing: find a day's appointments and check "already billed" by index
+CREATE INDEX idx_appt_datetime ON PATIENT_APPOINTMENT (appointment_datetime);
+CREATE INDEX idx_prescription_appt ON PATIENT_PRESCRIPTION (appt_id, medicine_id);
+
+-- one stock row per (pharmacy, medicine) so /stock/bulk can upsert with ON DUPLICATE KEY UPDATE.
+-- Existing duplicates are folded into the oldest row first.
+UPDATE MEDICINE_STOCK ms
+JOIN (
+    SELECT MIN(stock_id) AS keep_id, SUM(stock_count) AS total
+    FROM MEDICINE_STOCK
+    GROUP BY pharmacy_id, medicine_id
+    HAVING COUNT(*) > 1
+) dup ON ms.stock_id = dup.keep_id
+SET ms.stock_count = dup.total;
+
+DELETE ms FROM MEDICINE_STOCK ms
+JOIN (
+    SELECT pharmacy_id, medicine_id, MIN(stock_id) AS keep_id
+    FROM MEDICINE_STOCK
+    GROUP BY pharmacy_id, medicine_id
+    HAVING COUNT(*) > 1
+) dup ON ms.pharmacy_id = dup.pharmacy_id
+     AND ms.medicine_id = dup.medicine_id
+     AND ms.stock_id <> dup.keep_id;
+
+ALTER TABLE MEDICINE_STOCK ADD UNIQUE KEY uq_stock_pharmacy_medicine (pharmacy_id, medicine_id);
+
+-- precomputed shortages, rebuilt by `flask --app app refresh-stock-risk`
+CREATE TABLE STOCK_AT_RISK (
+    pharmacy_id INT NOT NULL,
+    medicine_id INT NOT NULL,
+    stock_count INT NOT NULL,
+    pending_quantity INT NOT NULL,        -- sum of unfilled prescription quantities
+    pending_prescriptions INT NOT NULL,
+    projected_stock INT NOT NULL,         -- stock_count - pending_quantity
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (pharmacy_id, projected_stock, medicine_id),
+    UNIQUE KEY uq_risk_pharmacy_medicine (pharmacy_id, medicine_id)
+);
+
+-- lets the refresh read only unfilled prescriptions
+CREATE INDEX idx_prescription_filled ON PATIENT_PRESCRIPTION (filled, medicine_id);
+
+-- pharmacy work queues: walk prescriptions in (status, created_at) order and stop after a page
+CREATE INDEX idx_prescription_queue ON PATIENT_PRESCRIPTION (filled, picked_up, created_at, prescription_id);
+CREATE INDEX idx_prescription_created ON PATIENT_PRESCRIPTION (created_at, prescription_id);
+CREATE INDEX idx_patient_pharmacy ON PATIENT (pharmacy_id, patient_id);
+
+-- medication request worker: one row per published request, so redelivered messages are no-ops.
+-- NULL for prescriptions written before the worker existed.
+ALTER TABLE PATIENT_PRESCRIPTION ADD COLUMN request_key VARCHAR(64) NULL;
+ALTER TABLE PATIENT_PRESCRIPTION ADD UNIQUE KEY uq_prescription_request (request_key);
+
+-- doctor dashboards: /doctor/<id>/appointments reads one doctor's appointments in time order
+CREATE INDEX idx_appt_doctor_datetime ON PATIENT_APPOINTMENT (doctor_id, appointment_datetime);
+
+-- survey lists and analytics read one patient's surveys in date order
+CREATE INDEX idx_daily_patient_date ON PATIENT_DAILY_SURVEY (patient_id, date, ds_id);
+CREATE INDEX idx_weekly_patient_week ON PATIENT_WEEKLY (patient_id, week_start, ws_id);
+
+-- one survey per patient per day / week: keep the newest duplicate, then enforce it.
+-- The unique keys replace the plain (patient_id, date|week_start) indexes above.
+DELETE ds FROM PATIENT_DAILY_SURVEY ds
+JOIN PATIENT_DAILY_SURVEY newer
+  ON newer.patient_id = ds.patient_id AND newer.date = ds.date AND newer.ds_id > ds.ds_id;
+
+DELETE ws FROM PATIENT_WEEKLY ws
+JOIN PATIENT_WEEKLY newer
+  ON newer.patient_id = ws.patient_id AND newer.week_start = ws.week_start AND newer.ws_id > ws.ws_id;
+
+ALTER TABLE PATIENT_DAILY_SURVEY
+    ADD UNIQUE KEY uq_daily_patient_date (patient_id, date),
+    DROP INDEX idx_daily_patient_date;
+ALTER TABLE PATIENT_WEEKLY
+    ADD UNIQUE KEY uq_weekly_patient_week (patient_id, week_start),
+    DROP INDEX idx_weekly_patient_week;
+
+-- weekly weight/BMI series, kept current on every weekly write and edit-patient.
+-- Existing rows: flask --app app backfill-weekly-bmi
+ALTER TABLE PATIENT_WEEKLY
+    ADD COLUMN weight DECIMAL(6, 2) NULL,  -- lbs: initial survey weight + weight changes so far
+    ADD COLUMN bmi DECIMAL(4, 1) NULL;
+
+-- registration resolves a pharmacy by (zipcode, name) instead of scanning the TEXT address
+CREATE INDEX idx_pharmacy_lookup ON PHARMACY (zipcode, pharmacy_name);
+
+-- one bill per appointment, so concurrent billing can never charge an appointment twice.
+-- Existing duplicates: the oldest bill is kept, every later one gets a reversing ledger entry
+-- (a credit citing its bill_id, so the charge and reversal net to zero) and is then deleted.
+CREATE TEMPORARY TABLE duplicate_bills AS
+SELECT pb.bill_id
+FROM PATIENT_BILL pb
+JOIN (
+    SELECT appt_id, MIN(bill_id) AS keep_id
+    FROM PATIENT_BILL
+    GROUP BY appt_id
+    HAVING COUNT(*) > 1
+) dup ON pb.appt_id = dup.appt_id AND pb.bill_id <> dup.keep_id;
+
+INSERT INTO PATIENT_LEDGER (patient_id, entry_type, bill_id, credit_id, amount, balance_after)
+SELECT l.patient_id, 'credit', l.bill_id, NULL, -l.amount,
+       p.acct_balance + SUM(-l.amount) OVER (PARTITION BY l.patient_id ORDER BY l.entry_id)
+FROM PATIENT_LEDGER l
+JOIN duplicate_bills d ON d.bill_id = l.bill_id
+JOIN PATIENT p ON p.patient_id = l.patient_id
+WHERE l.entry_type = 'charge'
+ORDER BY l.patient_id, l.entry_id;
+
+UPDATE PATIENT p
+JOIN (
+    SELECT patient_id, SUM(amount) AS balance
+    FROM PATIENT_LEDGER
+    GROUP BY patient_id
+) l ON l.patient_id = p.patient_id
+SET p.acct_balance = l.balance;
+
+DELETE pb FROM PATIENT_BILL pb JOIN duplicate_bills d ON d.bill_id = pb.bill_id;
+DROP TEMPORARY TABLE duplicate_bills;
+
+ALTER TABLE PATIENT_BILL ADD UNIQUE KEY uq_bill_appt (appt_id);
+
+-- pharmacy work queues, take two: with filled/picked_up nullable the queues had to filter on
+-- (filled = 0 OR filled IS NULL), a range on the leading index column, so MySQL sorted the whole
+-- status before applying LIMIT. NOT NULL lets every status be an equality, and each status gets an
+-- index that is already in (created_at, prescription_id) order: the page is read in ORDER BY
+-- order, the pharmacy is checked per row through the PATIENT_APPOINTMENT/PATIENT primary keys,
+-- and the read stops once LIMIT rows match.
+--   unfilled:  filled = 0                   -> idx_prescription_unfilled
+--   ready:     filled = 1 AND picked_up = 0 -> idx_prescription_queue
+--   picked_up: picked_up = 1                -> idx_prescription_picked_up
+--   all:                                    -> idx_prescription_created
+UPDATE PATIENT_PRESCRIPTION SET filled = 0 WHERE filled IS NULL;
+UPDATE PATIENT_PRESCRIPTION SET picked_up = 0 WHERE picked_up IS NULL;
+ALTER TABLE PATIENT_PRESCRIPTION
+    MODIFY filled TINYINT NOT NULL DEFAULT 0,  -- 0 = false, 1 = true
+    MODIFY picked_up TINYINT NOT NULL DEFAULT 0;
+CREATE INDEX idx_prescription_unfilled ON PATIENT_PRESCRIPTION (filled, created_at, prescription_id);
+CREATE INDEX idx_prescription_picked_up ON PATIENT_PRESCRIPTION (picked_up, created_at, prescription_id);
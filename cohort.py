@@ -0,0 +1,89 @@
+from statistics import mean, median
+
+# Doctor cohort analytics: one grouped query gives a row per patient assigned to the doctor,
+# with their daily and weekly survey aggregates over the window; the cohort summary is
+# computed from those rows in Python (a doctor has at most a few hundred patients).
+
+LOW_ADHERENCE = 0.5
+
+COHORT_SQL = """
+    SELECT p.patient_id, p.first_name, p.last_name,
+           IFNULL(ds.surveys, 0) AS surveys,
+           ds.adherence,
+           ds.avg_heart_rate,
+           ds.resting_heart_rate,
+           ds.last_survey,
+           IFNULL(ws.weeks, 0) AS weeks,
+           ws.weight_change
+    FROM PATIENT p
+    LEFT JOIN (
+        SELECT d.patient_id,
+               COUNT(*) AS surveys,
+               AVG(d.follow_plan = 1) AS adherence,
+               AVG(d.heart_rate) AS avg_heart_rate,
+               MIN(d.heart_rate) AS resting_heart_rate,
+               MAX(d.date) AS last_survey
+        FROM PATIENT_DAILY_SURVEY d
+        JOIN PATIENT dp ON dp.patient_id = d.patient_id
+        WHERE dp.doctor_id = %s AND d.date >= CURDATE() - INTERVAL %s DAY
+        GROUP BY d.patient_id
+    ) ds ON ds.patient_id = p.patient_id
+    LEFT JOIN (
+        SELECT w.patient_id,
+               COUNT(*) AS weeks,
+               SUM(w.weight_change) AS weight_change
+        FROM PATIENT_WEEKLY w
+        JOIN PATIENT wp ON wp.patient_id = w.patient_id
+        WHERE wp.doctor_id = %s AND w.week_start >= CURDATE() - INTERVAL %s DAY
+        GROUP BY w.patient_id
+    ) ws ON ws.patient_id = p.patient_id
+    WHERE p.doctor_id = %s
+    ORDER BY p.patient_id
+"""
+
+
+def _number(value, digits=2):
+    return round(float(value), digits) if value is not None else None
+
+
+def _patient_row(row):
+    (patient_id, first_name, last_name, surveys, adherence, avg_heart_rate,
+     resting_heart_rate, last_survey, weeks, weight_change) = row
+    weight_change = _number(weight_change)
+    return {
+        "patient_id": patient_id,
+        "name": f"{first_name} {last_name}",
+        "surveys": surveys,
+        "adherence": _number(adherence),
+        "avg_heart_rate": _number(avg_heart_rate, 1),
+        "resting_heart_rate": resting_heart_rate,
+        "last_survey": last_survey.isoformat() if last_survey else None,
+        "weeks": weeks,
+        "weight_change": weight_change,
+        "weekly_weight_trend": round(weight_change / weeks, 2) if weeks and weight_change is not None else None,
+    }
+
+
+def _summary(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {"mean": round(mean(values), 2), "median": round(median(values), 2),
+            "min": min(values), "max": max(values)}
+
+
+def load_cohort(cursor, doctor_id, days):
+    cursor.execute(COHORT_SQL, (doctor_id, days, doctor_id, days, doctor_id))
+    patients = [_patient_row(row) for row in cursor.fetchall()]
+
+    cohort = {
+        "patients": len(patients),
+        "reporting": sum(1 for p in patients if p["surveys"]),
+        "adherence": _summary(p["adherence"] for p in patients),
+        "resting_heart_rate": _summary(p["resting_heart_rate"] for p in patients),
+        "weekly_weight_trend": _summary(p["weekly_weight_trend"] for p in patients),
+        "low_adherence": [p["patient_id"] for p in patients
+                          if p["adherence"] is not None and p["adherence"] < LOW_ADHERENCE],
+        "not_reporting": [p["patient_id"] for p in patients if not p["surveys"]],
+    }
+    return {"doctor_id": doctor_id, "days": days, "cohort": cohort, "patients": patients}
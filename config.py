@@ -1,9 +1,60 @@
 from dotenv import load_dotenv
 import os
+import sys
 
 load_dotenv()
 
 MYSQL_HOST = os.environ.get('MYSQL_HOST')
 MYSQL_USER = os.environ.get('MYSQL_USER')
 MYSQL_PASSWORD = os.environ.get('MYSQL_PASSWORD')
-MYSQL_DB = os.environ.get('MYSQL_DB')
\ No newline at end of file
+MYSQL_DB = os.environ.get('MYSQL_DB')
+
+# signing key for session tokens; every process serving the app must share the same one
+SECRET_KEY = os.environ.get('SECRET_KEY')
+if not SECRET_KEY:
+    print("WARNING: SECRET_KEY is not set. Using a random per-process key: session tokens will "
+          "not survive a restart and are not accepted across workers.", file=sys.stderr)
+    SECRET_KEY = os.urandom(32).hex()
+TOKEN_MAX_AGE = int(os.environ.get('TOKEN_MAX_AGE', 60 * 60 * 12))  # seconds
+# threads used for bcrypt hashing/checking at login and registration
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', 4))
+
+# doctor directory cache (/doctors, /doctor/<id>, /top-doctors)
+DOCTOR_CACHE_TTL = int(os.environ.get('DOCTOR_CACHE_TTL', 300))  # seconds
+DOCTOR_CACHE_SIZE = int(os.environ.get('DOCTOR_CACHE_SIZE', 1024))
+
+# appointments billed per transaction by the batch billing endpoint/command
+BILLING_BATCH_SIZE = int(os.environ.get('BILLING_BATCH_SIZE', 500))
+
+# largest stock import accepted by /stock/bulk
+STOCK_IMPORT_MAX_LINES = int(os.environ.get('STOCK_IMPORT_MAX_LINES', 5000))
+
+# a medicine is "at risk" when stock minus unfilled prescription demand drops below this
+STOCK_RISK_MARGIN = int(os.environ.get('STOCK_RISK_MARGIN', 10))
+
+# medication request worker (medication_worker.py)
+RABBITMQ_URL = os.environ.get('RABBITMQ_URL')
+MEDICATION_PREFETCH = int(os.environ.get('MEDICATION_PREFETCH', 100))  # unacked messages the broker hands out
+MEDICATION_ACK_BATCH = int(os.environ.get('MEDICATION_ACK_BATCH', 50))  # rows written and acked together
+MEDICATION_FLUSH_SECONDS = float(os.environ.get('MEDICATION_FLUSH_SECONDS', 1.0))  # max wait for a partial batch
+
+# extra connections for concurrent reads (patient dashboard)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+# rows per list section on /patient/<id>/dashboard
+DASHBOARD_SECTION_LIMIT = int(os.environ.get('DASHBOARD_SECTION_LIMIT', 5))
+
+# largest batch accepted by /surveys/sync
+SURVEY_SYNC_MAX_RECORDS = int(os.environ.get('SURVEY_SYNC_MAX_RECORDS', 500))
+
+# doctor cohort analytics cache (/doctor/<id>/cohort); survey writes invalidate it early
+COHORT_CACHE_TTL = int(os.environ.get('COHORT_CACHE_TTL', 900))  # seconds
+COHORT_CACHE_SIZE = int(os.environ.get('COHORT_CACHE_SIZE', 512))
+
+# patient profile cache (/patient/<id>, /init-patient-survey/<id>)
+PATIENT_CACHE_TTL = int(os.environ.get('PATIENT_CACHE_TTL', 600))  # seconds
+PATIENT_CACHE_SIZE = int(os.environ.get('PATIENT_CACHE_SIZE', 4096))
+# optional Redis (redis://host:6379/0) shared by all workers; needs the redis package
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+
+# background threads for profile picture uploads at registration
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', 2))
@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+from db import pool
+import config
+
+# /patient/<id>/dashboard: everything the app shows on open, read concurrently.
+# Each section is one bounded query on its own pooled connection; list sections fetch
+# limit + 1 rows so the client knows whether to offer "see all" (the full endpoints).
+
+_dashboard_pool = ThreadPoolExecutor(max_workers=config.DB_POOL_SIZE, thread_name_prefix='dashboard')
+
+PROFILE_SQL = """
+    SELECT p.patient_id, p.first_name, p.last_name, p.patient_email, p.profile_pic,
+           p.doctor_id, p.pharmacy_id, p.acct_balance, u.user_id
+    FROM PATIENT p
+    LEFT JOIN USER u ON u.patient_id = p.patient_id
+    WHERE p.patient_id = %s
+"""
+
+APPOINTMENT_COLUMNS = """
+    pa.patient_appt_id, pa.doctor_id, pa.appointment_datetime, pa.reason_for_visit,
+    pa.accepted, pa.appt_status,
+    CONCAT('Dr. ', d.first_name, ' ', d.last_name) AS doctor_name
+"""
+
+SECTION_SQL = {
+    'upcoming_appointments': f"""
+        SELECT {APPOINTMENT_COLUMNS}
+        FROM PATIENT_APPOINTMENT pa
+        JOIN DOCTOR d ON pa.doctor_id = d.doctor_id
+        WHERE pa.patient_id = %s AND pa.appointment_datetime >= NOW()
+        ORDER BY pa.appointment_datetime ASC
+        LIMIT %s
+    """,
+    'past_appointments': f"""
+        SELECT {APPOINTMENT_COLUMNS}
+        FROM PATIENT_APPOINTMENT pa
+        JOIN DOCTOR d ON pa.doctor_id = d.doctor_id
+        WHERE pa.patient_id = %s AND (pa.appointment_datetime < NOW() OR pa.appt_status = 2)
+        ORDER BY pa.appointment_datetime DESC
+        LIMIT %s
+    """,
+    'daily_surveys': """
+        SELECT ds_id, date, water_intake, calories_consumed, heart_rate, exercise, mood, follow_plan
+        FROM PATIENT_DAILY_SURVEY
+        WHERE patient_id = %s
+        ORDER BY date DESC
+        LIMIT %s
+    """,
+    'weekly_surveys': """
+        SELECT ws_id, week_start, blood_pressure, weight_change, weight, bmi
+        FROM PATIENT_WEEKLY
+        WHERE patient_id = %s
+        ORDER BY week_start DESC
+        LIMIT %s
+    """,
+    'meal_plans': """
+        SELECT mp.meal_plan_id, mp.meal_plan_title AS title, mp.meal_plan_name AS tag, mp.created_at
+        FROM USER u
+        JOIN MEAL_PLAN mp
+          ON mp.made_by = u.user_id
+          OR mp.meal_plan_id IN (SELECT meal_plan_id FROM PATIENT_PLANS WHERE user_id = u.user_id)
+        WHERE u.patient_id = %s
+        ORDER BY mp.created_at DESC
+        LIMIT %s
+    """,
+    'recent_ledger': """
+        SELECT entry_id, entry_type, bill_id, credit_id, amount, balance_after, created_at
+        FROM PATIENT_LEDGER
+        WHERE patient_id = %s
+        ORDER BY entry_id DESC
+        LIMIT %s
+    """,
+}
+
+
+def _fetch(query, params):
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            columns = [desc[0] for desc in cursor.description]
+        finally:
+            cursor.close()
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def _section(name, patient_id, limit):
+    rows = _fetch(SECTION_SQL[name], (patient_id, limit + 1))
+    return {"items": rows[:limit], "has_more": len(rows) > limit}
+
+
+def load_dashboard(patient_id, limit=None):
+    """
+    The patient's dashboard payload, or None if the patient doesn't exist.
+    Sections run in parallel; the first failing section's error is re-raised.
+    """
+    limit = limit or config.DASHBOARD_SECTION_LIMIT
+    profile = _dashboard_pool.submit(_fetch, PROFILE_SQL, (patient_id,))
+    sections = {
+        name: _dashboard_pool.submit(_section, name, patient_id, limit)
+        for name in SECTION_SQL
+    }
+
+    profile_rows = profile.result()
+    results = {name: future.result() for name, future in sections.items()}
+    if not profile_rows:
+        return None
+    return {"profile": profile_rows[0], **results}
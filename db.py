@@ -1,3 +1,73 @@
+from contextlib import contextmanager
+from queue import Queue, Empty, Full
+import MySQLdb
 from flask_mysqldb import MySQL
+import config
 
-mysql = MySQL()
\ No newline at end of file
+mysql = MySQL()
+
+
+class ConnectionPool:
+    """
+    Small pool of MySQLdb connections for work that runs outside the request's own
+    connection (flask_mysqldb gives one connection per app context, so worker threads
+    can't share it). Connections are autocommit, so every read sees fresh data.
+    """
+
+    def __init__(self, size, timeout=5):
+        self.size = size
+        self.timeout = timeout
+        self._idle = Queue(maxsize=size)
+        self._slots = Queue(maxsize=size)
+        for _ in range(size):
+            self._slots.put(None)
+
+    def _connect(self):
+        return MySQLdb.connect(
+            host=config.MYSQL_HOST,
+            user=config.MYSQL_USER,
+            passwd=config.MYSQL_PASSWORD,
+            db=config.MYSQL_DB,
+            autocommit=True
+        )
+
+    def _checkout(self):
+        try:
+            connection = self._idle.get_nowait()
+        except Empty:
+            connection = None
+        if connection is not None:
+            try:
+                connection.ping()
+                return connection
+            except MySQLdb.Error:
+                connection.close()
+        return self._connect()
+
+    @contextmanager
+    def connection(self):
+        # a slot per live connection caps how many exist at once
+        try:
+            self._slots.get(timeout=self.timeout)
+        except Empty:
+            raise RuntimeError("Timed out waiting for a database connection.")
+
+        connection = None
+        try:
+            connection = self._checkout()
+            yield connection
+        except MySQLdb.Error:
+            if connection is not None:
+                connection.close()
+                connection = None
+            raise
+        finally:
+            if connection is not None:
+                try:
+                    self._idle.put_nowait(connection)
+                except Full:
+                    connection.close()
+            self._slots.put(None)
+
+
+pool = ConnectionPool(config.DB_POOL_SIZE)
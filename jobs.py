@@ -0,0 +1,185 @@
+import time
+import click
+from flask.cli import with_appcontext
+from db import mysql
+from ledger import VERIFY_LEDGER_SQL
+from billing import bill_appointments, find_unbilled_appointments
+from surveys import refresh_weekly_series
+import config
+
+# Recomputes DOCTOR.rating_sum/rating_count from the appointment ratings themselves.
+# Doctors without rated appointments keep whatever doctor_rating they were seeded with.
+RECONCILE_RATINGS_SQL = """
+    UPDATE DOCTOR d
+    LEFT JOIN (
+        SELECT doctor_id, SUM(appt_rating) AS rating_sum, COUNT(appt_rating) AS rating_count
+        FROM PATIENT_APPOINTMENT
+        WHERE appt_rating IS NOT NULL
+        GROUP BY doctor_id
+    ) r ON r.doctor_id = d.doctor_id
+    SET d.rating_sum = COALESCE(r.rating_sum, 0),
+        d.rating_count = COALESCE(r.rating_count, 0),
+        d.doctor_rating = COALESCE(r.rating_sum / r.rating_count, d.doctor_rating)
+"""
+
+
+@click.command('reconcile-ratings')
+@with_appcontext
+def reconcile_ratings():
+    """Rebuild every doctor's rating totals from PATIENT_APPOINTMENT."""
+    cursor = mysql.connection.cursor()
+    try:
+        cursor.execute(RECONCILE_RATINGS_SQL)
+        changed = cursor.rowcount
+        mysql.connection.commit()
+        click.echo(f"Reconciled ratings; {changed} doctor(s) were out of date.")
+    except Exception:
+        mysql.connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+@click.command('verify-ledger')
+@with_appcontext
+def verify_ledger():
+    """Check every patient's acct_balance against PATIENT_LEDGER and the bill/credit tables."""
+    cursor = mysql.connection.cursor()
+    try:
+        cursor.execute(VERIFY_LEDGER_SQL)
+        mismatches = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    for patient_id, acct_balance, ledger_total, last_balance_after, source_total in mismatches:
+        click.echo(f"patient {patient_id}: acct_balance={acct_balance} ledger_total={ledger_total} "
+                   f"last_balance_after={last_balance_after} bills_and_credits={source_total}")
+
+    if mismatches:
+        raise click.ClickException(f"{len(mismatches)} patient balance(s) out of sync.")
+    click.echo("Ledger verified; all patient balances match.")
+
+
+@click.command('bill-appointments')
+@click.option('--from', 'date_from', type=click.DateTime(formats=['%Y-%m-%d']), help='First appointment day.')
+@click.option('--to', 'date_to', type=click.DateTime(formats=['%Y-%m-%d']), help='Last appointment day.')
+@click.option('--appt-id', 'appt_ids', type=int, multiple=True, help='Bill specific appointments (repeatable).')
+@with_appcontext
+def bill_appointments_command(date_from, date_to, appt_ids):
+    """Bill every unbilled appointment in a date range, or the given appointment ids."""
+    appt_ids = list(appt_ids)
+    if not appt_ids:
+        if not date_from or not date_to:
+            raise click.UsageError("Pass --appt-id or both --from and --to.")
+        cursor = mysql.connection.cursor()
+        try:
+            appt_ids = find_unbilled_appointments(cursor, date_from.date(), date_to.date())
+        finally:
+            cursor.close()
+
+    bills, skipped, failures = bill_appointments(mysql.connection, appt_ids)
+    total = sum(b["current_bill"] for b in bills)
+    click.echo(f"Billed {len(bills)} appointment(s) for {len({b['patient_id'] for b in bills})} patient(s), "
+               f"total {total:.2f}; skipped {len(skipped)}.")
+    for failure in failures:
+        click.echo(f"Failed, rolled back: appointments {failure['appt_ids']}: {failure['error']}", err=True)
+    if failures:
+        raise click.ClickException(f"{len(failures)} chunk(s) failed; re-run to bill them.")
+
+
+# Unfilled prescription demand per (pharmacy, medicine) against what's on the shelf.
+# Anything projected to end below STOCK_RISK_MARGIN lands in STOCK_AT_RISK.
+REFRESH_STOCK_RISK_SQL = """
+    INSERT INTO STOCK_AT_RISK (pharmacy_id, medicine_id, stock_count, pending_quantity,
+                               pending_prescriptions, projected_stock)
+    SELECT demand.pharmacy_id, demand.medicine_id,
+           IFNULL(ms.stock_count, 0),
+           demand.pending_quantity,
+           demand.pending_prescriptions,
+           IFNULL(ms.stock_count, 0) - demand.pending_quantity
+    FROM (
+        SELECT p.pharmacy_id, pp.medicine_id,
+               SUM(pp.quantity) AS pending_quantity,
+               COUNT(*) AS pending_prescriptions
+        FROM PATIENT_PRESCRIPTION pp
+        JOIN PATIENT_APPOINTMENT pa ON pp.appt_id = pa.patient_appt_id
+        JOIN PATIENT p ON pa.patient_id = p.patient_id
+        WHERE pp.filled = 0
+          AND p.pharmacy_id IS NOT NULL
+        GROUP BY p.pharmacy_id, pp.medicine_id
+    ) demand
+    LEFT JOIN MEDICINE_STOCK ms
+      ON ms.pharmacy_id = demand.pharmacy_id AND ms.medicine_id = demand.medicine_id
+    WHERE IFNULL(ms.stock_count, 0) - demand.pending_quantity < %s
+"""
+
+
+def refresh_stock_risk_once():
+    """Rebuild STOCK_AT_RISK in one transaction; readers see the old or the new set, never half."""
+    cursor = mysql.connection.cursor()
+    try:
+        cursor.execute("DELETE FROM STOCK_AT_RISK")
+        cursor.execute(REFRESH_STOCK_RISK_SQL, (config.STOCK_RISK_MARGIN,))
+        at_risk = cursor.rowcount
+        mysql.connection.commit()
+        return at_risk
+    except Exception:
+        mysql.connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+@click.command('refresh-stock-risk')
+@click.option('--interval', type=int, default=0,
+              help='Keep running and refresh every N seconds (0 = refresh once and exit).')
+@with_appcontext
+def refresh_stock_risk(interval):
+    """Recompute which pharmacy stock rows can't cover their unfilled prescriptions."""
+    while True:
+        at_risk = refresh_stock_risk_once()
+        click.echo(f"Stock risk refreshed; {at_risk} medicine(s) at risk.")
+        if interval <= 0:
+            break
+        time.sleep(interval)
+
+
+@click.command('backfill-weekly-bmi')
+@click.option('--batch-size', type=int, default=200, help='Patients recomputed per transaction.')
+@with_appcontext
+def backfill_weekly_bmi(batch_size):
+    """Fill PATIENT_WEEKLY.weight/bmi for existing weekly surveys, a batch of patients at a time."""
+    last_id = 0
+    patients = weeks = 0
+    cursor = mysql.connection.cursor()
+    try:
+        while True:
+            cursor.execute("""
+                SELECT DISTINCT patient_id
+                FROM PATIENT_WEEKLY
+                WHERE patient_id > %s
+                ORDER BY patient_id
+                LIMIT %s
+            """, (last_id, batch_size))
+            patient_ids = [row[0] for row in cursor.fetchall()]
+            if not patient_ids:
+                break
+            try:
+                weeks += refresh_weekly_series(cursor, patient_ids)
+                mysql.connection.commit()
+            except Exception:
+                mysql.connection.rollback()
+                raise
+            patients += len(patient_ids)
+            last_id = patient_ids[-1]
+    finally:
+        cursor.close()
+    click.echo(f"Backfilled weight/BMI for {patients} patient(s); {weeks} week(s) changed.")
+
+
+def init_app(app):
+    app.cli.add_command(reconcile_ratings)
+    app.cli.add_command(verify_ledger)
+    app.cli.add_command(bill_appointments_command)
+    app.cli.add_command(refresh_stock_risk)
+    app.cli.add_command(backfill_weekly_bmi)
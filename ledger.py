@@ -0,0 +1,155 @@
+from decimal import Decimal
+
+# PATIENT_LEDGER is append-only: every charge (PATIENT_BILL) and credit (PATIENT_CREDIT)
+# gets one row with its signed amount and the balance right after it.
+# PATIENT.acct_balance always equals the balance_after of the patient's latest entry,
+# so nothing ever has to SUM a patient's whole history again.
+#
+# Writers must hold the PATIENT row lock (lock_balance) from reading the balance
+# until their transaction commits.
+
+
+def _money(value):
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+
+def lock_balance(cursor, patient_id):
+    """
+    SELECT ... FOR UPDATE the patient's balance. Returns None if the patient doesn't exist.
+    """
+    cursor.execute("""
+        SELECT acct_balance
+        FROM PATIENT
+        WHERE patient_id = %s
+        FOR UPDATE
+    """, (patient_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return _money(row[0] or 0)
+
+
+def _ledger_rows(patient_id, balance, entries):
+    rows = []
+    for entry in entries:
+        amount = _money(entry['amount'])
+        signed = -amount if entry['entry_type'] == 'charge' else amount
+        balance += signed
+        rows.append((
+            patient_id, entry['entry_type'], entry.get('bill_id'), entry.get('credit_id'),
+            signed, balance
+        ))
+    return rows, balance
+
+
+_INSERT_LEDGER = """
+    INSERT INTO PATIENT_LEDGER (patient_id, entry_type, bill_id, credit_id, amount, balance_after)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+
+def post_entries(cursor, patient_id, balance, entries):
+    """
+    Append entries for one patient and move acct_balance once.
+    balance is what lock_balance returned; entries are dicts with
+    entry_type ('charge' or 'credit'), amount (positive), and bill_id or credit_id.
+    Returns the new balance.
+    """
+    rows, balance = _ledger_rows(patient_id, balance, entries)
+
+    if rows:
+        # MySQLdb turns executemany INSERT ... VALUES into a single multi-row INSERT
+        cursor.executemany(_INSERT_LEDGER, rows)
+
+        cursor.execute("""
+            UPDATE PATIENT
+            SET acct_balance = %s
+            WHERE patient_id = %s
+        """, (balance, patient_id))
+
+    return balance
+
+
+def lock_balances(cursor, patient_ids):
+    """
+    Batch form of lock_balance: {patient_id: balance} for the patients that exist.
+    Locks in patient_id order so concurrent batches can't deadlock each other.
+    """
+    patient_ids = sorted(set(patient_ids))
+    if not patient_ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(patient_ids))
+    cursor.execute(f"""
+        SELECT patient_id, acct_balance
+        FROM PATIENT
+        WHERE patient_id IN ({placeholders})
+        ORDER BY patient_id
+        FOR UPDATE
+    """, tuple(patient_ids))
+    return {row[0]: _money(row[1] or 0) for row in cursor.fetchall()}
+
+
+def post_entries_for_patients(cursor, balances, entries_by_patient):
+    """
+    Batch form of post_entries: one multi-row ledger INSERT for every patient,
+    then one acct_balance UPDATE per patient. Returns {patient_id: new balance}.
+    """
+    rows = []
+    new_balances = {}
+    for patient_id, entries in entries_by_patient.items():
+        patient_rows, new_balances[patient_id] = _ledger_rows(patient_id, balances[patient_id], entries)
+        rows.extend(patient_rows)
+
+    if rows:
+        cursor.executemany(_INSERT_LEDGER, rows)
+        cursor.executemany("""
+            UPDATE PATIENT
+            SET acct_balance = %s
+            WHERE patient_id = %s
+        """, [(balance, patient_id) for patient_id, balance in new_balances.items()])
+
+    return new_balances
+
+
+def post_entry(cursor, patient_id, balance, entry_type, amount, bill_id=None, credit_id=None):
+    return post_entries(cursor, patient_id, balance, [{
+        'entry_type': entry_type,
+        'amount': amount,
+        'bill_id': bill_id,
+        'credit_id': credit_id
+    }])
+
+
+# Rows come back for every patient whose stored balance, ledger total,
+# or source tables disagree. Used by `flask verify-ledger`.
+VERIFY_LEDGER_SQL = """
+    SELECT patient_id, acct_balance, ledger_total, last_balance_after, source_total
+    FROM (
+        SELECT p.patient_id,
+               IFNULL(p.acct_balance, 0) AS acct_balance,
+               IFNULL(l.ledger_total, 0) AS ledger_total,
+               IFNULL(last.balance_after, 0) AS last_balance_after,
+               IFNULL(c.credits, 0) - IFNULL(b.charges, 0) AS source_total
+        FROM PATIENT p
+        LEFT JOIN (
+            SELECT patient_id, SUM(amount) AS ledger_total, MAX(entry_id) AS last_entry_id
+            FROM PATIENT_LEDGER
+            GROUP BY patient_id
+        ) l ON l.patient_id = p.patient_id
+        LEFT JOIN PATIENT_LEDGER last ON last.entry_id = l.last_entry_id
+        LEFT JOIN (
+            SELECT patient_id, SUM(amount) AS credits
+            FROM PATIENT_CREDIT
+            GROUP BY patient_id
+        ) c ON c.patient_id = p.patient_id
+        LEFT JOIN (
+            SELECT pa.patient_id, SUM(pb.charge) AS charges
+            FROM PATIENT_BILL pb
+            JOIN PATIENT_APPOINTMENT pa ON pb.appt_id = pa.patient_appt_id
+            GROUP BY pa.patient_id
+        ) b ON b.patient_id = p.patient_id
+    ) totals
+    WHERE acct_balance <> ledger_total
+       OR ledger_total <> last_balance_after
+       OR ledger_total <> source_total
+"""
@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import jsonify
+from auth import issue_token
+import bcrypt
+import config
+
+# One entry per role that can log in. Every lookup is a single query on a UNIQUE email column
+# (plus the UNIQUE USER.<role>_id column for the join), so login never scans a table.
+# legacy_max_id: accounts seeded from clinic_insert.sql keep their password column as-is
+# and log in by typing it, so those ids are still compared as plain text.
+ROLES = {
+    'patient': {
+        'label': 'Patient',
+        'query': """
+            SELECT p.patient_id, p.patient_password, u.user_id
+            FROM PATIENT p
+            LEFT JOIN USER u ON u.patient_id = p.patient_id
+            WHERE p.patient_email = %s
+        """,
+        'legacy_max_id': 351
+    },
+    'doctor': {
+        'label': 'Doctor',
+        'query': """
+            SELECT d.doctor_id, d.password, u.user_id
+            FROM DOCTOR d
+            LEFT JOIN USER u ON u.doctor_id = d.doctor_id
+            WHERE d.email = %s
+        """,
+        'legacy_max_id': 50
+    },
+    'pharmacy': {
+        'label': 'Pharmacy',
+        'query': "SELECT pharmacy_id, password, NULL FROM PHARMACY WHERE email = %s",
+        'legacy_max_id': 10
+    }
+}
+
+# bcrypt releases the GIL, so a small pool lets hashes run in parallel
+# while capping how many cores login/registration can take at once
+_bcrypt_pool = ThreadPoolExecutor(max_workers=config.BCRYPT_WORKERS, thread_name_prefix='bcrypt')
+
+
+def _checkpw(password, stored_password):
+    try:
+        return bcrypt.checkpw(password, stored_password)
+    except ValueError:
+        # stored value isn't a bcrypt hash
+        return False
+
+
+def verify_password(password, stored_password):
+    if isinstance(stored_password, str):
+        stored_password = stored_password.encode('utf-8')
+    return _bcrypt_pool.submit(_checkpw, password.encode('utf-8'), stored_password).result()
+
+
+def hash_password(password):
+    return _bcrypt_pool.submit(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt()).result()
+
+
+def authenticate(cursor, role, email, password):
+    """
+    Look the account up by email and check the password.
+    Returns (account, error): account is a dict with id, user_id and legacy,
+    error is a (message, status code) pair.
+    """
+    settings = ROLES[role]
+
+    cursor.execute(settings['query'], (email,))
+    row = cursor.fetchone()
+    if not row:
+        return None, (f"{settings['label']} not found", 404)
+
+    account_id, stored_password, user_id = row
+    if stored_password is None or password is None:
+        return None, ("Invalid credentials", 401)
+
+    if isinstance(stored_password, bytes):
+        stored_password = stored_password.decode('utf-8')
+
+    # Legacy: seeded accounts compare as plaintext
+    if account_id <= settings['legacy_max_id'] and password == stored_password:
+        return {'id': account_id, 'user_id': user_id, 'legacy': True}, None
+
+    # Modern: compare using bcrypt
+    if verify_password(password, stored_password):
+        return {'id': account_id, 'user_id': user_id, 'legacy': False}, None
+
+    return None, ("Invalid credentials", 401)
+
+
+def login(cursor, role, email, password):
+    """
+    Shared body of the /login-<role> endpoints.
+    """
+    account, error = authenticate(cursor, role, email, password)
+    if error:
+        message, status = error
+        return jsonify({"error": message}), status
+
+    id_field = f"{role}_id"
+    token = issue_token(role, user_id=account['user_id'], **{id_field: account['id']})
+
+    body = {
+        "message": "Login successful (legacy plain text)" if account['legacy'] else "Login successful",
+        id_field: account['id'],
+        "token": token
+    }
+    if role != 'pharmacy':
+        body["user_id"] = account['user_id']
+    return jsonify(body), 200
@@ -0,0 +1,243 @@
+import json
+import hashlib
+import time
+import pika
+import MySQLdb
+from rabbitmq_utils import (
+    MEDICATION_QUEUE, NOTIFICATIONS_EXCHANGE,
+    declare_medication_queue, declare_notifications_exchange
+)
+from metrics import Metrics
+import config
+
+# Turns /request-prescription messages into PATIENT_PRESCRIPTION rows, which is what the
+# pharmacy work queues read. Messages are taken in batches: every row of a batch is written
+# in one transaction, and only after the commit is the whole batch acked with a single
+# multiple=True ack. A crash before the commit just means redelivery, and redelivery is
+# harmless because each request's key is UNIQUE on PATIENT_PRESCRIPTION.
+#
+# Messages that can never succeed (bad JSON, missing fields, unknown appointment or
+# medicine) are rejected without requeue and land in the dead-letter queue.
+
+worker_metrics = Metrics()
+
+REQUIRED_FIELDS = ('appt_id', 'medicine_id', 'quantity')
+
+ER_DUP_ENTRY = 1062
+ER_NO_REFERENCED_ROW = 1452
+
+_INSERT_PRESCRIPTION = """
+    INSERT INTO PATIENT_PRESCRIPTION (appt_id, medicine_id, quantity, request_key)
+    VALUES (%s, %s, %s, %s)
+"""
+
+
+class InvalidRequest(Exception):
+    """The message can't be turned into a prescription, however often it's retried."""
+
+
+def request_key(request):
+    """
+    Idempotency key for one prescription request. Publishers set request_id; messages queued
+    before that fall back to a digest of the prescription itself.
+    """
+    if request.get('request_id'):
+        return str(request['request_id'])[:64]
+    raw = f"{request['appt_id']}:{request['medicine_id']}:{request['quantity']}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def parse_request(body):
+    try:
+        request = json.loads(body)
+    except (TypeError, ValueError):
+        raise InvalidRequest("Message is not JSON.")
+    if not isinstance(request, dict) or any(request.get(f) is None for f in REQUIRED_FIELDS):
+        raise InvalidRequest("Missing required fields.")
+    try:
+        appt_id, medicine_id, quantity = (int(request[f]) for f in REQUIRED_FIELDS)
+    except (TypeError, ValueError):
+        raise InvalidRequest("appt_id, medicine_id and quantity must be integers.")
+    if quantity <= 0:
+        raise InvalidRequest("quantity must be positive.")
+    return {
+        'appt_id': appt_id,
+        'medicine_id': medicine_id,
+        'quantity': quantity,
+        'request_key': request_key(request)
+    }
+
+
+def _insert(cursor, request):
+    """
+    Insert one request inside the batch transaction. Returns True if a row was created,
+    False if this request was already processed. The savepoint keeps a rejected row from
+    taking the rest of the batch down with it.
+    """
+    cursor.execute("SAVEPOINT request")
+    try:
+        cursor.execute(_INSERT_PRESCRIPTION, (
+            request['appt_id'], request['medicine_id'], request['quantity'], request['request_key']
+        ))
+        return True
+    except MySQLdb.IntegrityError as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT request")
+        if e.args[0] == ER_DUP_ENTRY:
+            return False
+        if e.args[0] == ER_NO_REFERENCED_ROW:
+            raise InvalidRequest("Unknown appointment or medicine.")
+        raise
+
+
+def write_batch(connection, requests):
+    """
+    Write a batch of parsed requests in one transaction.
+    Returns ({index: request_key} of rows created, {index: reason} of rejected requests).
+    Transient database errors roll the whole batch back and propagate.
+    """
+    created = {}
+    rejected = {}
+    cursor = connection.cursor()
+    try:
+        for index, request in requests.items():
+            try:
+                if _insert(cursor, request):
+                    created[index] = request['request_key']
+            except InvalidRequest as e:
+                rejected[index] = str(e)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return created, rejected
+
+
+def created_prescriptions(connection, request_keys):
+    """
+    The new work-queue entries with the pharmacy and doctor they belong to, for notifications.
+    """
+    if not request_keys:
+        return []
+    placeholders = ', '.join(['%s'] * len(request_keys))
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT pp.prescription_id, pp.appt_id, pp.medicine_id, pp.quantity,
+                   p.pharmacy_id, pa.doctor_id, pa.patient_id
+            FROM PATIENT_PRESCRIPTION pp
+            JOIN PATIENT_APPOINTMENT pa ON pp.appt_id = pa.patient_appt_id
+            JOIN PATIENT p ON pa.patient_id = p.patient_id
+            WHERE pp.request_key IN ({placeholders})
+        """, tuple(request_keys))
+        columns = [desc[0] for desc in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def notify(channel, prescriptions):
+    for prescription in prescriptions:
+        if prescription['pharmacy_id'] is None:
+            continue
+        channel.basic_publish(
+            exchange=NOTIFICATIONS_EXCHANGE,
+            routing_key=f"pharmacy.{prescription['pharmacy_id']}",
+            body=json.dumps({'event': 'prescription_queued', **prescription}),
+            properties=pika.BasicProperties(content_type='application/json')
+        )
+
+
+class MedicationWorker:
+    def __init__(self, connect_db, prefetch=None, batch_size=None, flush_after=None):
+        self.connect_db = connect_db
+        self.prefetch = prefetch or config.MEDICATION_PREFETCH
+        # never wait for more messages than the broker will hand out unacked
+        self.batch_size = min(batch_size or config.MEDICATION_ACK_BATCH, self.prefetch)
+        self.flush_after = flush_after or config.MEDICATION_FLUSH_SECONDS
+        self.db = None
+        self.pending = []  # (delivery_tag, body) not yet written or acked
+
+    def _db(self):
+        if self.db is None:
+            self.db = self.connect_db()
+        return self.db
+
+    def flush(self, channel):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        started = time.perf_counter()
+
+        requests = {}
+        for index, (tag, body) in enumerate(batch):
+            try:
+                requests[index] = parse_request(body)
+            except InvalidRequest:
+                channel.basic_nack(delivery_tag=tag, requeue=False)
+                worker_metrics.incr('dead_lettered')
+
+        try:
+            created, rejected = write_batch(self._db(), requests)
+        except MySQLdb.OperationalError:
+            # lost the database: hand the batch back to the broker and reconnect next time
+            self.db = None
+            for index in requests:
+                channel.basic_nack(delivery_tag=batch[index][0], requeue=True)
+            worker_metrics.incr('requeued', len(requests))
+            raise
+
+        for index in rejected:
+            channel.basic_nack(delivery_tag=batch[index][0], requeue=False)
+        worker_metrics.incr('dead_lettered', len(rejected))
+
+        accepted = [index for index in requests if index not in rejected]
+        if accepted:
+            # one ack covers every still-unacked delivery up to the highest tag in the batch
+            channel.basic_ack(delivery_tag=batch[max(accepted)][0], multiple=True)
+        worker_metrics.incr('processed', len(created))
+        worker_metrics.incr('duplicates', len(accepted) - len(created))
+        worker_metrics.observe('batch', time.perf_counter() - started)
+
+        notify(channel, created_prescriptions(self._db(), list(created.values())))
+
+    def run(self, channel):
+        declare_medication_queue(channel)
+        declare_notifications_exchange(channel)
+        channel.basic_qos(prefetch_count=self.prefetch)
+
+        last_flush = time.monotonic()
+        for method, properties, body in channel.consume(MEDICATION_QUEUE, inactivity_timeout=self.flush_after):
+            if method is not None:
+                self.pending.append((method.delivery_tag, body))
+            if len(self.pending) >= self.batch_size or time.monotonic() - last_flush >= self.flush_after:
+                self.flush(channel)
+                last_flush = time.monotonic()
+
+
+def connect_db():
+    return MySQLdb.connect(
+        host=config.MYSQL_HOST,
+        user=config.MYSQL_USER,
+        passwd=config.MYSQL_PASSWORD,
+        db=config.MYSQL_DB,
+        autocommit=False
+    )
+
+
+def main():
+    while True:
+        connection = pika.BlockingConnection(pika.URLParameters(config.RABBITMQ_URL))
+        try:
+            MedicationWorker(connect_db).run(connection.channel())
+        except (pika.exceptions.AMQPConnectionError, MySQLdb.OperationalError) as e:
+            print(f"medication worker: {e}; reconnecting")
+            time.sleep(5)
+        finally:
+            if connection.is_open:
+                connection.close()
+
+
+if __name__ == '__main__':
+    main()
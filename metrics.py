@@ -0,0 +1,41 @@
+from collections import Counter
+from threading import Lock
+import time
+
+
+class Metrics:
+    """
+    In-process counters and timings for one hot path, cheap enough to bump on every request.
+    Values are per worker process and reset on restart.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counts = Counter()
+        self._timings = {}
+        self._started = time.time()
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def observe(self, name, seconds):
+        with self._lock:
+            count, total, peak = self._timings.get(name, (0, 0.0, 0.0))
+            self._timings[name] = (count + 1, total + seconds, max(peak, seconds))
+
+    def snapshot(self):
+        with self._lock:
+            timings = {
+                name: {
+                    "count": count,
+                    "avg_ms": round(total / count * 1000, 3) if count else 0.0,
+                    "max_ms": round(peak * 1000, 3)
+                }
+                for name, (count, total, peak) in self._timings.items()
+            }
+            return {
+                "since": self._started,
+                "counts": dict(self._counts),
+                "timings": timings
+            }
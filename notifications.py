@@ -0,0 +1,146 @@
+import json
+from functools import wraps
+import pika
+from flask_socketio import SocketIO, join_room
+from itsdangerous import BadSignature
+from auth import read_token
+from rabbitmq_utils import NOTIFICATIONS_EXCHANGE, declare_notifications_exchange
+import config
+
+socketio = SocketIO()
+
+# Dashboards connect with {"auth": {"token": <login token>}} and are put in the rooms for
+# their account, then get pushed:
+#   appointment_requested       -> doctor.<doctor_id>
+#   appointment_status_changed  -> doctor.<doctor_id>, patient.<patient_id>
+#   prescription_queued         -> pharmacy.<pharmacy_id>   (from medication_worker.py)
+#   prescription_ready          -> pharmacy.<pharmacy_id>, patient.<patient_id>
+#
+# Room names match the routing keys on the clinic_notifications exchange, so events the
+# medication worker publishes are relayed as-is. Events raised by routes are emitted
+# straight from this process.
+
+RELAY_POLL_SECONDS = 0.5
+RELAY_RETRY_SECONDS = 5
+
+_relay_started = False
+
+
+def doctor_room(doctor_id):
+    return f"doctor.{doctor_id}"
+
+
+def pharmacy_room(pharmacy_id):
+    return f"pharmacy.{pharmacy_id}"
+
+
+def patient_room(patient_id):
+    return f"patient.{patient_id}"
+
+
+def push(event, payload, *rooms):
+    """
+    Emit to every given room. A failed push is logged and never fails the request that raised it.
+    """
+    for room in rooms:
+        try:
+            socketio.emit(event, payload, to=room)
+        except Exception as e:
+            print(f"push {event} to {room} failed: {e}")
+
+
+def after_commit(func):
+    """
+    For route helpers that run after the commit to look up who to tell and push to them:
+    any failure, the lookup included, is logged and swallowed so it can't change the
+    response for a change that is already saved.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            print(f"{func.__name__} failed after commit: {e}")
+            return None
+    return wrapper
+
+
+def _principal_rooms(principal):
+    rooms = []
+    if principal.get('doctor_id') is not None:
+        rooms.append(doctor_room(principal['doctor_id']))
+    if principal.get('pharmacy_id') is not None:
+        rooms.append(pharmacy_room(principal['pharmacy_id']))
+    if principal.get('patient_id') is not None:
+        rooms.append(patient_room(principal['patient_id']))
+    return rooms
+
+
+@socketio.on('connect')
+def handle_connect(auth=None):
+    token = (auth or {}).get('token')
+    if not token:
+        # anonymous sockets still get chat, just no account rooms
+        return None
+    try:
+        principal = read_token(token)
+    except BadSignature:
+        return False
+
+    for room in _principal_rooms(principal):
+        join_room(room)
+    _start_relay()
+    return None
+
+
+def _relay_worker_events():
+    """
+    Forward clinic_notifications messages to the matching rooms. Each web process binds its own
+    exclusive queue, so every process sees every event and serves its own sockets.
+    Polls with basic_get so it cooperates with whatever async mode socketio runs in.
+    """
+    while True:
+        connection = None
+        try:
+            connection = pika.BlockingConnection(pika.URLParameters(config.RABBITMQ_URL))
+            channel = connection.channel()
+            declare_notifications_exchange(channel)
+            queue = channel.queue_declare(queue='', exclusive=True).method.queue
+            channel.queue_bind(queue=queue, exchange=NOTIFICATIONS_EXCHANGE, routing_key='#')
+
+            while True:
+                method, properties, body = channel.basic_get(queue, auto_ack=True)
+                if method is None:
+                    socketio.sleep(RELAY_POLL_SECONDS)
+                    continue
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    continue
+                if not isinstance(payload, dict) or 'event' not in payload:
+                    continue
+                event = payload.pop('event')
+                socketio.emit(event, payload, to=method.routing_key)
+        except Exception as e:
+            # anything, not just a broker error: the relay is the only thing feeding the
+            # sockets, so it logs, backs off and reconnects rather than dying silently
+            print(f"notification relay: {e}; reconnecting")
+            socketio.sleep(RELAY_RETRY_SECONDS)
+        finally:
+            try:
+                if connection is not None and connection.is_open:
+                    connection.close()
+            except Exception:
+                pass
+
+
+def _start_relay():
+    global _relay_started
+    if _relay_started or not config.RABBITMQ_URL:
+        return
+    _relay_started = True
+    socketio.start_background_task(_relay_worker_events)
+
+
+def init_app(app):
+    socketio.init_app(app, cors_allowed_origins="*")
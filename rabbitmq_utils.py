@@ -1,23 +1,59 @@
 import pika
 import json
 import os
+import uuid
 from dotenv import load_dotenv
 load_dotenv()
 
+MEDICATION_QUEUE = 'medication_requests'
+# rejected (unprocessable) requests end up here instead of being retried forever
+MEDICATION_DLX = 'medication_requests.dlx'
+MEDICATION_DEAD_QUEUE = 'medication_requests.dead'
+# the worker announces new pharmacy work here, routing key "pharmacy.<pharmacy_id>"
+NOTIFICATIONS_EXCHANGE = 'clinic_notifications'
+
+
+def declare_medication_queue(channel):
+    """
+    Declare the request queue with its dead-letter exchange.
+    Publisher and worker must declare it identically, so both go through here.
+    """
+    channel.exchange_declare(exchange=MEDICATION_DLX, exchange_type='fanout', durable=True)
+    channel.queue_declare(queue=MEDICATION_DEAD_QUEUE, durable=True)
+    channel.queue_bind(queue=MEDICATION_DEAD_QUEUE, exchange=MEDICATION_DLX)
+    channel.queue_declare(
+        queue=MEDICATION_QUEUE,
+        durable=True,
+        arguments={'x-dead-letter-exchange': MEDICATION_DLX}
+    )
+
+
+def declare_notifications_exchange(channel):
+    channel.exchange_declare(exchange=NOTIFICATIONS_EXCHANGE, exchange_type='topic', durable=True)
+
 
 def send_medication_request(prescription_data):
     rabbitmq_url = os.getenv('RABBITMQ_URL')
     connection = pika.BlockingConnection(pika.URLParameters(rabbitmq_url))
     channel = connection.channel()
 
-    channel.queue_declare(queue='medication_requests', durable=True)
+    declare_medication_queue(channel)
+
+    # request_id makes redelivered or re-sent requests idempotent on the worker side
+    prescription_data = dict(prescription_data)
+    prescription_data.setdefault('request_id', uuid.uuid4().hex)
 
     message = json.dumps(prescription_data)
     channel.basic_publish(
         exchange='',
-        routing_key='medication_requests',
+        routing_key=MEDICATION_QUEUE,
         body=message,
-        properties=pika.BasicProperties(delivery_mode=2)  # make message persistent
+        properties=pika.BasicProperties(
+            delivery_mode=2,  # make message persistent
+            message_id=prescription_data['request_id'],
+            content_type='application/json'
+        )
     )
 
     connection.close()
+    return prescription_data['request_id']
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
 from db import mysql
+from auth import resolve_user_id
 import bcrypt
 
 chat_bp = Blueprint('chat_bp', __name__)
@@ -60,24 +61,18 @@ def send_chat_message():
 
         patient_id, doctor_id = row
 
-        # Step 2: Get corresponding user_ids from user table
+        # Step 2: Get corresponding user_ids; the signed-in side comes straight from the session token
+        patient_user_id = resolve_user_id(cursor, patient_id=patient_id)
+        doctor_user_id = resolve_user_id(cursor, doctor_id=doctor_id)
+
         if sender_type == "patient":
-            cursor.execute("SELECT user_id FROM USER WHERE patient_id = %s", (patient_id,))
-            sender_row = cursor.fetchone()
-            cursor.execute("SELECT user_id FROM USER WHERE doctor_id = %s", (doctor_id,))
-            receiver_row = cursor.fetchone()
+            sender_id, receiver_id = patient_user_id, doctor_user_id
         else:
-            cursor.execute("SELECT user_id FROM USER WHERE doctor_id = %s", (doctor_id,))
-            sender_row = cursor.fetchone()
-            cursor.execute("SELECT user_id FROM USER WHERE patient_id = %s", (patient_id,))
-            receiver_row = cursor.fetchone()
+            sender_id, receiver_id = doctor_user_id, patient_user_id
 
-        if not sender_row or not receiver_row:
+        if sender_id is None or receiver_id is None:
             return jsonify({'error': 'User not found'}), 404
 
-        sender_id = sender_row[0]
-        receiver_id = receiver_row[0]
-
         # Step 3: Insert into chat
         cursor.execute("""
             INSERT INTO CHAT (appt_id, sender_id, receiver_id, message, sent_at)
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from db import mysql
+from auth import resolve_user_id
 import bcrypt, base64
 import os
 from google.cloud import storage
@@ -449,27 +450,15 @@ def get_liked_posts():
     cursor = mysql.connection.cursor()
 
     try:
-        # Get user_id from USER table
+        # Get user_id (from the session token when the caller is signed in)
         if patient_id:
-            cursor.execute("""
-                SELECT user_id
-                FROM USER
-                WHERE patient_id = %s
-            """, (patient_id,))
+            user_id = resolve_user_id(cursor, patient_id=patient_id)
         else:
-            cursor.execute("""
-                SELECT user_id
-                FROM USER
-                WHERE doctor_id = %s
-            """, (doctor_id,))
+            user_id = resolve_user_id(cursor, doctor_id=doctor_id)
 
-        user_result = cursor.fetchone()
-
-        if not user_result:
+        if user_id is None:
             return jsonify({"error": "User not found."}), 404
 
-        user_id = user_result[0]
-
         # Get liked posts for this user
         cursor.execute("""
             SELECT lp.liked_id, lp.post_id, lp.user_id, lp.liked_at
@@ -570,27 +559,15 @@ def like_post():
     cursor = mysql.connection.cursor()
 
     try:
-        # Get user_id
+        # Get user_id (from the session token when the caller is signed in)
         if patient_id:
-            cursor.execute("""
-                SELECT user_id
-                FROM USER
-                WHERE patient_id = %s
-            """, (patient_id,))
+            user_id = resolve_user_id(cursor, patient_id=patient_id)
         else:
-            cursor.execute("""
-                SELECT user_id
-                FROM USER
-                WHERE doctor_id = %s
-            """, (doctor_id,))
-        
-        user_result = cursor.fetchone()
+            user_id = resolve_user_id(cursor, doctor_id=doctor_id)
 
-        if not user_result:
+        if user_id is None:
             return jsonify({"error": "User not found."}), 404
 
-        user_id = user_result[0]
-
         # Insert like
         cursor.execute("""
             INSERT INTO LIKED_POSTS (post_id, user_id)
@@ -655,27 +632,15 @@ def unlike_post():
     cursor = mysql.connection.cursor()
 
     try:
-        # Get user_id
+        # Get user_id (from the session token when the caller is signed in)
         if patient_id:
-            cursor.execute("""
-                SELECT user_id
-                FROM USER
-                WHERE patient_id = %s
-            """, (patient_id,))
+            user_id = resolve_user_id(cursor, patient_id=patient_id)
         else:
-            cursor.execute("""
-                SELECT user_id
-                FROM USER
-                WHERE doctor_id = %s
-            """, (doctor_id,))
-
-        user_result = cursor.fetchone()
+            user_id = resolve_user_id(cursor, doctor_id=doctor_id)
 
-        if not user_result:
+        if user_id is None:
             return jsonify({"error": "User not found."}), 404
 
-        user_id = user_result[0]
-
         # Remove like from LIKED_POSTS table
         cursor.execute("""
             DELETE FROM LIKED_POSTS 
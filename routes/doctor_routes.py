@@ -1,6 +1,11 @@
 from flask import Blueprint, request, jsonify
 from rabbitmq_utils import send_medication_request
 from db import mysql
+from login_service import login
+from cache import doctor_cache, invalidate_doctor, to_json_bytes, json_response, cohort_cache, remember_cohort
+from cohort import load_cohort
+from pagination import encode_cursor, decode_cursor, parse_limit, parse_date
+from notifications import push, after_commit, doctor_room, patient_room
 import bcrypt, base64
 from google.cloud import storage
 import time
@@ -13,6 +18,12 @@ os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credentials_path
 GCS_BUCKET = "image-bucket-490"
 storage_client = storage.Client()
 
+# /doctors/search sort orders; doctor_id breaks ties so keyset pages never overlap
+SEARCH_SORTS = {
+    'rating': "doctor_rating DESC, doctor_id DESC",
+    'fee': "payment_fee ASC, doctor_id ASC"
+}
+
 @doctor_bp.route('/register-doctor', methods=['POST'])
 def register_doctor():
     """
@@ -180,6 +191,7 @@ def register_doctor():
         cursor = mysql.connection.cursor()
         cursor.execute(query, values)
         mysql.connection.commit()
+        invalidate_doctor()
         return jsonify({"message": "Doctor registered successfully!"}), 201
     except Exception as e:
         mysql.connection.rollback()
@@ -252,6 +264,11 @@ def get_doctor(doctor_id):
       404:
         description: Doctor not found
     """
+    cache_key = f'doctor:{doctor_id}'
+    body = doctor_cache.get(cache_key)
+    if body is not None:
+        return json_response(body)
+
     cursor = mysql.connection.cursor()
     query = """
         SELECT doctor_id, first_name, last_name, email, description, license_num,
@@ -263,9 +280,10 @@ def get_doctor(doctor_id):
     """
     cursor.execute(query, (doctor_id,))
     doctor = cursor.fetchone()
+    cursor.close()
 
     if doctor:
-        return jsonify({
+        body = to_json_bytes({
             "doctor_id": doctor[0],
             "first_name": doctor[1],
             "last_name": doctor[2],
@@ -287,7 +305,9 @@ def get_doctor(doctor_id):
             "doctor_picture": doctor[18],
             "accepting_patients": doctor[19],
             "doctor_rating": doctor[20],
-        }), 200
+        })
+        doctor_cache.set(cache_key, body)
+        return json_response(body)
     else:
         return jsonify({"error": "Doctor not found"}), 404
 
@@ -317,7 +337,7 @@ def login_doctor():
             password: "password123"
     responses:
         200:
-            description: Login Successful with the Doctor ID.
+            description: Login Successful with the Doctor ID, USER id and a session token.
         401:
             description: Invalid credentials.
         404:
@@ -328,36 +348,8 @@ def login_doctor():
     password = data.get('password')
 
     cursor = mysql.connection.cursor()
-
     try:
-        # Step 1: get "legacy" emails
-        cursor.execute("SELECT email FROM DOCTOR ORDER BY doctor_id ASC LIMIT 50")
-        test_emails = set(row[0] for row in cursor.fetchall())
-
-        # Step 2: get doctor by email
-        cursor.execute("SELECT doctor_id, password FROM DOCTOR WHERE email = %s", (email,))
-        doctor = cursor.fetchone()
-
-        if doctor:
-            doctor_id, stored_password = doctor
-
-            if email in test_emails:
-                # Legacy: compare as plaintext
-                if password == stored_password:
-                    return jsonify({"message": "Login successful (legacy plain text)", "doctor_id": doctor_id}), 200
-                else:
-                    return jsonify({"error": "Invalid credentials"}), 401
-            else:
-                # Modern: compare using bcrypt
-                if isinstance(stored_password, str):
-                    stored_password = stored_password.encode('utf-8')
-
-                if bcrypt.checkpw(password.encode('utf-8'), stored_password):
-                    return jsonify({"message": "Login successful", "doctor_id": doctor_id}), 200
-                else:
-                    return jsonify({"error": "Invalid credentials"}), 401
-        else:
-            return jsonify({"error": "Doctor not found"}), 404
+        return login(cursor, 'doctor', email, password)
     finally:
         cursor.close()
 
@@ -410,6 +402,7 @@ def delete_doctor(doctor_id):
     # delete the doctor
     cursor.execute("DELETE FROM DOCTOR WHERE doctor_id = %s", (doctor_id,))
     mysql.connection.commit()
+    invalidate_doctor(doctor_id)
 
     return jsonify({"message": f"Doctor with ID {doctor_id} has been deleted."}), 200
 
@@ -474,16 +467,21 @@ def get_all_doctors():
                 accepting_patients: true
                 doctor_rating: 4.9
     """
+    body = doctor_cache.get('doctors')
+    if body is not None:
+        return json_response(body)
+
     cursor = mysql.connection.cursor()
     query = """
         SELECT doctor_id, first_name, last_name, email, description, license_num,
                license_exp_date, dob, med_school, specialty, years_of_practice, payment_fee,
                gender, phone_number, address, zipcode, city, state, doctor_picture,
-               accepting_patients, doctor_rating, created_at, updated_at
+               accepting_patients, doctor_rating
         FROM DOCTOR
     """
     cursor.execute(query)
     doctors = cursor.fetchall()
+    cursor.close()
 
     result = []
     for doc in doctors:
@@ -515,13 +513,208 @@ def get_all_doctors():
             "doctor_picture": doc[18],
             "accepting_patients": doc[19],
             "doctor_rating": doc[20],
-            # created_at and updated_at are fetched but not returned
         })
 
-    return jsonify(result), 200
+    body = to_json_bytes(result)
+    doctor_cache.set('doctors', body)
+    return json_response(body)
+
+# search doctors with server-side filters, one page at a time
+@doctor_bp.route('/doctors/search', methods=['GET'])
+def search_doctors():
+    """
+    Search doctors by specialty, location, availability and fee
+    ---
+    tags:
+      - Doctor
+    parameters:
+      - name: specialty
+        in: query
+        schema: { type: string }
+      - name: state
+        in: query
+        schema: { type: string }
+      - name: city
+        in: query
+        schema: { type: string }
+      - name: zipcode
+        in: query
+        schema: { type: string }
+      - name: accepting_patients
+        in: query
+        schema: { type: integer, enum: [0, 1] }
+      - name: min_fee
+        in: query
+        schema: { type: number }
+      - name: max_fee
+        in: query
+        schema: { type: number }
+      - name: sort
+        in: query
+        description: rating (highest first) or fee (lowest first)
+        schema: { type: string, enum: [rating, fee], default: rating }
+      - name: limit
+        in: query
+        schema: { type: integer, default: 20, maximum: 100 }
+      - name: cursor
+        in: query
+        description: next_cursor from the previous page
+        schema: { type: string }
+    responses:
+      200:
+        description: One page of matching doctors
+        content:
+          application/json:
+            example:
+              doctors:
+                - doctor_id: 7
+                  first_name: "Alice"
+                  last_name: "Nguyen"
+                  specialty: "Cardiology"
+                  city: "New York"
+                  state: "NY"
+                  zipcode: "10001"
+                  payment_fee: 200.0
+                  accepting_patients: 1
+                  doctor_rating: 4.9
+                  doctor_picture: null
+                  description: "Cardiology specialist"
+              next_cursor: "WzQuOSw3XQ=="
+      400:
+        description: Invalid filter, limit or cursor
+    """
+    args = request.args
+    sort = args.get('sort', 'rating')
+    if sort not in SEARCH_SORTS:
+        return jsonify({"error": "sort must be 'rating' or 'fee'."}), 400
+
+    try:
+        limit = parse_limit(args.get('limit'))
+        after = decode_cursor(args.get('cursor'))
+        if after is not None and len(after) != 2:
+            raise ValueError("Invalid cursor.")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        min_fee = float(args['min_fee']) if args.get('min_fee') else None
+        max_fee = float(args['max_fee']) if args.get('max_fee') else None
+    except ValueError:
+        return jsonify({"error": "min_fee and max_fee must be numbers."}), 400
+
+    conditions = []
+    params = []
+    for column in ('specialty', 'state', 'city', 'zipcode'):
+        if args.get(column):
+            conditions.append(f"{column} = %s")
+            params.append(args[column])
+
+    accepting = args.get('accepting_patients')
+    if accepting not in (None, ''):
+        if accepting not in ('0', '1'):
+            return jsonify({"error": "accepting_patients must be 0 or 1."}), 400
+        conditions.append("accepting_patients = %s")
+        params.append(int(accepting))
+
+    if min_fee is not None:
+        conditions.append("payment_fee >= %s")
+        params.append(min_fee)
+    if max_fee is not None:
+        conditions.append("payment_fee <= %s")
+        params.append(max_fee)
+
+    # keyset: continue strictly after the last (sort value, doctor_id) we handed out
+    if after is not None:
+        last_value, last_id = after
+        if sort == 'fee' and last_value is None:
+            # still in the doctors without a fee, which sort first
+            conditions.append("((payment_fee IS NULL AND doctor_id > %s) OR payment_fee IS NOT NULL)")
+            params.append(last_id)
+        elif sort == 'fee':
+            conditions.append("(payment_fee > %s OR (payment_fee = %s AND doctor_id > %s))")
+            params.extend([last_value, last_value, last_id])
+        elif last_value is None:
+            # already into the unrated doctors, which sort last
+            conditions.append("(doctor_rating IS NULL AND doctor_id < %s)")
+            params.append(last_id)
+        else:
+            conditions.append("(doctor_rating < %s OR (doctor_rating = %s AND doctor_id < %s)"
+                              " OR doctor_rating IS NULL)")
+            params.extend([last_value, last_value, last_id])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""
+        SELECT doctor_id, first_name, last_name, specialty, city, state, zipcode,
+               payment_fee, accepting_patients, doctor_rating, doctor_picture, description
+        FROM DOCTOR
+        {where}
+        ORDER BY {SEARCH_SORTS[sort]}
+        LIMIT %s
+    """
+    params.append(limit + 1)
+
+    cursor = mysql.connection.cursor()
+    try:
+        cursor.execute(query, tuple(params))
+        rows = cursor.fetchall()
+
+        columns = [desc[0] for desc in cursor.description]
+        doctors = [dict(zip(columns, row)) for row in rows[:limit]]
+
+        next_cursor = None
+        if len(rows) > limit:
+            last = doctors[-1]
+            sort_value = last['payment_fee'] if sort == 'fee' else last['doctor_rating']
+            next_cursor = encode_cursor([sort_value, last['doctor_id']])
+
+        return jsonify({"doctors": doctors, "next_cursor": next_cursor}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        cursor.close()
 
 # need to test this
 # get appointments by doctor
+# Shared by the per-bucket doctor appointment endpoints. Filters on the appointment's own
+# doctor_id so (doctor_id, appointment_datetime) drives the plan; the patient join is a
+# primary-key lookup per appointment, and appointments without a meal plan still show up.
+def _doctor_appointment_list(doctor_id, condition, order_by, meal_plan=False):
+    meal_column = ",\n            mp.meal_plan_title AS meal_prescribed" if meal_plan else ""
+    meal_join = "LEFT JOIN MEAL_PLAN mp ON pa.meal_prescribed = mp.meal_plan_id" if meal_plan else ""
+    query = f"""
+        SELECT
+            pa.patient_appt_id,
+            pa.patient_id,
+            pa.appointment_datetime,
+            pa.reason_for_visit,
+            pa.current_medications,
+            pa.exercise_frequency,
+            pa.doctor_appointment_note,
+            pa.accepted,
+            pa.created_at,
+            pa.updated_at,
+            p.first_name AS patient_first_name,
+            p.last_name AS patient_last_name{meal_column}
+        FROM PATIENT_APPOINTMENT pa
+        JOIN PATIENT p ON pa.patient_id = p.patient_id
+        {meal_join}
+        WHERE pa.doctor_id = %s AND {condition}
+        ORDER BY {order_by}, pa.patient_appt_id
+    """
+
+    cursor = mysql.connection.cursor()
+    try:
+        cursor.execute(query, (doctor_id,))
+        appointments = cursor.fetchall()
+        columns = [desc[0] for desc in cursor.description]
+        results = [dict(zip(columns, row)) for row in appointments]
+        return jsonify(results), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        cursor.close()
+
+
 @doctor_bp.route('/doc-appointments/<int:doctor_id>', methods=['GET'])
 def get_appointments_by_doctor(doctor_id):
     """
@@ -585,39 +778,236 @@ def get_appointments_by_doctor(doctor_id):
                 error:
                   type: string
     """
+    return _doctor_appointment_list(
+        doctor_id,
+        "TRUE",
+        "pa.appointment_datetime DESC",
+        meal_plan=True
+    )
+
+
+# Dashboard buckets, first matching rule wins. Same rules the per-bucket endpoints use.
+APPOINTMENT_BUCKET_SQL = """
+    CASE
+        WHEN pa.appointment_datetime < NOW() OR pa.appt_status = 2 THEN 'past'
+        WHEN pa.accepted = 1 THEN 'upcoming'
+        WHEN pa.accepted = 2 THEN 'denied'
+        ELSE 'requested'
+    END
+"""
+APPOINTMENT_BUCKETS = ('requested', 'upcoming', 'past', 'denied')
+DEFAULT_APPOINTMENT_BUCKETS = ('requested', 'upcoming', 'past')
+
+# selectable fields -> (SQL expression, table it needs beyond PATIENT_APPOINTMENT)
+APPOINTMENT_FIELDS = {
+    'patient_appt_id': ('pa.patient_appt_id', None),
+    'patient_id': ('pa.patient_id', None),
+    'appointment_datetime': ('pa.appointment_datetime', None),
+    'reason_for_visit': ('pa.reason_for_visit', None),
+    'current_medications': ('pa.current_medications', None),
+    'exercise_frequency': ('pa.exercise_frequency', None),
+    'doctor_appointment_note': ('pa.doctor_appointment_note', None),
+    'accepted': ('pa.accepted', None),
+    'appt_status': ('pa.appt_status', None),
+    'created_at': ('pa.created_at', None),
+    'updated_at': ('pa.updated_at', None),
+    'patient_first_name': ('p.first_name', 'patient'),
+    'patient_last_name': ('p.last_name', 'patient'),
+    'meal_prescribed': ('mp.meal_plan_title', 'meal_plan'),
+}
+APPOINTMENT_JOINS = {
+    'patient': "JOIN PATIENT p ON pa.patient_id = p.patient_id",
+    'meal_plan': "LEFT JOIN MEAL_PLAN mp ON pa.meal_prescribed = mp.meal_plan_id",
+}
+
+
+def _split_param(raw):
+    return [part.strip() for part in raw.split(',') if part.strip()] if raw else []
+
+
+def _doctor_appointment_buckets(doctor_id, buckets, fields, date_from=None, date_to=None,
+                                limit=None, after=None):
+    """
+    Appointments of one doctor grouped into dashboard buckets, from a single query.
+    Past appointments run newest first, the others soonest first. limit applies per bucket;
+    after is a (bucket, appointment_datetime, patient_appt_id) cursor and only makes sense
+    with one bucket. Returns {bucket: {"appointments": [...], "next_cursor": ...}}.
+    """
+    # the keyset columns are always read, even if the caller didn't ask for them
+    selected = list(dict.fromkeys(['patient_appt_id', 'appointment_datetime'] + fields))
+    columns = ', '.join(f"{APPOINTMENT_FIELDS[f][0]} AS {f}" for f in selected)
+    joins = ' '.join(
+        APPOINTMENT_JOINS[table] for table in APPOINTMENT_JOINS
+        if any(APPOINTMENT_FIELDS[f][1] == table for f in selected)
+    )
+
+    conditions = ["pa.doctor_id = %s"]
+    params = [doctor_id]
+    if date_from:
+        conditions.append("pa.appointment_datetime >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append("pa.appointment_datetime < %s + INTERVAL 1 DAY")
+        params.append(date_to)
+    if after is not None:
+        _, last_datetime, last_id = after
+        if after[0] == 'past':
+            conditions.append("(pa.appointment_datetime < %s OR (pa.appointment_datetime = %s AND pa.patient_appt_id < %s))")
+        else:
+            conditions.append("(pa.appointment_datetime > %s OR (pa.appointment_datetime = %s AND pa.patient_appt_id > %s))")
+        params.extend([last_datetime, last_datetime, last_id])
+
+    bucket_placeholders = ', '.join(['%s'] * len(buckets))
+    params.extend(buckets)
+
+    # (doctor_id, appointment_datetime) index narrows to the doctor's range; the window
+    # numbers rows inside each bucket so every bucket gets its own page in one round trip
+    query = f"""
+        SELECT *
+        FROM (
+            SELECT appts.*,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY bucket
+                       ORDER BY IF(bucket = 'past', -TO_SECONDS(appointment_datetime), TO_SECONDS(appointment_datetime)),
+                                IF(bucket = 'past', -patient_appt_id, patient_appt_id)
+                   ) AS bucket_row
+            FROM (
+                SELECT {columns}, {APPOINTMENT_BUCKET_SQL} AS bucket
+                FROM PATIENT_APPOINTMENT pa
+                {joins}
+                WHERE {' AND '.join(conditions)}
+            ) appts
+            WHERE bucket IN ({bucket_placeholders})
+        ) ranked
+    """
+    if limit is not None:
+        query += " WHERE bucket_row <= %s"
+        params.append(limit + 1)
+    query += " ORDER BY bucket, bucket_row"
+
     cursor = mysql.connection.cursor()
+    try:
+        cursor.execute(query, tuple(params))
+        rows = cursor.fetchall()
+        names = [desc[0] for desc in cursor.description]
+    finally:
+        cursor.close()
 
-    query = """
-        SELECT 
-            pa.patient_appt_id,
-            pa.patient_id,
-            pa.appointment_datetime,
-            pa.reason_for_visit,
-            pa.current_medications,
-            pa.exercise_frequency,
-            pa.doctor_appointment_note,
-            pa.accepted,
-            pa.created_at,
-            pa.updated_at,
-            p.first_name AS patient_first_name,
-            p.last_name AS patient_last_name,
-            mp.meal_plan_title AS meal_prescribed
-        FROM PATIENT_APPOINTMENT pa
-        JOIN PATIENT p ON pa.patient_id = p.patient_id
-        JOIN MEAL_PLAN mp ON pa.meal_prescribed = mp.meal_plan_id
-        WHERE p.doctor_id = %s
-        ORDER BY pa.appointment_datetime DESC
+    result = {bucket: {"appointments": [], "next_cursor": None} for bucket in buckets}
+    for row in rows:
+        record = dict(zip(names, row))
+        bucket = result[record['bucket']]
+        if limit is not None and record['bucket_row'] > limit:
+            last = bucket["appointments"][-1]
+            bucket["next_cursor"] = encode_cursor([record['bucket'], last['appointment_datetime'], last['patient_appt_id']])
+            continue
+        bucket["appointments"].append({f: record[f] for f in selected})
+    if fields:
+        # keyset columns were only needed for the cursor
+        for bucket in result.values():
+            bucket["appointments"] = [{f: appt[f] for f in fields} for appt in bucket["appointments"]]
+    return result
+
+
+@doctor_bp.route('/doctor/<int:doctor_id>/appointments', methods=['GET'])
+def get_doctor_appointment_buckets(doctor_id):
     """
+    A doctor's appointments grouped into dashboard buckets, in one query
+    ---
+    tags:
+      - Appointment
+    parameters:
+      - name: doctor_id
+        in: path
+        required: true
+        schema: { type: integer }
+      - name: status
+        in: query
+        description: Comma-separated buckets out of requested, upcoming, past, denied (default requested,upcoming,past)
+        schema: { type: string }
+      - name: from
+        in: query
+        description: First appointment day (YYYY-MM-DD)
+        schema: { type: string, format: date }
+      - name: to
+        in: query
+        description: Last appointment day (YYYY-MM-DD)
+        schema: { type: string, format: date }
+      - name: limit
+        in: query
+        description: Page size per bucket
+        schema: { type: integer, default: 20, maximum: 100 }
+      - name: cursor
+        in: query
+        description: A bucket's next_cursor; only valid with that single status
+        schema: { type: string }
+      - name: fields
+        in: query
+        description: Comma-separated appointment fields to return (default all)
+        schema: { type: string }
+    responses:
+      200:
+        description: One page per requested bucket
+        content:
+          application/json:
+            example:
+              requested:
+                appointments:
+                  - patient_appt_id: 88
+                    appointment_datetime: "Mon, 05 May 2025 10:30:00 GMT"
+                    patient_first_name: "John"
+                    patient_last_name: "Doe"
+                next_cursor: null
+              upcoming:
+                appointments: []
+                next_cursor: null
+      400:
+        description: Invalid status, fields, dates, limit or cursor
+    """
+    buckets = _split_param(request.args.get('status')) or list(DEFAULT_APPOINTMENT_BUCKETS)
+    unknown = [b for b in buckets if b not in APPOINTMENT_BUCKETS]
+    if unknown:
+        return jsonify({"error": f"Unknown status(es): {', '.join(unknown)}"}), 400
+    buckets = list(dict.fromkeys(buckets))
+
+    fields = _split_param(request.args.get('fields'))
+    unknown = [f for f in fields if f not in APPOINTMENT_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Unknown field(s): {', '.join(unknown)}"}), 400
 
     try:
-        cursor.execute(query, (doctor_id,))
-        appointments = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        results = [dict(zip(columns, row)) for row in appointments]
-        return jsonify(results), 200
+        date_from = parse_date(request.args.get('from'))
+        date_to = parse_date(request.args.get('to'))
+        limit = parse_limit(request.args.get('limit'))
+        after = decode_cursor(request.args.get('cursor'))
+        if after is not None and (len(after) != 3 or buckets != [after[0]]):
+            raise ValueError("Invalid cursor; pass it with the single status it came from.")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        result = _doctor_appointment_buckets(doctor_id, buckets, fields, date_from, date_to, limit, after)
+        return jsonify(result), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
-    
+
+
+@after_commit
+def _push_status_change(cursor, appointment_id, change):
+    """
+    Tell the doctor's and patient's dashboards about a committed status change.
+    """
+    cursor.execute("""
+        SELECT doctor_id, patient_id
+        FROM PATIENT_APPOINTMENT
+        WHERE patient_appt_id = %s
+    """, (appointment_id,))
+    appt = cursor.fetchone()
+    if appt:
+        push('appointment_status_changed', {"appt_id": appointment_id, **change},
+             doctor_room(appt[0]), patient_room(appt[1]))
+
+
 @doctor_bp.route('/doc-appointments-status/<int:appointment_id>', methods=['PATCH'])
 def update_appointment_status(appointment_id):
     """
@@ -694,6 +1084,7 @@ def update_appointment_status(appointment_id):
             message = "Appointment denied (status set to 0.5) successfully."
 
         mysql.connection.commit()
+        _push_status_change(cursor, appointment_id, {"accepted": 1 if new_status == 1 else 2})
         return jsonify({"message": message}), 200
 
     except Exception as e:
@@ -917,6 +1308,8 @@ def update_accepting_status(doctor_id):
         if cursor.rowcount == 0:
             return jsonify({"error": "Doctor not found or no change made."}), 404
 
+        invalidate_doctor(doctor_id)
+
         return jsonify({"message": "Doctor's accepting status updated successfully."}), 200
     except Exception as e:
         mysql.connection.rollback()
@@ -1034,6 +1427,8 @@ def get_doctor_average_rating(doctor_id):
                 average_rating:
                   type: number
                   nullable: true
+      404:
+        description: Doctor not found
       400:
         description: Retrieval error
         content:
@@ -1046,14 +1441,18 @@ def get_doctor_average_rating(doctor_id):
     cursor = mysql.connection.cursor()
 
     try:
-        # Compute average appointment rating for the doctor
+        # Running totals kept by rate_appointment (and the reconcile-ratings command)
         cursor.execute("""
-            SELECT AVG(appt_rating)
-            FROM PATIENT_APPOINTMENT
-            WHERE doctor_id = %s AND appt_rating IS NOT NULL
+            SELECT rating_sum, rating_count
+            FROM DOCTOR
+            WHERE doctor_id = %s
         """, (doctor_id,))
         result = cursor.fetchone()
-        avg_rating = float(result[0]) if result[0] is not None else None
+        if not result:
+            return jsonify({"error": "Doctor not found"}), 404
+
+        rating_sum, rating_count = result
+        avg_rating = float(rating_sum) / rating_count if rating_count else None
 
         if avg_rating is None:
             return jsonify({
@@ -1139,6 +1538,76 @@ def get_patients_by_doctor(doctor_id):
 
     return jsonify(result), 200 if result else 404
 
+# how the doctor's patients are doing, from their surveys
+@doctor_bp.route('/doctor/<int:doctor_id>/cohort', methods=['GET'])
+def get_doctor_cohort(doctor_id):
+    """
+    Survey analytics across all of a doctor's patients
+    ---
+    tags:
+      - Doctor
+    parameters:
+      - name: doctor_id
+        in: path
+        required: true
+        schema: { type: integer }
+      - name: days
+        in: query
+        description: Look-back window in days (default 30, max 365)
+        schema: { type: integer, default: 30 }
+    responses:
+      200:
+        description: Cohort summary plus one row per patient
+        content:
+          application/json:
+            example:
+              doctor_id: 1
+              days: 30
+              cohort:
+                patients: 2
+                reporting: 1
+                adherence: { mean: 0.8, median: 0.8, min: 0.8, max: 0.8 }
+                resting_heart_rate: { mean: 62, median: 62, min: 62, max: 62 }
+                weekly_weight_trend: { mean: -0.6, median: -0.6, min: -0.6, max: -0.6 }
+                low_adherence: []
+                not_reporting: [9]
+              patients:
+                - patient_id: 4
+                  name: "Jane Doe"
+                  surveys: 25
+                  adherence: 0.8
+                  avg_heart_rate: 70.4
+                  resting_heart_rate: 62
+                  last_survey: "2025-05-01"
+                  weeks: 4
+                  weight_change: -2.4
+                  weekly_weight_trend: -0.6
+      400:
+        description: Invalid window or retrieval failed
+    """
+    days = request.args.get('days', '30')
+    if not days.isdigit() or not 1 <= int(days) <= 365:
+        return jsonify({"error": "days must be between 1 and 365."}), 400
+    days = int(days)
+
+    cache_key = f'cohort:{doctor_id}:{days}'
+    body = cohort_cache.get(cache_key)
+    if body is not None:
+        return json_response(body)
+
+    cursor = mysql.connection.cursor()
+    try:
+        cohort = load_cohort(cursor, doctor_id, days)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        cursor.close()
+
+    body = to_json_bytes(cohort)
+    remember_cohort(doctor_id, [p["patient_id"] for p in cohort["patients"]])
+    cohort_cache.set(cache_key, body)
+    return json_response(body)
+
 # need to test this
 # changed meal_plan_prescribed to get meal_plans in db 
 @doctor_bp.route('/doc-past/<int:doctor_id>', methods=['GET'])
@@ -1172,39 +1641,12 @@ def get_past_appointments_by_doctor(doctor_id):
               properties:
                 error: { type: string }
     """
-    cursor = mysql.connection.cursor()
-
-    query = """
-        SELECT 
-            pa.patient_appt_id,
-            pa.patient_id,
-            pa.appointment_datetime,
-            pa.reason_for_visit,
-            pa.current_medications,
-            pa.exercise_frequency,
-            pa.doctor_appointment_note,
-            pa.accepted,
-            pa.created_at,
-            pa.updated_at,
-            p.first_name AS patient_first_name,
-            p.last_name AS patient_last_name,
-            mp.meal_plan_title AS meal_prescribed
-        FROM PATIENT_APPOINTMENT pa
-        JOIN PATIENT p ON pa.patient_id = p.patient_id
-        JOIN MEAL_PLAN mp ON pa.meal_prescribed = mp.meal_plan_id
-        WHERE p.doctor_id = %s
-        AND (pa.appointment_datetime < NOW() OR pa.appt_status = 2)
-        ORDER BY pa.appointment_datetime DESC
-    """
-
-    try:
-        cursor.execute(query, (doctor_id,))
-        appointments = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        results = [dict(zip(columns, row)) for row in appointments]
-        return jsonify(results), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
+    return _doctor_appointment_list(
+        doctor_id,
+        "(pa.appointment_datetime < NOW() OR pa.appt_status = 2)",
+        "pa.appointment_datetime DESC",
+        meal_plan=True
+    )
 
 # changed meal_plan_prescribed to get meal_plans in db
 @doctor_bp.route('/doc-upcoming/<int:doctor_id>', methods=['GET'])
@@ -1238,36 +1680,12 @@ def get_upcoming_appointments_by_doctor(doctor_id):
               properties:
                 error: { type: string }
     """
-    cursor = mysql.connection.cursor()
-
-    query = """
-        SELECT 
-            pa.patient_appt_id,
-            pa.patient_id,
-            pa.appointment_datetime,
-            pa.reason_for_visit,
-            pa.current_medications,
-            pa.exercise_frequency,
-            pa.doctor_appointment_note,
-            pa.accepted,
-            pa.created_at,
-            pa.updated_at,
-            p.first_name AS patient_first_name,
-            p.last_name AS patient_last_name
-        FROM PATIENT_APPOINTMENT pa
-        JOIN PATIENT p ON pa.patient_id = p.patient_id
-        WHERE p.doctor_id = %s AND pa.appointment_datetime >= NOW() AND pa.accepted = 1
-        ORDER BY pa.appointment_datetime ASC
-    """
-
-    try:
-        cursor.execute(query, (doctor_id,))
-        appointments = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        results = [dict(zip(columns, row)) for row in appointments]
-        return jsonify(results), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
+    return _doctor_appointment_list(
+        doctor_id,
+        "pa.appointment_datetime >= NOW() AND pa.accepted = 1",
+        "pa.appointment_datetime ASC",
+        meal_plan=False
+    )
 
 # need to test this
 # changed meal_plan_prescribed to get meal_plans in db
@@ -1302,40 +1720,12 @@ def get_requested_appointments(doctor_id):
               properties:
                 error: { type: string }
     """
-    cursor = mysql.connection.cursor()
-
-    query = """
-        SELECT 
-            pa.patient_appt_id,
-            pa.patient_id,
-            pa.appointment_datetime,
-            pa.reason_for_visit,
-            pa.current_medications,
-            pa.exercise_frequency,
-            pa.doctor_appointment_note,
-            pa.accepted,
-            pa.created_at,
-            pa.updated_at,
-            p.first_name AS patient_first_name,
-            p.last_name AS patient_last_name
-        FROM PATIENT_APPOINTMENT pa
-        JOIN PATIENT p ON pa.patient_id = p.patient_id
-        WHERE p.doctor_id = %s
-          AND pa.appointment_datetime >= NOW()
-          AND (pa.accepted = 0 OR pa.accepted IS NULL)
-        ORDER BY pa.appointment_datetime ASC
-    """
-
-    try:
-        cursor.execute(query, (doctor_id,))
-        appointments = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        results = [dict(zip(columns, row)) for row in appointments]
-        return jsonify(results), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
-    finally:
-        cursor.close()
+    return _doctor_appointment_list(
+        doctor_id,
+        "pa.appointment_datetime >= NOW() AND (pa.accepted = 0 OR pa.accepted IS NULL)",
+        "pa.appointment_datetime ASC",
+        meal_plan=False
+    )
 
 @doctor_bp.route('/request-prescription', methods=['POST'])
 def request_prescription():
@@ -1488,6 +1878,7 @@ def edit_doctor():
         ))
 
         mysql.connection.commit()
+        invalidate_doctor(doctor_id)
         return jsonify({'message': 'Doctor information updated successfully'}), 200
 
     except Exception as e:
@@ -1519,6 +1910,10 @@ def get_top_doctors():
       404:
         description: No ratings found
     """
+    body = doctor_cache.get('top-doctors')
+    if body is not None:
+        return json_response(body)
+
     cursor = mysql.connection.cursor()
 
     query = """
@@ -1533,7 +1928,9 @@ def get_top_doctors():
         if results:
             details = [{"first_name": result[0], "last_name": result[1], "description": result[2],
                         "doctor_rating": result[3], "doctor_picture": result[4]} for result in results]
-            return jsonify(details), 200
+            body = to_json_bytes(details)
+            doctor_cache.set('top-doctors', body)
+            return json_response(body)
         else:
             return jsonify({"error": "Ratings not found"}), 404
     except Exception as e:
@@ -1603,6 +2000,7 @@ def update_app_status(appointment_id):
         if cursor.rowcount == 0:
             return jsonify({'error': 'Appointment not found'}), 404
 
+        _push_status_change(cursor, appointment_id, {"appt_status": appt_status})
         return jsonify({
             'message': 'Appointment status updated',
             'appt_status': appt_status
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from db import mysql
+from auth import resolve_user_id
 from MySQLdb.cursors import DictCursor
 from collections import defaultdict
 import bcrypt, base64
@@ -135,18 +136,15 @@ def create_meal_plan():
     cursor = mysql.connection.cursor()
     try:
         if doctor_id:
-            cursor.execute("SELECT user_id FROM USER WHERE doctor_id = %s", (doctor_id,))
+            user_id = resolve_user_id(cursor, doctor_id=doctor_id)
         elif patient_id:
-            cursor.execute("SELECT user_id FROM USER WHERE patient_id = %s", (patient_id,))
+            user_id = resolve_user_id(cursor, patient_id=patient_id)
         else:
             return jsonify({'error': 'Either doctor_id or patient_id is required'}), 400
 
-        result = cursor.fetchone()
-        if not result:
+        if user_id is None:
             return jsonify({'error': 'User not found'}), 400
 
-        user_id = result[0]
-
         cursor.execute(
             "INSERT INTO MEAL_PLAN (meal_plan_name, meal_plan_title, made_by) VALUES (%s, %s, %s)",
             (meal_plan_name, meal_plan_title, user_id)
@@ -175,16 +173,13 @@ def get_meal_plans_by_user():
     cursor = mysql.connection.cursor()
     try:
         if doctor_id:
-            cursor.execute("SELECT user_id FROM USER WHERE doctor_id = %s", (doctor_id,))
+            user_id = resolve_user_id(cursor, doctor_id=doctor_id)
         else:
-            cursor.execute("SELECT user_id FROM USER WHERE patient_id = %s", (patient_id,))
+            user_id = resolve_user_id(cursor, patient_id=patient_id)
 
-        user = cursor.fetchone()
-        if not user:
+        if user_id is None:
             return jsonify({'error': 'User not found'}), 400
 
-        user_id = user[0]
-
         query = """
         SELECT
             mp.meal_plan_id,
@@ -389,18 +384,15 @@ def save_a_meal_plan():
     cursor = mysql.connection.cursor()
     try:
         if doctor_id:
-            cursor.execute("SELECT user_id FROM USER WHERE doctor_id = %s", (doctor_id,))
+            user_id = resolve_user_id(cursor, doctor_id=doctor_id)
         elif patient_id:
-            cursor.execute("SELECT user_id FROM USER WHERE patient_id = %s", (patient_id,))
+            user_id = resolve_user_id(cursor, patient_id=patient_id)
         else:
             return jsonify({'error': 'Either doctor_id or patient_id is required'}), 400
 
-        result = cursor.fetchone()
-        if not result:
+        if user_id is None:
             return jsonify({'error': 'User not found'}), 400
 
-        user_id = result[0]
-
         query = """
         INSERT INTO PATIENT_PLANS (meal_plan_id, user_id) VALUES (%s, %s)
         """
@@ -550,13 +542,10 @@ def get_patient_meal_plans(patient_id):
     cursor = mysql.connection.cursor(DictCursor)
 
     # Step 1: get user_id of the patient
-    cursor.execute("SELECT user_id FROM USER WHERE patient_id = %s", (patient_id,))
-    result = cursor.fetchone()
-    if not result:
+    user_id = resolve_user_id(cursor, patient_id=patient_id)
+    if user_id is None:
         return jsonify({"error": "Patient not found"}), 404
 
-    user_id = result['user_id']
-
     # Step 2: query meal plans (created or assigned)
     query = """
     SELECT DISTINCT
@@ -629,11 +618,9 @@ def get_doctor_meal_plans(doctor_id):
     cursor = mysql.connection.cursor(DictCursor)
 
     # Step 1: Get the doctor’s user_id from USER table
-    cursor.execute("SELECT user_id FROM USER WHERE doctor_id = %s", (doctor_id,))
-    user = cursor.fetchone()
-    if not user:
+    user_id = resolve_user_id(cursor, doctor_id=doctor_id)
+    if user_id is None:
         return jsonify({"error": "Doctor not found"}), 404
-    user_id = user['user_id']
 
     # Step 2: Get all meal plans created by OR saved by the doctor
     query = """
@@ -1,6 +1,17 @@
 from flask import Blueprint, request, jsonify
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from db import mysql
+from db import mysql, pool
+from login_service import login, hash_password
+from cache import (invalidate_doctor, invalidate_cohort, invalidate_patient_cohort,
+                   patient_cache, invalidate_patient, to_json_bytes, json_response)
+from ledger import lock_balance, post_entry
+from billing import bill_appointments, find_unbilled_appointments
+from pagination import encode_cursor, decode_cursor, parse_limit, parse_date
+from notifications import push, doctor_room, patient_room
+from dashboard import load_dashboard
+from surveys import sync_surveys, upsert_sql, refresh_weekly_series
+import config
 import bcrypt, base64
 from google.cloud import storage
 import time
@@ -13,6 +24,15 @@ os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credentials_path
 GCS_BUCKET = "image-bucket-490"
 storage_client = storage.Client()
 
+# registration hands picture uploads to this pool so sign-up never waits on GCS
+_upload_pool = ThreadPoolExecutor(max_workers=config.UPLOAD_WORKERS, thread_name_prefix='upload')
+
+REGISTRATION_REQUIRED = (
+    'patient_email', 'patient_password', 'first_name', 'last_name', 'mobile_number', 'dob',
+    'blood_type', 'patient_address', 'patient_zipcode', 'patient_city', 'patient_state'
+)
+PHARMACY_NATURAL_KEY = ('pharmacy_name', 'pharmacy_address', 'pharmacy_zipcode')
+
 #--------------------REGISTRATION END POINTS------------------------------ 
 # register patient + init survey combined
 @patient_bp.route('/register-patient-with-survey', methods=['POST'])
@@ -38,6 +58,9 @@ def register_patient_with_survey():
                 type: string
               last_name:
                 type: string
+              pharmacy_id:
+                type: integer
+                description: Registered pharmacy; when given, name/address/zipcode are not needed
               pharmacy_name:
                 type: string
               pharmacy_address:
@@ -95,51 +118,47 @@ def register_patient_with_survey():
         description: Error occurred during registration
     """
 
-    data = request.get_json()
-    cursor = mysql.connection.cursor()
+    data = request.get_json(silent=True) or {}
+
+    # reject bad requests before they cost a bcrypt round or a DB connection
+    missing = [f for f in REGISTRATION_REQUIRED if not data.get(f)]
+    if not data.get('pharmacy_id') and not all(data.get(f) for f in PHARMACY_NATURAL_KEY):
+        missing.append('pharmacy_id or pharmacy_name/pharmacy_address/pharmacy_zipcode')
+    if missing:
+        return jsonify({"error": f"Missing required fields: {', '.join(missing)}"}), 400
 
+    patient_picture = None
+    if data.get('patient_picture'):  # Base64 encoded image data
+        try:
+            # clients may send MIME-style line-wrapped base64; anything else outside the alphabet is rejected
+            patient_picture = base64.b64decode(''.join(data['patient_picture'].split()), validate=True)
+        except Exception:
+            return jsonify({"error": "patient_picture must be base64 encoded."}), 400
+
+    # bcrypt runs on the worker pool before this request ever takes a DB connection
+    hashed_password = hash_password(data['patient_password'])
+
+    cursor = mysql.connection.cursor()
     try:
-        
-        # hash the password ---
-        password = data['patient_password']
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-
-        # Get pharmacy ID ---
-        find_pharmacy_query = """
-            SELECT pharmacy_id FROM PHARMACY
-            WHERE pharmacy_name = %s AND address = %s AND zipcode = %s
-        """
-        pharmacy_values = (
-            data['pharmacy_name'],
-            data['pharmacy_address'],
-            data['pharmacy_zipcode']
-        )
-        cursor.execute(find_pharmacy_query, pharmacy_values)
-        pharmacy = cursor.fetchone()
+        # Get pharmacy ID --- by id, or by (zipcode, name) through idx_pharmacy_lookup
+        pharmacy_id = data.get('pharmacy_id')
+        if pharmacy_id is None:
+            cursor.execute("""
+                SELECT pharmacy_id FROM PHARMACY
+                WHERE zipcode = %s AND pharmacy_name = %s AND address = %s
+            """, (data['pharmacy_zipcode'], data['pharmacy_name'], data['pharmacy_address']))
+            pharmacy = cursor.fetchone()
 
-        if not pharmacy:
-            return jsonify({"error": "Pharmacy not found. Please register the pharmacy first."}), 400
-        pharmacy_id = pharmacy[0]
+            if not pharmacy:
+                return jsonify({"error": "Pharmacy not found. Please register the pharmacy first."}), 400
+            pharmacy_id = pharmacy[0]
 
-        patient_picture_url = None
-        patient_picture = data.get('patient_picture')  # Base64 encoded image data
-        if patient_picture:
-            try:
-                patient_picture = base64.b64decode(patient_picture)
-                filename = f"patients/{data['first_name']}_{data['last_name']}_{int(time.time())}.png"
-                bucket = storage_client.bucket(GCS_BUCKET)
-                blob = bucket.blob(filename)
-                blob.upload_from_string(patient_picture, content_type='image/png')
-
-                patient_picture_url = f"https://storage.googleapis.com/{GCS_BUCKET}/{filename}"
-            except Exception as e:
-                return jsonify({"error": f"Failed to upload image: {str(e)}"}), 400
-        # Insert patient ---
+        # Insert patient --- profile_pic is filled in by the background upload
         insert_patient_query = """
             INSERT INTO PATIENT (
                 patient_email, patient_password, first_name, last_name,
-                pharmacy_id, insurance_provider, insurance_policy_number, insurance_expiration_date, profile_pic
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                pharmacy_id, insurance_provider, insurance_policy_number, insurance_expiration_date
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         """
         patient_values = (
             data['patient_email'],
@@ -149,8 +168,7 @@ def register_patient_with_survey():
             pharmacy_id,
             data.get('insurance_provider'),
             data.get('insurance_policy_number'),
-            data.get('insurance_expiration_date'),
-            patient_picture_url
+            data.get('insurance_expiration_date')
         )
         cursor.execute(insert_patient_query, patient_values)
 
@@ -202,12 +220,45 @@ def register_patient_with_survey():
 
         # Commit transaction ---
         mysql.connection.commit()
-        return jsonify({"message": "Patient registered successfully!"}), 201
 
     except Exception as e:
         mysql.connection.rollback()
         return jsonify({"error": str(e)}), 400
 
+    finally:
+        cursor.close()
+
+    if patient_picture:
+        _upload_pool.submit(_upload_patient_picture, patient_id, patient_picture)
+
+    return jsonify({
+        "message": "Patient registered successfully!",
+        "patient_id": patient_id,
+        "profile_pic_pending": bool(patient_picture)
+    }), 201
+
+
+def _upload_patient_picture(patient_id, image):
+    """
+    Background stage of registration: push the picture to GCS, then point the patient at it.
+    A failure leaves profile_pic NULL, the same as registering without a picture.
+    """
+    try:
+        filename = f"patients/{patient_id}_{int(time.time())}.png"
+        blob = storage_client.bucket(GCS_BUCKET).blob(filename)
+        blob.upload_from_string(image, content_type='image/png')
+
+        with pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("UPDATE PATIENT SET profile_pic = %s WHERE patient_id = %s",
+                               (f"https://storage.googleapis.com/{GCS_BUCKET}/{filename}", patient_id))
+            finally:
+                cursor.close()
+        invalidate_patient(patient_id)
+    except Exception as e:
+        print(f"profile picture upload for patient {patient_id} failed: {e}")
+
 @patient_bp.route('/patient/<int:patient_id>', methods=['GET'])
 def get_patient(patient_id):
     """
@@ -256,6 +307,11 @@ def get_patient(patient_id):
       400:
         description: Error occurred during retrieval
     """    
+    cache_key = f'patient:{patient_id}'
+    body = patient_cache.get(cache_key)
+    if body is not None:
+        return json_response(body)
+
     cursor = mysql.connection.cursor()
 
     query = """
@@ -287,13 +343,70 @@ def get_patient(patient_id):
                 'insurance_provider', 'insurance_policy_number', 'insurance_expiration_date', 'user_id'
             ]
             patient_info = dict(zip(keys, result))
-            return jsonify(patient_info), 200
+            body = to_json_bytes(patient_info)
+            patient_cache.set(cache_key, body)
+            return json_response(body)
         else:
             return jsonify({"error": "Patient not found"}), 404
 
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+# everything the app needs on open, in one request
+@patient_bp.route('/patient/<int:patient_id>/dashboard', methods=['GET'])
+def get_patient_dashboard(patient_id):
+    """
+    Patient dashboard: profile, appointments, surveys, meal plans and balance in one payload
+    ---
+    tags:
+      - Patient
+    parameters:
+      - name: patient_id
+        in: path
+        type: integer
+        required: true
+      - name: limit
+        in: query
+        type: integer
+        description: Rows per list section (default 5, max 20)
+    responses:
+      200:
+        description: Dashboard payload; each list section has items and has_more
+        content:
+          application/json:
+            example:
+              profile:
+                patient_id: 5
+                first_name: "Jane"
+                last_name: "Doe"
+                acct_balance: "-120.00"
+              upcoming_appointments:
+                items:
+                  - patient_appt_id: 88
+                    doctor_name: "Dr. Alice Nguyen"
+                    appointment_datetime: "Mon, 05 May 2025 10:30:00 GMT"
+                has_more: false
+              daily_surveys: { items: [], has_more: false }
+      404:
+        description: Patient not found
+      400:
+        description: Invalid limit or retrieval failed
+    """
+    try:
+        limit = parse_limit(request.args.get('limit'), default=None, maximum=20)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        dashboard = load_dashboard(patient_id, limit)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    if dashboard is None:
+        return jsonify({"error": "Patient not found"}), 404
+    return jsonify(dashboard), 200
+
+
 @patient_bp.route('/init-patient-survey', methods=['POST'])
 def init_patient_survey():
     """
@@ -430,6 +543,7 @@ def init_patient_survey():
     try:
         cursor.execute(insert_query, values)
         mysql.connection.commit()
+        invalidate_patient(data['patient_id'])
         return jsonify({"message": "Patient survey submitted successfully!"}), 201
     except Exception as e:
         mysql.connection.rollback()
@@ -499,6 +613,11 @@ def get_patient_init_survey(patient_id):
       400:
         description: Error occurred during retrieval
     """    
+    cache_key = f'patient-survey:{patient_id}'
+    body = patient_cache.get(cache_key)
+    if body is not None:
+        return json_response(body)
+
     cursor = mysql.connection.cursor()
 
     query = """
@@ -542,7 +661,9 @@ def get_patient_init_survey(patient_id):
                 'family_history', 'past_procedures', 'patient_email', 'first_name', 'last_name', 'favorite_meal', 'health_goals', 'picture'
             ]
             survey_info = dict(zip(keys, result))
-            return jsonify(survey_info), 200
+            body = to_json_bytes(survey_info)
+            patient_cache.set(cache_key, body)
+            return json_response(body)
         else:
             return jsonify({"error": "Patient survey not found"}), 404
 
@@ -603,6 +724,10 @@ def select_doctor():
     try:
         cursor.execute(update_query, values)
         mysql.connection.commit()
+        # the patient leaves one cohort and joins another
+        invalidate_patient(data['patient_id'])
+        invalidate_patient_cohort(data['patient_id'])
+        invalidate_cohort(data['doctor_id'])
         return jsonify({"message": "Doctor assigned successfully!"}), 200
     except Exception as e:
         mysql.connection.rollback()
@@ -665,6 +790,8 @@ def remove_patient_doctor(patient_id):
             WHERE patient_id = %s
         """, (patient_id,))
         mysql.connection.commit()
+        invalidate_patient(patient_id)
+        invalidate_cohort(patient[0])
 
         return jsonify({"message": "Doctor successfully removed from patient."}), 200
 
@@ -725,6 +852,8 @@ def login_patient():
                 value:
                   message: Login successful
                   patient_id: 123
+                  user_id: 456
+                  token: "<signed session token>"
       401:
         description: Invalid credentials
         content:
@@ -743,91 +872,11 @@ def login_patient():
     password = data.get('password')
 
     cursor = mysql.connection.cursor()
-
     try:
-        # Step 1: Get all emails from the first 351 entries
-        cursor.execute("SELECT patient_email FROM PATIENT ORDER BY patient_id ASC LIMIT 351")
-        test_emails = set(row[0] for row in cursor.fetchall())
-
-        # Step 2: Get patient info by email
-        cursor.execute("SELECT patient_id, patient_password FROM PATIENT WHERE patient_email = %s", (email,))
-        patient = cursor.fetchone()
-
-        if patient:
-            patient_id, stored_password = patient
-
-            if email in test_emails:
-                # Password is in plain text
-                if password == stored_password:
-                    return jsonify({"message": "Login successful (legacy plain text)", "patient_id": patient_id}), 200
-                else:
-                    return jsonify({"error": "Invalid credentials"}), 401
-            else:
-                # Password is hashed
-                if bcrypt.checkpw(password.encode('utf-8'), stored_password.encode('utf-8')):
-                    return jsonify({"message": "Login successful", "patient_id": patient_id}), 200
-                else:
-                    return jsonify({"error": "Invalid credentials"}), 401
-        else:
-            return jsonify({"error": "Patient not found"}), 404
+        return login(cursor, 'patient', email, password)
     finally:
         cursor.close()
 
-'''
-#login patient w/o pw
-@patient_bp.route('/login-patient', methods=['POST'])
-def login_patient():
-    """
-    Login a patient using email for testing purposes
-
-    ---
-    tags:
-      - Patient
-    requestBody:
-      required: true
-      content:
-        application/json:
-          schema:
-            type: object
-            required:
-              - email
-            properties:
-              email:
-                type: string
-                format: email
-                description: The patient's registered email address
-          example:
-            email: "john.doe@example.com"
-    responses:
-      200:
-        description: Login successful
-        content:
-          application/json:
-            example:
-              message: Login successful
-              patient_id: 123
-      404:
-        description: Patient not found
-        content:
-          application/json:
-            example:
-              error: Patient not found
-    """
-    data = request.get_json()
-    email = data.get('email')
-    # Ignoring password for testing
-
-    cursor = mysql.connection.cursor()
-
-    query = "SELECT patient_id FROM PATIENT WHERE patient_email = %s"
-    cursor.execute(query, (email,))
-    patient = cursor.fetchone()
-
-    if patient:
-        return jsonify({"message": "Login successful", "patient_id": patient[0]}), 200
-    else:
-        return jsonify({"error": "Patient not found"}), 404
-'''
 #---------------------------- DAILY + WEEKLY SURVEY END POINTS ------------------------------------
 
 # add to daily survey
@@ -891,18 +940,8 @@ def add_daily_survey():
     data = request.get_json()
     cursor = mysql.connection.cursor()
 
-    insert_query = """
-        INSERT INTO PATIENT_DAILY_SURVEY (
-            patient_id,
-            date,
-            water_intake,
-            calories_consumed,
-            heart_rate,
-            exercise,
-            mood,
-            follow_plan
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-    """
+    # resubmitting the same day overwrites it instead of adding a second row
+    insert_query = upsert_sql('daily')
     
     values = (
         data['patient_id'],
@@ -918,11 +957,97 @@ def add_daily_survey():
     try:
         cursor.execute(insert_query, values)
         mysql.connection.commit()
+        invalidate_patient_cohort(data['patient_id'])
         return jsonify({"message": "Daily survey submitted successfully!"}), 201
     except Exception as e:
         mysql.connection.rollback()
         return jsonify({"error": str(e)}), 400
     
+# table, id column, date column, sort direction and columns for the survey list endpoints
+SURVEY_LISTS = {
+    'daily': {
+        'table': 'PATIENT_DAILY_SURVEY',
+        'id': 'ds_id',
+        'date': 'date',
+        'descending': False,
+        'columns': ('ds_id', 'patient_id', 'date', 'water_intake', 'calories_consumed', 'heart_rate',
+                    'exercise', 'mood', 'follow_plan', 'created_at', 'updated_at'),
+    },
+    'weekly': {
+        'table': 'PATIENT_WEEKLY',
+        'id': 'ws_id',
+        'date': 'week_start',
+        'descending': True,
+        'columns': ('ws_id', 'patient_id', 'week_start', 'blood_pressure', 'weight_change',
+                    'weight', 'bmi', 'created_at', 'updated_at'),
+    },
+}
+
+
+def _survey_page(kind, patient_id):
+    """
+    One window of a patient's surveys for /daily-surveys and /weekly-surveys.
+    Without limit/from/to this is the whole history, as before; with a limit the next
+    page's keyset cursor goes in the X-Next-Cursor header.
+    """
+    spec = SURVEY_LISTS[kind]
+    try:
+        date_from = parse_date(request.args.get('from'))
+        date_to = parse_date(request.args.get('to'))
+        limit = parse_limit(request.args.get('limit')) if request.args.get('limit') else None
+        after = decode_cursor(request.args.get('cursor'))
+        if after is not None and len(after) != 2:
+            raise ValueError("Invalid cursor.")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    date_column, id_column = spec['date'], spec['id']
+    conditions = ["patient_id = %s"]
+    params = [patient_id]
+    if date_from:
+        conditions.append(f"{date_column} >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append(f"{date_column} <= %s")
+        params.append(date_to)
+    if after is not None:
+        op = '<' if spec['descending'] else '>'
+        conditions.append(f"({date_column} {op} %s OR ({date_column} = %s AND {id_column} {op} %s))")
+        params.extend([after[0], after[0], after[1]])
+
+    direction = 'DESC' if spec['descending'] else 'ASC'
+    query = f"""
+        SELECT {', '.join(spec['columns'])}
+        FROM {spec['table']}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {date_column} {direction}, {id_column} {direction}
+    """
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit + 1)
+
+    cursor = mysql.connection.cursor()
+    try:
+        cursor.execute(query, tuple(params))
+        surveys = cursor.fetchall()
+        columns = [desc[0] for desc in cursor.description]
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        cursor.close()
+
+    results = [dict(zip(columns, row)) for row in surveys]
+    next_cursor = None
+    if limit is not None and len(results) > limit:
+        results = results[:limit]
+        next_cursor = encode_cursor([results[-1][date_column], results[-1][id_column]])
+
+    response = jsonify(results)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
+
+
 # get daily survey
 @patient_bp.route('/daily-surveys/<int:patient_id>', methods=['GET'])
 def get_daily_surveys(patient_id):
@@ -937,6 +1062,24 @@ def get_daily_surveys(patient_id):
         required: true
         type: integer
         description: ID of the patient
+      - name: from
+        in: query
+        type: string
+        format: date
+        description: First day to include (YYYY-MM-DD)
+      - name: to
+        in: query
+        type: string
+        format: date
+        description: Last day to include (YYYY-MM-DD)
+      - name: limit
+        in: query
+        type: integer
+        description: Page size; the next page's cursor comes back in the X-Next-Cursor header
+      - name: cursor
+        in: query
+        type: string
+        description: X-Next-Cursor from the previous page
     responses:
       200:
         description: List of daily survey records
@@ -969,22 +1112,200 @@ def get_daily_surveys(patient_id):
       400:
         description: Retrieval failed
     """    
+    return _survey_page('daily', patient_id)
+
+# period start for each analytics bucket (weeks start on Monday)
+SURVEY_BUCKETS = {
+    'day': "date",
+    'week': "DATE_SUB(date, INTERVAL WEEKDAY(date) DAY)",
+    'month': "DATE_SUB(date, INTERVAL DAYOFMONTH(date) - 1 DAY)",
+}
+SURVEY_METRICS = ('water_intake', 'calories_consumed', 'heart_rate', 'exercise')
+
+
+# charting data: daily survey aggregates per day/week/month, computed by MySQL
+@patient_bp.route('/patient/<int:patient_id>/survey-analytics', methods=['GET'])
+def get_survey_analytics(patient_id):
+    """
+    Aggregate a patient's daily surveys per day, week or month
+    ---
+    tags:
+      - Survey
+    parameters:
+      - name: patient_id
+        in: path
+        required: true
+        type: integer
+      - name: bucket
+        in: query
+        type: string
+        enum: [day, week, month]
+        description: Period size (default week)
+      - name: from
+        in: query
+        type: string
+        format: date
+        description: First survey day (YYYY-MM-DD)
+      - name: to
+        in: query
+        type: string
+        format: date
+        description: Last survey day (YYYY-MM-DD)
+    responses:
+      200:
+        description: One entry per period in every array, oldest first
+        content:
+          application/json:
+            example:
+              bucket: week
+              periods: ["2024-04-01", "2024-04-08"]
+              surveys: [7, 5]
+              adherence: [0.86, 0.6]
+              water_intake: { mean: [6.14, 7.0], min: [4, 5], max: [8, 9] }
+              calories_consumed: { mean: [2010.5, 1985.0], min: [1800, 1700], max: [2300, 2200] }
+              heart_rate: { mean: [72.3, 70.8], min: [65, 66], max: [80, 77] }
+              exercise: { mean: [31.4, 25.0], min: [0, 10], max: [60, 45] }
+      400:
+        description: Invalid bucket or dates, or retrieval failed
+    """
+    bucket = request.args.get('bucket', 'week')
+    if bucket not in SURVEY_BUCKETS:
+        return jsonify({"error": "bucket must be one of day, week, month."}), 400
+    try:
+        date_from = parse_date(request.args.get('from'))
+        date_to = parse_date(request.args.get('to'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conditions = ["patient_id = %s"]
+    params = [patient_id]
+    if date_from:
+        conditions.append("date >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append("date <= %s")
+        params.append(date_to)
+
+    aggregates = ', '.join(
+        f"ROUND(AVG({m}), 2), MIN({m}), MAX({m})" for m in SURVEY_METRICS
+    )
+    query = f"""
+        SELECT {SURVEY_BUCKETS[bucket]} AS period,
+               COUNT(*),
+               ROUND(AVG(follow_plan = 1), 2),
+               {aggregates}
+        FROM PATIENT_DAILY_SURVEY
+        WHERE {' AND '.join(conditions)}
+        GROUP BY period
+        ORDER BY period
+    """
+
     cursor = mysql.connection.cursor()
-    
-    query = """
-        SELECT * FROM PATIENT_DAILY_SURVEY
-        WHERE patient_id = %s
-        ORDER BY date ASC
+    try:
+        cursor.execute(query, tuple(params))
+        rows = cursor.fetchall()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        cursor.close()
+
+    # column-oriented so years of weekly points stay a few hundred bytes
+    def column(index):
+        return [float(row[index]) if row[index] is not None else None for row in rows]
+
+    result = {
+        "bucket": bucket,
+        "periods": [row[0].isoformat() if hasattr(row[0], 'isoformat') else str(row[0]) for row in rows],
+        "surveys": [row[1] for row in rows],
+        "adherence": column(2),
+    }
+    for i, metric in enumerate(SURVEY_METRICS):
+        base = 3 + i * 3
+        result[metric] = {"mean": column(base), "min": column(base + 1), "max": column(base + 2)}
+    return jsonify(result), 200
+
+# offline sync: many daily/weekly surveys in one request, upserted by day/week
+@patient_bp.route('/surveys/sync', methods=['POST'])
+def sync_patient_surveys():
+    """
+    Upsert a batch of daily and weekly surveys for one patient
+    ---
+    tags:
+      - Survey
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            required:
+              - patient_id
+            properties:
+              patient_id:
+                type: integer
+              daily:
+                type: array
+                items:
+                  type: object
+              weekly:
+                type: array
+                items:
+                  type: object
+          example:
+            patient_id: 5
+            daily:
+              - date: "2025-05-01"
+                water_intake: 8
+                calories_consumed: 2100
+                heart_rate: 70
+                exercise: 30
+                mood: "Happy"
+                follow_plan: 1
+            weekly:
+              - week_start: "2025-04-28"
+                blood_pressure: "120/80"
+                weight_change: -1.2
+    responses:
+      200:
+        description: One status per submitted record (created, updated, duplicate or invalid)
+        content:
+          application/json:
+            example:
+              daily:
+                - index: 0
+                  date: "2025-05-01"
+                  status: created
+              weekly:
+                - index: 0
+                  week_start: "2025-04-28"
+                  status: updated
+      400:
+        description: Malformed batch or database error
     """
-    
+    data = request.get_json(silent=True) or {}
+    patient_id = data.get('patient_id')
+    if not isinstance(patient_id, int):
+        return jsonify({"error": "patient_id must be an integer."}), 400
+
+    batches = {kind: data.get(kind) or [] for kind in ('daily', 'weekly')}
+    if any(not isinstance(records, list) for records in batches.values()):
+        return jsonify({"error": "daily and weekly must be lists."}), 400
+    if sum(len(records) for records in batches.values()) > config.SURVEY_SYNC_MAX_RECORDS:
+        return jsonify({"error": f"At most {config.SURVEY_SYNC_MAX_RECORDS} records per sync."}), 400
+
+    cursor = mysql.connection.cursor()
     try:
-        cursor.execute(query, (patient_id,))
-        surveys = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        results = [dict(zip(columns, row)) for row in surveys]
-        return jsonify(results), 200
+        result = {kind: sync_surveys(cursor, patient_id, kind, records) for kind, records in batches.items()}
+        if batches['weekly']:
+            refresh_weekly_series(cursor, [patient_id])
+        mysql.connection.commit()
+        invalidate_patient_cohort(patient_id)
+        return jsonify(result), 200
     except Exception as e:
+        mysql.connection.rollback()
         return jsonify({"error": str(e)}), 400
+    finally:
+        cursor.close()
 
 # add to weekly survey
 @patient_bp.route('/weekly-survey', methods=['POST'])
@@ -1031,14 +1352,8 @@ def add_weekly_survey():
     data = request.get_json()
     cursor = mysql.connection.cursor()
 
-    insert_query = """
-        INSERT INTO PATIENT_WEEKLY (
-            patient_id,
-            week_start,
-            blood_pressure,
-            weight_change
-        ) VALUES (%s, %s, %s, %s)
-    """
+    # resubmitting the same week overwrites it instead of adding a second row
+    insert_query = upsert_sql('weekly')
     
     values = (
         data['patient_id'],
@@ -1049,7 +1364,9 @@ def add_weekly_survey():
 
     try:
         cursor.execute(insert_query, values)
+        refresh_weekly_series(cursor, [data['patient_id']])
         mysql.connection.commit()
+        invalidate_patient_cohort(data['patient_id'])
         return jsonify({"message": "Weekly survey submitted successfully!"}), 201
     except Exception as e:
         mysql.connection.rollback()
@@ -1070,6 +1387,24 @@ def get_weekly_surveys(patient_id):
         schema:
           type: integer
         description: ID of the patient
+      - name: from
+        in: query
+        type: string
+        format: date
+        description: First day to include (YYYY-MM-DD)
+      - name: to
+        in: query
+        type: string
+        format: date
+        description: Last day to include (YYYY-MM-DD)
+      - name: limit
+        in: query
+        type: integer
+        description: Page size; the next page's cursor comes back in the X-Next-Cursor header
+      - name: cursor
+        in: query
+        type: string
+        description: X-Next-Cursor from the previous page
     responses:
       200:
         description: List of weekly survey records
@@ -1106,22 +1441,7 @@ def get_weekly_surveys(patient_id):
       400:
         description: Retrieval failed
     """
-    cursor = mysql.connection.cursor()
-
-    query = """
-        SELECT * FROM PATIENT_WEEKLY
-        WHERE patient_id = %s
-        ORDER BY week_start DESC
-    """
-
-    try:
-        cursor.execute(query, (patient_id,))
-        surveys = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        results = [dict(zip(columns, row)) for row in surveys]
-        return jsonify(results), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
+    return _survey_page('weekly', patient_id)
 
 #----------------------------APPOINTMENT ENDPOINTS--------------------------------- 
 # add an appt
@@ -1212,6 +1532,13 @@ def add_appointment():
     try:
         cursor.execute(insert_query, values)
         mysql.connection.commit()
+        push('appointment_requested', {
+            "appt_id": cursor.lastrowid,
+            "patient_id": data['patient_id'],
+            "doctor_id": data['doctor_id'],
+            "appointment_datetime": data['appointment_datetime'],
+            "reason_for_visit": data['reason_for_visit']
+        }, doctor_room(data['doctor_id']))
         return jsonify({"message": "Appointment created successfully!"}), 201
     except Exception as e:
         mysql.connection.rollback()
@@ -1402,46 +1729,49 @@ def rate_appointment():
     cursor = mysql.connection.cursor()
 
     try:
-        # Update the appointment's rating
+        # Lock the appointment so two ratings of it can't both count as "first"
         cursor.execute("""
-            UPDATE PATIENT_APPOINTMENT
-            SET appt_rating = %s
+            SELECT doctor_id, appt_rating
+            FROM PATIENT_APPOINTMENT
             WHERE patient_appt_id = %s
-        """, (rating, appt_id))
-
-        if cursor.rowcount == 0:
+            FOR UPDATE
+        """, (appt_id,))
+        appointment = cursor.fetchone()
+        if not appointment:
             return jsonify({"error": "Appointment not found."}), 404
 
-        # Get the doctor_id for this appointment
+        doctor_id, previous_rating = appointment
+        if doctor_id is None:
+            return jsonify({"error": "Doctor not found for this appointment."}), 404
+
+        # Update the appointment's rating
         cursor.execute("""
-            SELECT doctor_id
-            FROM PATIENT_APPOINTMENT
+            UPDATE PATIENT_APPOINTMENT
+            SET appt_rating = %s
             WHERE patient_appt_id = %s
-        """, (appt_id,))
-        doctor_result = cursor.fetchone()
-        if not doctor_result:
-            return jsonify({"error": "Doctor not found for this appointment."}), 404
+        """, (rating, appt_id))
 
-        doctor_id = doctor_result[0]
+        # Fold the change into the doctor's running totals; a re-rating swaps the old value out.
+        # MySQL applies SET left to right, so doctor_rating sees the new sum and count.
+        if previous_rating is None:
+            delta_sum, delta_count = rating, 1
+        else:
+            delta_sum, delta_count = rating - float(previous_rating), 0
 
-        # Compute the average rating for the doctor
         cursor.execute("""
-            SELECT AVG(appt_rating)
-            FROM PATIENT_APPOINTMENT
-            WHERE doctor_id = %s AND appt_rating IS NOT NULL
-        """, (doctor_id,))
-        avg_result = cursor.fetchone()
-        avg_rating = float(avg_result[0]) if avg_result and avg_result[0] is not None else None
+            UPDATE DOCTOR
+            SET rating_sum = rating_sum + %s,
+                rating_count = rating_count + %s,
+                doctor_rating = rating_sum / NULLIF(rating_count, 0)
+            WHERE doctor_id = %s
+        """, (delta_sum, delta_count, doctor_id))
 
-        # Update the doctor's rating if an average exists
-        if avg_rating is not None:
-            cursor.execute("""
-                UPDATE DOCTOR
-                SET doctor_rating = %s
-                WHERE doctor_id = %s
-            """, (avg_rating, doctor_id))
+        cursor.execute("SELECT doctor_rating FROM DOCTOR WHERE doctor_id = %s", (doctor_id,))
+        rating_result = cursor.fetchone()
+        avg_rating = float(rating_result[0]) if rating_result and rating_result[0] is not None else None
 
         mysql.connection.commit()
+        invalidate_doctor(doctor_id)
 
         return jsonify({
             "message": "Appointment rated successfully and doctor's rating updated.",
@@ -1549,12 +1879,37 @@ def cancel_appointment(appointment_id):
     query = "DELETE FROM PATIENT_APPOINTMENT WHERE patient_appt_id = %s"
 
     try:
-        cursor.execute(query, (appointment_id,))
-        mysql.connection.commit()
+        # who to tell and what rating to take back, read (and locked) before the row is gone
+        cursor.execute("""
+            SELECT doctor_id, patient_id, appt_rating
+            FROM PATIENT_APPOINTMENT
+            WHERE patient_appt_id = %s
+            FOR UPDATE
+        """, (appointment_id,))
+        appt = cursor.fetchone()
+
+        # a rated appointment leaves the doctor's running totals with it; removing the last
+        # rating keeps the current doctor_rating, as flask reconcile-ratings does
+        if appt and appt[2] is not None:
+            cursor.execute("""
+                UPDATE DOCTOR
+                SET rating_sum = rating_sum - %s,
+                    rating_count = rating_count - 1,
+                    doctor_rating = COALESCE(rating_sum / NULLIF(rating_count, 0), doctor_rating)
+                WHERE doctor_id = %s
+            """, (appt[2], appt[0]))
 
+        cursor.execute(query, (appointment_id,))
         if cursor.rowcount == 0:
+            mysql.connection.rollback()
             return jsonify({"message": "Appointment not found."}), 404
+        mysql.connection.commit()
 
+        if appt:
+            if appt[2] is not None:
+                invalidate_doctor(appt[0])
+            push('appointment_status_changed', {"appt_id": appointment_id, "status": "cancelled"},
+                 doctor_room(appt[0]), patient_room(appt[1]))
         return jsonify({"message": "Appointment cancelled successfully."}), 200
     except Exception as e:
         mysql.connection.rollback()
@@ -1587,6 +1942,34 @@ def get_appointment_status(appt_id):
     finally:
          cursor.close()
 #-------------------------BILL ENDPOINTS ------------------------------------------------
+
+# statement columns shared by /bills and /statement: id, type, article, created_at,
+# doctor_bill, pharm_bill, credit, balance after the line
+LEDGER_STATEMENT_COLUMNS = """
+    COALESCE(l.bill_id, l.credit_id) AS id,
+    l.entry_type AS type,
+    IF(l.entry_type = 'credit', 'credit', CAST(pb.article AS CHAR)) AS article,
+    l.created_at,
+    pb.doctor_bill,
+    pb.pharm_bill,
+    IF(l.entry_type = 'credit', l.amount, NULL) AS credit,
+    l.balance_after
+"""
+
+
+def _statement_line(row):
+    row_id, row_type, article, created_at, doctor_bill, pharm_bill, credit, balance_after = row
+    return {
+        "id": row_id,
+        "article": article,
+        "created_at": created_at.isoformat(),
+        "doctor_bill": float(doctor_bill) if doctor_bill is not None else "",
+        "pharm_bill": float(pharm_bill) if pharm_bill is not None else "",
+        "credit": float(credit) if credit is not None else "",
+        "current_bill": round(float(balance_after), 2)
+    }
+
+
 # add a patient's bill - tested 
 @patient_bp.route('/patient/bill', methods=['POST'])
 def add_patient_bill():
@@ -1627,6 +2010,8 @@ def add_patient_bill():
         description: Error in billing logic or bad input
       404:
         description: Invalid appointment or doctor not found
+      409:
+        description: The appointment already has a bill; it is returned unchanged
     """
     data = request.get_json()
     appt_id = data.get('appt_id')
@@ -1651,6 +2036,34 @@ def add_patient_bill():
         patient_id, doctor_bill = result
         doctor_bill = float(doctor_bill)
 
+        # Hold the patient's balance until commit so concurrent bills/payments serialize
+        current_balance = lock_balance(cursor, patient_id)
+        if current_balance is None:
+            mysql.connection.rollback()
+            return jsonify({"error": "Patient not found for this appointment."}), 404
+
+        # One bill per appointment (uq_bill_appt). Anything that bills holds the patient's row,
+        # so with it locked this read sees every committed bill; hand the existing one back.
+        cursor.execute("""
+            SELECT bill_id, doctor_bill, pharm_bill, current_bill, article
+            FROM PATIENT_BILL
+            WHERE appt_id = %s
+            FOR SHARE
+        """, (appt_id,))
+        existing = cursor.fetchone()
+        if existing:
+            mysql.connection.rollback()
+            bill_id, existing_doctor, existing_pharm, existing_current, existing_article = existing
+            return jsonify({
+                "error": "This appointment has already been billed.",
+                "appt_id": appt_id,
+                "bill_id": bill_id,
+                "doctor_bill": float(existing_doctor) if existing_doctor is not None else None,
+                "pharm_bill": float(existing_pharm) if existing_pharm is not None else None,
+                "current_bill": float(existing_current) if existing_current is not None else None,
+                "article": existing_article
+            }), 409
+
         # Get pharm_bill
         cursor.execute("""
             SELECT IFNULL(SUM(pp.quantity * m.medicine_price), 0)
@@ -1661,25 +2074,17 @@ def add_patient_bill():
         pharm_result = cursor.fetchone()
         pharm_bill = float(pharm_result[0]) if pharm_result else 0.0
 
-        # Determine appointment count for article naming
-        if appt_id > 551:
-          cursor.execute("""
-              SELECT COUNT(*)
-              FROM PATIENT_BILL pb
-              JOIN PATIENT_APPOINTMENT pa ON pb.appt_id = pa.patient_appt_id
-              WHERE pa.patient_id = %s
-          """, (patient_id,))
-          count_result = cursor.fetchone()
-          appt_number = (count_result[0] or 0) + 1
-          article_name = f"Appt {appt_number}"
-        else:
-          cursor.execute("""
-              SELECT article
-              FROM PATIENT_BILL
-              WHERE appt_id = %s
-          """, (appt_id,))
-          article_result = cursor.fetchone()
-          article_name = f"Appt {article_result}"
+        # Determine appointment count for article naming. (Seeded appointments that already
+        # had a bill used to reuse its article here; they now get the 409 above.)
+        cursor.execute("""
+            SELECT COUNT(*)
+            FROM PATIENT_BILL pb
+            JOIN PATIENT_APPOINTMENT pa ON pb.appt_id = pa.patient_appt_id
+            WHERE pa.patient_id = %s
+        """, (patient_id,))
+        count_result = cursor.fetchone()
+        appt_number = (count_result[0] or 0) + 1
+        article_name = f"Appt {appt_number}"
 
         # Insert the new bill (charge only)
         current_bill = doctor_bill + pharm_bill
@@ -1687,26 +2092,10 @@ def add_patient_bill():
             INSERT INTO PATIENT_BILL (appt_id, doctor_bill, pharm_bill, current_bill, article)
             VALUES (%s, %s, %s, %s, %s)
         """, (appt_id, doctor_bill, pharm_bill, current_bill, article_name))
+        bill_id = cursor.lastrowid
 
-        # Calculate updated balance
-        cursor.execute("""
-            SELECT
-                (SELECT IFNULL(SUM(amount), 0) FROM PATIENT_CREDIT WHERE patient_id = %s)
-                -
-                (SELECT IFNULL(SUM(charge), 0)
-                 FROM PATIENT_BILL pb
-                 JOIN PATIENT_APPOINTMENT pa ON pb.appt_id = pa.patient_appt_id
-                 WHERE pa.patient_id = %s)
-        """, (patient_id, patient_id))
-        balance_result = cursor.fetchone()
-        balance = float(balance_result[0]) if balance_result else 0.0
-
-        # Update the patient's acct_balance
-        cursor.execute("""
-            UPDATE PATIENT
-            SET acct_balance = %s
-            WHERE patient_id = %s
-        """, (balance, patient_id))
+        # Ledger entry + acct_balance move
+        balance = float(post_entry(cursor, patient_id, current_balance, 'charge', current_bill, bill_id=bill_id))
 
         mysql.connection.commit()
 
@@ -1726,7 +2115,108 @@ def add_patient_bill():
     finally:
         cursor.close()
 
-# get bills for patient - needs to be updated
+# bill many appointments at once (end-of-day close out)
+@patient_bp.route('/patient/bills/batch', methods=['POST'])
+def add_patient_bills_batch():
+    """
+    Generate bills for a set of appointments, or every unbilled appointment in a date range
+
+    ---
+    tags:
+      - Billing
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            properties:
+              appt_ids:
+                type: array
+                items:
+                  type: integer
+              from:
+                type: string
+                format: date
+              to:
+                type: string
+                format: date
+          example:
+            from: "2025-05-01"
+            to: "2025-05-01"
+    responses:
+      201:
+        description: Appointments billed; already-billed or unknown ids are listed as skipped
+        content:
+          application/json:
+            example:
+              message: Bills recorded successfully.
+              billed: 2
+              total_charged: 240.0
+              balances:
+                "12": -120.0
+                "31": -95.0
+              skipped_appt_ids: [44]
+      207:
+        description: >
+          Some chunks failed and were rolled back. Same body as 201 plus "bills" (what was
+          committed) and "failed" ({appt_ids, error} per rolled-back chunk); re-send the failed ids.
+      400:
+        description: Bad input
+      500:
+        description: Every chunk failed; nothing was billed
+    """
+    data = request.get_json() or {}
+    appt_ids = data.get('appt_ids')
+
+    if appt_ids is not None:
+        if not isinstance(appt_ids, list) or not all(isinstance(a, int) for a in appt_ids):
+            return jsonify({"error": "appt_ids must be a list of integers."}), 400
+    else:
+        try:
+            date_from = parse_date(data.get('from'))
+            date_to = parse_date(data.get('to'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if not date_from or not date_to:
+            return jsonify({"error": "Provide appt_ids or both from and to."}), 400
+
+    try:
+        if appt_ids is None:
+            cursor = mysql.connection.cursor()
+            try:
+                appt_ids = find_unbilled_appointments(cursor, date_from, date_to)
+            finally:
+                cursor.close()
+
+        bills, skipped, failures = bill_appointments(mysql.connection, appt_ids)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    balances = {}
+    for bill in bills:
+        balances[bill["patient_id"]] = bill["balance"]
+
+    result = {
+        "message": "Bills recorded successfully.",
+        "billed": len(bills),
+        "total_charged": round(sum(b["current_bill"] for b in bills), 2),
+        "balances": balances,
+        "skipped_appt_ids": skipped
+    }
+    if not failures:
+        return jsonify(result), 201
+
+    # earlier/later chunks stay committed; say exactly which bills exist and what to retry
+    result.update(
+        message="Some appointments could not be billed." if bills else "No appointments could be billed.",
+        bills=[{"appt_id": b["appt_id"], "bill_id": b["bill_id"], "patient_id": b["patient_id"],
+                "current_bill": b["current_bill"]} for b in bills],
+        failed=failures
+    )
+    return jsonify(result), 207 if bills else 500
+
+# get bills for patient - full statement, see /statement for the paginated version
 @patient_bp.route('/patient/<int:patient_id>/bills', methods=['GET'])
 def get_all_bills_for_patient(patient_id):
     """
@@ -1804,69 +2294,138 @@ def get_all_bills_for_patient(patient_id):
     """
     cursor = mysql.connection.cursor()
 
-    # Combined query: bills and credits ordered by created_at
-    query = """
-        (
-            SELECT 
-                pb.bill_id AS id,
-                'charge' AS type,
-                CAST(pb.article AS CHAR) AS article,
-                pb.created_at,
-                pb.doctor_bill,
-                pb.pharm_bill,
-                NULL AS credit,
-                pb.charge
-            FROM PATIENT_BILL pb
-            JOIN PATIENT_APPOINTMENT pa ON pb.appt_id = pa.patient_appt_id
-            WHERE pa.patient_id = %s
-        )
-        UNION ALL
-        (
-            SELECT 
-                pc.credit_id AS id,
-                'credit' AS type,
-                'credit' AS article,
-                pc.created_at,
-                NULL AS doctor_bill,
-                NULL AS pharm_bill,
-                pc.amount AS credit,
-                0.00 AS charge
-            FROM PATIENT_CREDIT pc
-            WHERE pc.patient_id = %s
-        )
-        ORDER BY created_at
+    # Ledger rows already carry the running balance, so no Python-side walk
+    query = f"""
+        SELECT {LEDGER_STATEMENT_COLUMNS}
+        FROM PATIENT_LEDGER l
+        LEFT JOIN PATIENT_BILL pb ON pb.bill_id = l.bill_id
+        WHERE l.patient_id = %s
+        ORDER BY l.entry_id
     """
 
     try:
-        cursor.execute(query, (patient_id, patient_id))
+        cursor.execute(query, (patient_id,))
         rows = cursor.fetchall()
         cursor.close()
 
-        bills = []
-        balance = 0.0
+        bills = [_statement_line(row) for row in rows]
+        return jsonify(bills), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
 
-        for row in rows:
-            row_id, row_type, article, created_at, doctor_bill, pharm_bill, credit, charge = row
+# paginated statement with running balance
+@patient_bp.route('/patient/<int:patient_id>/statement', methods=['GET'])
+def get_patient_statement(patient_id):
+    """
+    Retrieve one page of a patient's billing statement with running balance
 
-            if row_type == "credit":
-                balance += float(credit)
-            else:  # it's a charge
-                balance -= float(charge)
+    ---
+    tags:
+      - Billing
+    parameters:
+      - name: patient_id
+        in: path
+        required: true
+        schema:
+          type: integer
+      - name: from
+        in: query
+        description: First day to include (YYYY-MM-DD)
+        schema:
+          type: string
+          format: date
+      - name: to
+        in: query
+        description: Last day to include (YYYY-MM-DD)
+        schema:
+          type: string
+          format: date
+      - name: limit
+        in: query
+        schema:
+          type: integer
+          default: 20
+          maximum: 100
+      - name: cursor
+        in: query
+        description: next_cursor from the previous page
+        schema:
+          type: string
+    responses:
+      200:
+        description: Statement lines oldest first; current_bill is the balance after each line
+        content:
+          application/json:
+            example:
+              opening_balance: 0.0
+              entries:
+                - id: 10
+                  article: "Appt 3"
+                  created_at: "2025-05-12T10:00:00"
+                  doctor_bill: 75.0
+                  pharm_bill: 45.0
+                  credit: ""
+                  current_bill: -120.0
+              next_cursor: "WzQyXQ=="
+      400:
+        description: Invalid date, limit or cursor
+    """
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        after = decode_cursor(request.args.get('cursor'))
+        if after is not None and len(after) != 1:
+            raise ValueError("Invalid cursor.")
+        date_from = parse_date(request.args.get('from'))
+        date_to = parse_date(request.args.get('to'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-            bills.append({
-                "id": row_id,
-                "article": article,
-                "created_at": created_at.isoformat(),
-                "doctor_bill": float(doctor_bill) if doctor_bill is not None else "",
-                "pharm_bill": float(pharm_bill) if pharm_bill is not None else "",
-                "credit": float(credit) if credit is not None else "",
-                "current_bill": round(balance, 2)
-            })
+    conditions = ["l.patient_id = %s"]
+    params = [patient_id]
+    if date_from:
+        conditions.append("l.created_at >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append("l.created_at < %s + INTERVAL 1 DAY")
+        params.append(date_to)
+    if after is not None:
+        conditions.append("l.entry_id > %s")
+        params.append(after[0])
+
+    query = f"""
+        SELECT l.entry_id, l.amount, {LEDGER_STATEMENT_COLUMNS}
+        FROM PATIENT_LEDGER l
+        LEFT JOIN PATIENT_BILL pb ON pb.bill_id = l.bill_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY l.entry_id
+        LIMIT %s
+    """
+    params.append(limit + 1)
 
-        return jsonify(bills), 200
+    cursor = mysql.connection.cursor()
+    try:
+        cursor.execute(query, tuple(params))
+        rows = cursor.fetchall()
+
+        page = rows[:limit]
+        entries = [_statement_line(row[2:]) for row in page]
+
+        # balance before the first line on this page
+        opening_balance = round(float(page[0][-1]) - float(page[0][1]), 2) if page else None
+        next_cursor = encode_cursor([page[-1][0]]) if len(rows) > limit else None
+
+        return jsonify({
+            "opening_balance": opening_balance,
+            "entries": entries,
+            "next_cursor": next_cursor
+        }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 400
+    finally:
+        cursor.close()
 
 
 # make a payment - take in credit - tested 
@@ -1925,28 +2484,16 @@ def make_general_payment(patient_id):
     cursor = mysql.connection.cursor()
 
     try:
-        # Check if patient exists
-        cursor.execute("""
-            SELECT 1 FROM PATIENT WHERE patient_id = %s
-        """, (patient_id,))
-        if not cursor.fetchone():
+        # Check if patient exists and lock their balance until commit
+        locked_balance = lock_balance(cursor, patient_id)
+        if locked_balance is None:
+            mysql.connection.rollback()
             return jsonify({"error": "Invalid patient_id."}), 404
-
-        # Compute current balance
-        cursor.execute("""
-            SELECT
-                (SELECT IFNULL(SUM(amount), 0) FROM PATIENT_CREDIT WHERE patient_id = %s)
-                -
-                (SELECT IFNULL(SUM(charge), 0)
-                 FROM PATIENT_BILL pb
-                 JOIN PATIENT_APPOINTMENT pa ON pb.appt_id = pa.patient_appt_id
-                 WHERE pa.patient_id = %s)
-        """, (patient_id, patient_id))
-        balance_result = cursor.fetchone()
-        current_balance = float(balance_result[0]) if balance_result else 0.0
+        current_balance = float(locked_balance)
 
         # Prevent overpayment
         if credit + current_balance > 0:
+            mysql.connection.rollback()
             return jsonify({
                 "error": "Payment exceeds outstanding balance.",
                 "current_balance": current_balance,
@@ -1960,26 +2507,10 @@ def make_general_payment(patient_id):
             INSERT INTO PATIENT_CREDIT (patient_id, amount)
             VALUES (%s, %s)
         """, (patient_id, credit))
+        credit_id = cursor.lastrowid
 
-        # Recalculate balance after payment
-        cursor.execute("""
-            SELECT
-                (SELECT IFNULL(SUM(amount), 0) FROM PATIENT_CREDIT WHERE patient_id = %s)
-                -
-                (SELECT IFNULL(SUM(charge), 0)
-                 FROM PATIENT_BILL pb
-                 JOIN PATIENT_APPOINTMENT pa ON pb.appt_id = pa.patient_appt_id
-                 WHERE pa.patient_id = %s)
-        """, (patient_id, patient_id))
-        updated_balance_result = cursor.fetchone()
-        updated_balance = float(updated_balance_result[0]) if updated_balance_result else 0.0
-
-        # Update the patient's acct_balance
-        cursor.execute("""
-            UPDATE PATIENT
-            SET acct_balance = %s
-            WHERE patient_id = %s
-        """, (updated_balance, patient_id))
+        # Ledger entry + acct_balance move
+        updated_balance = float(post_entry(cursor, patient_id, locked_balance, 'credit', credit, credit_id=credit_id))
 
         mysql.connection.commit()
 
@@ -2268,8 +2799,11 @@ def edit_patient():
             medical_conditions, family_history, past_procedures,
             patient_id
         ))
+        # starting height/weight feed every stored weekly weight and BMI
+        refresh_weekly_series(cursor, [patient_id])
 
         mysql.connection.commit()
+        invalidate_patient(patient_id)
         return jsonify({'message': 'Patient information updated successfully'}), 200
 
     except Exception as e:
@@ -1,9 +1,26 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, current_app, stream_with_context
 from db import mysql
+from login_service import login
+from metrics import Metrics
+from pagination import encode_cursor, decode_cursor, parse_limit
+from notifications import push, after_commit, pharmacy_room, patient_room
+from MySQLdb.cursors import SSCursor
+import MySQLdb
 import bcrypt
+import config
+import csv
+import io
+import time
 
 pharmacy_bp = Blueprint('pharmacy_bp', __name__)
 
+# MySQL error codes worth retrying a fill on
+ER_LOCK_WAIT_TIMEOUT = 1205
+ER_LOCK_DEADLOCK = 1213
+FILL_DEADLOCK_RETRIES = 2
+
+fill_metrics = Metrics()
+
 @pharmacy_bp.route('/register-pharmacy', methods=['POST'])
 def register_pharmacy():
     """
@@ -157,34 +174,6 @@ def get_pharmacy(pharmacy_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
-'''
-#pharmacy login
-@pharmacy_bp.route('/login-pharmacy', methods=['POST'])
-def login_pharmacy():
-    data = request.get_json()
-    email = data.get('email')
-    password = data.get('password')
-
-    cursor = mysql.connection.cursor()
-
-    # Query to fetch pharmacy details based on email
-    query = "SELECT pharmacy_id, email, password FROM pharmacy WHERE email = %s"
-    cursor.execute(query, (email,))
-    pharmacy = cursor.fetchone()
-
-    if pharmacy:
-        stored_password = pharmacy[2]  # Get the stored hashed password (3rd field in query result)
-        
-        # Check if entered password matches the stored password
-        if bcrypt.checkpw(password.encode('utf-8'), stored_password.encode('utf-8')):
-            return jsonify({"message": "Login successful", "pharmacy_id": pharmacy[0]}), 200
-        else:
-            return jsonify({"error": "Invalid credentials"}), 401
-    else:
-        return jsonify({"error": "Pharmacy not found"}), 404
-    
-'''
-
 #pharmacy login
 @pharmacy_bp.route('/login-pharmacy', methods=['POST'])
 def login_pharmacy():
@@ -221,6 +210,9 @@ def login_pharmacy():
             example:
               message: Login successful
               pharmacy_id: 1
+              token: "<signed session token>"
+      401:
+        description: Invalid credentials
       404:
         description: Pharmacy not found
     """
@@ -229,17 +221,11 @@ def login_pharmacy():
     password = data.get('password')
 
     cursor = mysql.connection.cursor()
+    try:
+        return login(cursor, 'pharmacy', email, password)
+    finally:
+        cursor.close()
 
-    # Query to fetch pharmacy details based on email
-    query = "SELECT pharmacy_id, email, password FROM PHARMACY WHERE email = %s"
-    cursor.execute(query, (email,))
-    pharmacy = cursor.fetchone()
-
-    if pharmacy:
-        return jsonify({"message": "Login successful", "pharmacy_id": pharmacy[0]}), 200
-    else:
-        return jsonify({"error": "Pharmacy not found"}), 404
-    
  # get medicine (already preloaded in database)   
 
 @pharmacy_bp.route('/medicine/<int:medicine_id>', methods=['GET'])
@@ -335,6 +321,53 @@ def get_stock(pharmacy_id):
     else:
         return jsonify({"error": "No medicine stock found for this pharmacy"}), 404
 
+# medicines whose unfilled prescriptions will run the shelf low (precomputed by refresh-stock-risk)
+@pharmacy_bp.route('/stock/at-risk/<int:pharmacy_id>', methods=['GET'])
+def get_stock_at_risk(pharmacy_id):
+    """
+    Get medicines a pharmacy is about to run short of
+
+    ---
+    tags:
+      - Inventory
+    parameters:
+      - name: pharmacy_id
+        in: path
+        required: true
+        schema:
+          type: integer
+    responses:
+      200:
+        description: At-risk medicines, worst shortfall first (empty list when nothing is at risk)
+        content:
+          application/json:
+            example:
+              - medicine_id: 3
+                medicine_name: "Metformin"
+                stock_count: 20
+                pending_quantity: 90
+                pending_prescriptions: 3
+                projected_stock: -70
+                refreshed_at: "Fri, 16 May 2025 08:00:00 GMT"
+    """
+    cursor = mysql.connection.cursor()
+    try:
+        cursor.execute("""
+            SELECT r.medicine_id, m.medicine_name, r.stock_count, r.pending_quantity,
+                   r.pending_prescriptions, r.projected_stock, r.refreshed_at
+            FROM STOCK_AT_RISK r
+            JOIN MEDICINE m ON m.medicine_id = r.medicine_id
+            WHERE r.pharmacy_id = %s
+            ORDER BY r.projected_stock ASC
+        """, (pharmacy_id,))
+        rows = cursor.fetchall()
+        columns = [desc[0] for desc in cursor.description]
+        return jsonify([dict(zip(columns, row)) for row in rows]), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        cursor.close()
+
 # update stock - based on pharmacy, medicine id, and quantity to add
 @pharmacy_bp.route('/stock/update', methods=['PUT'])
 def update_stock():
@@ -386,27 +419,24 @@ def update_stock():
 
     cursor = mysql.connection.cursor()
 
-    # Check if the stock entry exists
-    check_query = """
-        SELECT stock_count FROM MEDICINE_STOCK
-        WHERE pharmacy_id = %s AND medicine_id = %s
-    """
-    cursor.execute(check_query, (pharmacy_id, medicine_id))
-    stock = cursor.fetchone()
+    try:
+        # Apply the delta in place; no read-then-write window for a concurrent update to slip into
+        cursor.execute("""
+            UPDATE MEDICINE_STOCK
+            SET stock_count = stock_count + %s
+            WHERE pharmacy_id = %s AND medicine_id = %s
+        """, (quantity_to_add, pharmacy_id, medicine_id))
 
-    if not stock:
-        return jsonify({"error": "Stock record not found for this pharmacy and medicine."}), 404
+        if cursor.rowcount == 0:
+            mysql.connection.rollback()
+            return jsonify({"error": "Stock record not found for this pharmacy and medicine."}), 404
 
-    new_stock_count = stock[0] + quantity_to_add
+        cursor.execute("""
+            SELECT stock_count FROM MEDICINE_STOCK
+            WHERE pharmacy_id = %s AND medicine_id = %s
+        """, (pharmacy_id, medicine_id))
+        new_stock_count = cursor.fetchone()[0]
 
-    # Update the stock
-    update_query = """
-        UPDATE MEDICINE_STOCK
-        SET stock_count = %s
-        WHERE pharmacy_id = %s AND medicine_id = %s
-    """
-    try:
-        cursor.execute(update_query, (new_stock_count, pharmacy_id, medicine_id))
         mysql.connection.commit()
         return jsonify({
             "message": "Stock updated successfully.",
@@ -415,7 +445,218 @@ def update_stock():
     except Exception as e:
         mysql.connection.rollback()
         return jsonify({"error": str(e)}), 500
-    
+    finally:
+        cursor.close()
+
+# bulk stock import - JSON or CSV list of deltas, applied in one upsert
+@pharmacy_bp.route('/stock/bulk', methods=['POST'])
+def bulk_update_stock():
+    """
+    Apply many stock deltas at once (nightly restocks, distributor imports)
+
+    ---
+    tags:
+      - Inventory
+    description: >
+      Send JSON {"pharmacy_id": 1, "items": [{"medicine_id": 3, "quantity": 50}, ...]}
+      or text/csv with a header row of medicine_id,quantity (and optionally pharmacy_id per line;
+      otherwise ?pharmacy_id= applies to every line). Missing stock rows are created.
+      Lines are validated one by one; bad lines are reported and skipped, the rest are applied together.
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            required:
+              - items
+            properties:
+              pharmacy_id:
+                type: integer
+              items:
+                type: array
+                items:
+                  type: object
+                  properties:
+                    pharmacy_id:
+                      type: integer
+                    medicine_id:
+                      type: integer
+                    quantity:
+                      type: integer
+          example:
+            pharmacy_id: 1
+            items:
+              - medicine_id: 3
+                quantity: 50
+              - medicine_id: 7
+                quantity: -5
+        text/csv:
+          example: |
+            medicine_id,quantity
+            3,50
+            7,-5
+    responses:
+      200:
+        description: Per-line results
+        content:
+          application/json:
+            example:
+              applied: 1
+              rejected: 1
+              results:
+                - line: 1
+                  status: applied
+                  pharmacy_id: 1
+                  medicine_id: 3
+                  quantity: 50
+                  new_stock_count: 170
+                - line: 2
+                  status: rejected
+                  error: "Would take stock below zero (current 2)."
+      400:
+        description: Unreadable body or too many lines
+    """
+    try:
+        lines = _read_stock_import()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if len(lines) > config.STOCK_IMPORT_MAX_LINES:
+        return jsonify({"error": f"At most {config.STOCK_IMPORT_MAX_LINES} lines per import."}), 400
+
+    results = []
+    valid = []
+    for number, line in enumerate(lines, start=1):
+        try:
+            pharmacy_id = _whole_number(line.get('pharmacy_id'))
+            medicine_id = _whole_number(line.get('medicine_id'))
+            quantity = _whole_number(line.get('quantity'))
+        except (TypeError, ValueError):
+            results.append({"line": number, "status": "rejected",
+                            "error": "pharmacy_id, medicine_id and quantity must be integers."})
+            continue
+        result = {"line": number, "status": "applied", "pharmacy_id": pharmacy_id,
+                  "medicine_id": medicine_id, "quantity": quantity}
+        results.append(result)
+        valid.append(result)
+
+    cursor = mysql.connection.cursor()
+    try:
+        if valid:
+            pairs = sorted({(r["pharmacy_id"], r["medicine_id"]) for r in valid})
+            pair_sql = ', '.join(['(%s, %s)'] * len(pairs))
+            pair_params = tuple(v for pair in pairs for v in pair)
+
+            # one read each for what exists, locking the stock rows we're about to change
+            pharmacy_ids = tuple({p for p, _ in pairs})
+            medicine_ids = tuple({m for _, m in pairs})
+            cursor.execute(f"SELECT pharmacy_id FROM PHARMACY WHERE pharmacy_id IN ({', '.join(['%s'] * len(pharmacy_ids))})",
+                           pharmacy_ids)
+            known_pharmacies = {row[0] for row in cursor.fetchall()}
+            cursor.execute(f"SELECT medicine_id FROM MEDICINE WHERE medicine_id IN ({', '.join(['%s'] * len(medicine_ids))})",
+                           medicine_ids)
+            known_medicines = {row[0] for row in cursor.fetchall()}
+            cursor.execute(f"""
+                SELECT pharmacy_id, medicine_id, stock_count
+                FROM MEDICINE_STOCK
+                WHERE (pharmacy_id, medicine_id) IN ({pair_sql})
+                FOR UPDATE
+            """, pair_params)
+            current = {(row[0], row[1]): row[2] or 0 for row in cursor.fetchall()}
+
+            for r in valid:
+                if r["pharmacy_id"] not in known_pharmacies:
+                    r.update(status="rejected", error="Unknown pharmacy_id.")
+                elif r["medicine_id"] not in known_medicines:
+                    r.update(status="rejected", error="Unknown medicine_id.")
+
+            # lines for the same stock row are summed; a pair that would end below zero is rejected whole
+            totals = {}
+            for r in valid:
+                if r["status"] == "applied":
+                    key = (r["pharmacy_id"], r["medicine_id"])
+                    totals[key] = totals.get(key, 0) + r["quantity"]
+            for r in valid:
+                key = (r["pharmacy_id"], r["medicine_id"])
+                if r["status"] == "applied" and current.get(key, 0) + totals[key] < 0:
+                    r.update(status="rejected",
+                             error=f"Would take stock below zero (current {current.get(key, 0)}).")
+            totals = {key: delta for key, delta in totals.items() if current.get(key, 0) + delta >= 0}
+
+            if totals:
+                cursor.executemany("""
+                    INSERT INTO MEDICINE_STOCK (pharmacy_id, medicine_id, stock_count)
+                    VALUES (%s, %s, %s)
+                    ON DUPLICATE KEY UPDATE stock_count = stock_count + VALUES(stock_count)
+                """, [(p, m, delta) for (p, m), delta in totals.items()])
+
+                applied_pairs = list(totals)
+                cursor.execute(f"""
+                    SELECT pharmacy_id, medicine_id, stock_count
+                    FROM MEDICINE_STOCK
+                    WHERE (pharmacy_id, medicine_id) IN ({', '.join(['(%s, %s)'] * len(applied_pairs))})
+                """, tuple(v for pair in applied_pairs for v in pair))
+                new_counts = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+                for r in valid:
+                    if r["status"] == "applied":
+                        r["new_stock_count"] = new_counts.get((r["pharmacy_id"], r["medicine_id"]))
+
+        mysql.connection.commit()
+    except Exception as e:
+        mysql.connection.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        cursor.close()
+
+    applied = sum(1 for r in results if r["status"] == "applied")
+    return jsonify({
+        "applied": applied,
+        "rejected": len(results) - applied,
+        "results": results
+    }), 200
+
+
+def _whole_number(value):
+    """
+    int(value) for an import field, refusing fractions (2.7) and booleans rather than truncating them.
+    """
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"{value!r} is not a whole number.")
+    return int(value)
+
+
+def _read_stock_import():
+    """
+    Normalize a JSON or CSV import body into a list of dicts with pharmacy_id, medicine_id, quantity.
+    """
+    if request.mimetype == 'text/csv':
+        default_pharmacy = request.args.get('pharmacy_id')
+        reader = csv.DictReader(io.StringIO(request.get_data(as_text=True)))
+        if not reader.fieldnames or not {'medicine_id', 'quantity'} <= set(reader.fieldnames):
+            raise ValueError("CSV needs a header row with medicine_id and quantity.")
+        return [
+            {
+                "pharmacy_id": row.get('pharmacy_id') or default_pharmacy,
+                "medicine_id": row.get('medicine_id'),
+                "quantity": row.get('quantity')
+            }
+            for row in reader
+        ]
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('items'), list):
+        raise ValueError("Body must be JSON with an items list, or text/csv.")
+    default_pharmacy = data.get('pharmacy_id')
+    return [
+        {
+            "pharmacy_id": item.get('pharmacy_id', default_pharmacy),
+            "medicine_id": item.get('medicine_id'),
+            "quantity": item.get('quantity')
+        } if isinstance(item, dict) else {}
+        for item in data['items']
+    ]
+
 # get all pharmacies
 @pharmacy_bp.route('/pharmacies', methods=['GET'])
 def get_pharmacies():
@@ -459,6 +700,30 @@ def get_pharmacies():
         return jsonify({"error": str(e)}), 500
     
 # update a patient's prescription to filled if filled is clicked
+@after_commit
+def _push_prescription_ready(cursor, prescription_id):
+    """
+    Move the prescription from the pharmacy's unfilled queue to pickup, and tell the patient.
+    """
+    cursor.execute("""
+        SELECT p.pharmacy_id, pa.patient_id, pp.medicine_id, pp.quantity
+        FROM PATIENT_PRESCRIPTION pp
+        JOIN PATIENT_APPOINTMENT pa ON pp.appt_id = pa.patient_appt_id
+        JOIN PATIENT p ON pa.patient_id = p.patient_id
+        WHERE pp.prescription_id = %s
+    """, (prescription_id,))
+    row = cursor.fetchone()
+    if row:
+        pharmacy_id, patient_id, medicine_id, quantity = row
+        push('prescription_ready', {
+            "prescription_id": prescription_id,
+            "pharmacy_id": pharmacy_id,
+            "patient_id": patient_id,
+            "medicine_id": medicine_id,
+            "quantity": quantity
+        }, pharmacy_room(pharmacy_id), patient_room(patient_id))
+
+
 @pharmacy_bp.route('/prescription/fill', methods=['PUT'])
 def fill_prescription():
     """
@@ -487,6 +752,8 @@ def fill_prescription():
         description: Insufficient stock or validation failed
       404:
         description: Prescription or stock not found
+      409:
+        description: Prescription already filled
     """
     data = request.get_json()
     prescription_id = data.get('prescription_id')
@@ -495,63 +762,113 @@ def fill_prescription():
         return jsonify({"error": "prescription_id must be an integer."}), 400
 
     cursor = mysql.connection.cursor()
+    started = time.perf_counter()
+    fill_metrics.incr("attempts")
 
     try:
+        # Decrement stock and flag the prescription in one statement. The stock check and the
+        # not-yet-filled check are part of the WHERE, so InnoDB's row locks make concurrent fills
+        # of the same medicine serialize on the stock row instead of overselling.
+        for attempt in range(FILL_DEADLOCK_RETRIES + 1):
+            try:
+                cursor.execute("""
+                    UPDATE PATIENT_PRESCRIPTION pp
+                    JOIN PATIENT_APPOINTMENT pa ON pp.appt_id = pa.patient_appt_id
+                    JOIN PATIENT p ON pa.patient_id = p.patient_id
+                    JOIN MEDICINE_STOCK ms
+                      ON ms.medicine_id = pp.medicine_id AND ms.pharmacy_id = p.pharmacy_id
+                    SET ms.stock_count = ms.stock_count - pp.quantity,
+                        pp.filled = 1
+                    WHERE pp.prescription_id = %s
+                      AND pp.filled = 0
+                      AND ms.stock_count >= pp.quantity
+                """, (prescription_id,))
+                break
+            except MySQLdb.OperationalError as e:
+                if e.args[0] not in (ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT) or attempt == FILL_DEADLOCK_RETRIES:
+                    raise
+                fill_metrics.incr("deadlock_retries" if e.args[0] == ER_LOCK_DEADLOCK else "lock_timeout_retries")
+                mysql.connection.rollback()
+
+        if cursor.rowcount > 0:
+            mysql.connection.commit()
+            fill_metrics.incr("filled")
+            _push_prescription_ready(cursor, prescription_id)
+            return jsonify({"message": "Prescription filled and stock updated."}), 200
+
+        # Nothing matched; work out why (only the failure path pays for this read)
+        mysql.connection.rollback()
         cursor.execute("""
-            SELECT pp.medicine_id, pp.quantity, p.pharmacy_id
+            SELECT pp.quantity, pp.filled, ms.stock_count
             FROM PATIENT_PRESCRIPTION pp
             JOIN PATIENT_APPOINTMENT pa ON pp.appt_id = pa.patient_appt_id
             JOIN PATIENT p ON pa.patient_id = p.patient_id
+            LEFT JOIN MEDICINE_STOCK ms
+              ON ms.medicine_id = pp.medicine_id AND ms.pharmacy_id = p.pharmacy_id
             WHERE pp.prescription_id = %s
         """, (prescription_id,))
         result = cursor.fetchone()
 
         if not result:
+            fill_metrics.incr("not_found")
             return jsonify({"error": "Prescription not found."}), 404
 
-        medicine_id, quantity, pharmacy_id = result
+        quantity, filled, current_stock = result
 
-        cursor.execute("""
-            SELECT stock_count
-            FROM MEDICINE_STOCK
-            WHERE medicine_id = %s AND pharmacy_id = %s
-        """, (medicine_id, pharmacy_id))
-        stock_result = cursor.fetchone()
+        if filled:
+            fill_metrics.incr("already_filled")
+            return jsonify({"error": "Prescription has already been filled."}), 409
 
-        if not stock_result:
+        if current_stock is None:
+            fill_metrics.incr("not_stocked")
             return jsonify({"error": "Medicine not found in pharmacy stock."}), 404
 
-        current_stock = stock_result[0]
-
-        if current_stock < quantity:
-            return jsonify({
-                "error": "Not enough stock to fill this prescription.",
-                "available_stock": current_stock,
-                "required_quantity": quantity
-            }), 400
-
-        cursor.execute("""
-            UPDATE PATIENT_PRESCRIPTION
-            SET filled = 1
-            WHERE prescription_id = %s
-        """, (prescription_id,))
-
-        cursor.execute("""
-            UPDATE MEDICINE_STOCK
-            SET stock_count = stock_count - %s
-            WHERE medicine_id = %s AND pharmacy_id = %s
-        """, (quantity, medicine_id, pharmacy_id))
-
-        mysql.connection.commit()
-        return jsonify({"message": "Prescription filled and stock updated."}), 200
+        fill_metrics.incr("insufficient_stock")
+        return jsonify({
+            "error": "Not enough stock to fill this prescription.",
+            "available_stock": current_stock,
+            "required_quantity": quantity
+        }), 400
 
     except Exception as e:
         mysql.connection.rollback()
+        fill_metrics.incr("errors")
         return jsonify({"error": str(e)}), 400
 
     finally:
+        fill_metrics.observe("fill", time.perf_counter() - started)
         cursor.close()
 
+# fill counters for this worker process
+@pharmacy_bp.route('/prescription/fill/metrics', methods=['GET'])
+def get_fill_metrics():
+    """
+    Prescription fill outcome counters and latency for this server process
+
+    ---
+    tags:
+      - Prescription
+    responses:
+      200:
+        description: Counts by outcome (filled, insufficient_stock, already_filled, deadlock_retries, ...) and fill timings
+        content:
+          application/json:
+            example:
+              since: 1747400000.0
+              counts:
+                attempts: 120
+                filled: 112
+                insufficient_stock: 6
+                already_filled: 2
+                deadlock_retries: 1
+              timings:
+                fill:
+                  count: 120
+                  avg_ms: 3.1
+                  max_ms: 41.7
+    """
+    return jsonify(fill_metrics.snapshot()), 200
+
 @pharmacy_bp.route('/all_meds', methods=['GET'])
 def get_all_medicines():
     """
@@ -592,10 +909,144 @@ def get_all_medicines():
 
     return jsonify(result), 200
 
+# pharmacy work queues - oldest first, keyset-paged on (created_at, prescription_id).
+# Equality-only filters, so each status walks its own index in ORDER BY order with no filesort
+# (filled/picked_up are NOT NULL; see clinic_db_migrations.sql).
+PRESCRIPTION_QUEUE_FILTERS = {
+    'unfilled': "pp.filled = 0",
+    'ready': "pp.filled = 1 AND pp.picked_up = 0",
+    'picked_up': "pp.picked_up = 1",
+    'all': None
+}
+
+
+def _prescription_queue(pharmacy_id, status, limit, after):
+    """
+    One page of a pharmacy's prescriptions in the given status.
+    Returns (rows as dicts, next cursor or None).
+    """
+    conditions = ["p.pharmacy_id = %s"]
+    params = [pharmacy_id]
+    if PRESCRIPTION_QUEUE_FILTERS[status]:
+        conditions.append(PRESCRIPTION_QUEUE_FILTERS[status])
+    if after is not None:
+        conditions.append("(pp.created_at > %s OR (pp.created_at = %s AND pp.prescription_id > %s))")
+        params.extend([after[0], after[0], after[1]])
+
+    query = f"""
+        SELECT
+            pp.prescription_id,
+            pp.created_at,
+            CONCAT(d.first_name, ' ', d.last_name) AS doctor_name,
+            CONCAT(p.first_name, ' ', p.last_name) AS patient_name,
+            m.medicine_name,
+            pp.quantity,
+            pp.filled,
+            pp.picked_up
+        FROM PATIENT_PRESCRIPTION pp
+        JOIN PATIENT_APPOINTMENT pa ON pp.appt_id = pa.patient_appt_id
+        JOIN PATIENT p ON pa.patient_id = p.patient_id
+        JOIN MEDICINE m ON pp.medicine_id = m.medicine_id
+        LEFT JOIN DOCTOR d ON pa.doctor_id = d.doctor_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY pp.created_at, pp.prescription_id
+        LIMIT %s
+    """
+    params.append(limit + 1)
+
+    cursor = mysql.connection.cursor()
+    try:
+        cursor.execute(query, tuple(params))
+        rows = cursor.fetchall()
+        columns = [desc[0] for desc in cursor.description]
+    finally:
+        cursor.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][1], rows[-1][0]])
+    return [dict(zip(columns, row)) for row in rows], next_cursor
+
+
+def _queue_page_args():
+    """
+    limit/cursor for the list-shaped queue endpoints; pages of DEFAULT_LIMIT unless limit is given.
+    """
+    limit = parse_limit(request.args.get('limit'))
+    after = decode_cursor(request.args.get('cursor'))
+    if after is not None and len(after) != 2:
+        raise ValueError("Invalid cursor.")
+    return limit, after
+
+
+@pharmacy_bp.route('/pharmacy/<int:pharmacy_id>/queue', methods=['GET'])
+def get_prescription_queue(pharmacy_id):
+    """
+    Page through a pharmacy's prescriptions by status, oldest first
+
+    ---
+    tags:
+      - Prescription
+    parameters:
+      - name: pharmacy_id
+        in: path
+        required: true
+        type: integer
+      - name: status
+        in: query
+        type: string
+        enum: [unfilled, ready, picked_up, all]
+        default: unfilled
+      - name: limit
+        in: query
+        type: integer
+        default: 20
+      - name: cursor
+        in: query
+        type: string
+        description: next_cursor from the previous page
+    responses:
+      200:
+        description: One page of the queue
+        content:
+          application/json:
+            example:
+              prescriptions:
+                - prescription_id: 101
+                  created_at: "Thu, 15 May 2025 09:12:00 GMT"
+                  doctor_name: "Jane Smith"
+                  patient_name: "John Doe"
+                  medicine_name: "Atorvastatin"
+                  quantity: 30
+                  filled: 0
+                  picked_up: 0
+              next_cursor: "WyIyMDI1LTA1LTE1IDA5OjEyOjAwIiwxMDFd"
+      400:
+        description: Invalid status, limit or cursor
+    """
+    status = request.args.get('status', 'unfilled')
+    if status not in PRESCRIPTION_QUEUE_FILTERS:
+        return jsonify({"error": f"status must be one of: {', '.join(PRESCRIPTION_QUEUE_FILTERS)}"}), 400
+
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        after = decode_cursor(request.args.get('cursor'))
+        if after is not None and len(after) != 2:
+            raise ValueError("Invalid cursor.")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        prescriptions, next_cursor = _prescription_queue(pharmacy_id, status, limit, after)
+        return jsonify({"prescriptions": prescriptions, "next_cursor": next_cursor}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
 @pharmacy_bp.route('/pickup/<int:pharmacy_id>', methods=['GET'])
 def get_pickups_for_pharmacy(pharmacy_id):
     """
-    Get list of filled prescriptions not yet picked up for a pharmacy
+    Page through the filled prescriptions not yet picked up for a pharmacy
 
     ---
     tags:
@@ -605,9 +1056,17 @@ def get_pickups_for_pharmacy(pharmacy_id):
         in: path
         required: true
         type: integer
+      - name: limit
+        in: query
+        type: integer
+        default: 20
+        description: Page size; the next page's cursor comes back in the X-Next-Cursor header
+      - name: cursor
+        in: query
+        type: string
     responses:
       200:
-        description: List of prescriptions ready for pickup
+        description: List of prescriptions ready for pickup, oldest first
         content:
           application/json:
             example:
@@ -615,76 +1074,61 @@ def get_pickups_for_pharmacy(pharmacy_id):
                 medicine_name: "Lisinopril"
                 quantity: 30
     """
-    cursor = mysql.connection.cursor()
+    try:
+        limit, after = _queue_page_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    query = """
-        SELECT 
-            CONCAT(p.first_name, ' ', p.last_name) AS patient_name,
-            m.medicine_name,
-            pp.quantity
-        FROM PATIENT_PRESCRIPTION pp
-        JOIN PATIENT_APPOINTMENT pa ON pp.appt_id = pa.patient_appt_id
-        JOIN PATIENT p ON pa.patient_id = p.patient_id
-        JOIN MEDICINE m ON pp.medicine_id = m.medicine_id
-        WHERE p.pharmacy_id = %s
-            AND pp.filled = 1
-            AND pp.picked_up = 0
-    """
-    cursor.execute(query, (pharmacy_id,))
-    results = cursor.fetchall()
-
-    pickup_list = []
-    for row in results:
-        pickup_list.append({
-            "patient_name": row[0],
-            "medicine_name": row[1],
-            "quantity": row[2]
-        })
+    rows, next_cursor = _prescription_queue(pharmacy_id, 'ready', limit, after)
+    pickup_list = [{
+        "patient_name": row["patient_name"],
+        "medicine_name": row["medicine_name"],
+        "quantity": row["quantity"]
+    } for row in rows]
 
-    return jsonify(pickup_list), 200
+    response = jsonify(pickup_list)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
 
 @pharmacy_bp.route('/all_prescriptions', methods=['GET'])
 def get_all_prescriptions():
     """
-    Retrieve all prescriptions from the system
+    Export all prescriptions from the system
 
     ---
     tags:
       - Prescription
     responses:
       200:
-        description: Full prescription list
+        description: Streamed export, one JSON object per line (application/x-ndjson)
+        content:
+          application/x-ndjson:
+            example: |
+              {"appt_id": 12, "created_at": "Thu, 15 May 2025 09:12:00 GMT", "filled": 0, "medicine_id": 3, "picked_up": 0, "prescription_id": 101, "quantity": 30, "updated_at": "Thu, 15 May 2025 09:12:00 GMT"}
     """
-    cursor = mysql.connection.cursor()
-
-    query = """
-        SELECT *
+    # unbuffered cursor: rows are read from MySQL as they're sent, never all held in memory
+    cursor = mysql.connection.cursor(SSCursor)
+    cursor.execute("""
+        SELECT prescription_id, appt_id, medicine_id, quantity, picked_up, filled, created_at, updated_at
         FROM PATIENT_PRESCRIPTION
-    """
-    cursor.execute(query)
-    prescriptions = cursor.fetchall()
+        ORDER BY prescription_id
+    """)
+    columns = [desc[0] for desc in cursor.description]
 
-    # Define the result as a list of dictionaries
-    result = []
-    for prescription in prescriptions:
-        prescription_dict = {
-            "prescription_id": prescription[0],
-            "appt_id": prescription[1],
-            "medicine_id": prescription[2],
-            "quantity": prescription[3],
-            "picked_up": prescription[4],
-            "filled": prescription[5],
-            "created_at": prescription[6],
-            "updated_at": prescription[7]
-        }
-        result.append(prescription_dict)
+    def generate():
+        try:
+            for row in cursor:
+                yield current_app.json.dumps(dict(zip(columns, row))) + "\n"
+        finally:
+            cursor.close()
 
-    return jsonify(result), 200
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 @pharmacy_bp.route('/unfilled_prescriptions/<int:pharmacy_id>', methods=['GET'])
 def get_unfilled_prescriptions(pharmacy_id):
     """
-    Retrieve all unfilled prescriptions for a specific pharmacy
+    Page through the unfilled prescriptions for a specific pharmacy
 
     ---
     tags:
@@ -694,9 +1138,17 @@ def get_unfilled_prescriptions(pharmacy_id):
         in: path
         type: integer
         required: true
+      - name: limit
+        in: query
+        type: integer
+        default: 20
+        description: Page size; the next page's cursor comes back in the X-Next-Cursor header
+      - name: cursor
+        in: query
+        type: string
     responses:
       200:
-        description: List of unfilled prescriptions
+        description: List of unfilled prescriptions, oldest first
         content:
           application/json:
             example:
@@ -707,35 +1159,22 @@ def get_unfilled_prescriptions(pharmacy_id):
                 quantity: 30
                 filled: 0
     """
-    cursor = mysql.connection.cursor()
-
-    query = """
-        SELECT 
-            pp.prescription_id, 
-            CONCAT(d.first_name, ' ', d.last_name) AS doctor_name, 
-            CONCAT(p.first_name, ' ', p.last_name) AS patient_name,
-            m.medicine_name,
-            pp.quantity
-        FROM PATIENT_PRESCRIPTION pp
-        JOIN PATIENT_APPOINTMENT pa ON pp.appt_id = pa.patient_appt_id
-        JOIN PATIENT p ON pa.patient_id = p.patient_id
-        JOIN MEDICINE m ON pp.medicine_id = m.medicine_id
-        JOIN DOCTOR d ON pa.doctor_id = d.doctor_id
-        WHERE p.pharmacy_id = %s
-            AND pp.filled = 0  -- Only unfilled prescriptions
-    """
-    cursor.execute(query, (pharmacy_id,))
-    results = cursor.fetchall()
-
-    unfilled_prescriptions = []
-    for row in results:
-        unfilled_prescriptions.append({
-            "prescription_id": row[0],
-            "doctor_name": row[1],
-            "patient_name": row[2],
-            "medication": row[3],
-            "quantity": row[4],
-            "filled": 0  # Marking unfilled prescriptions
-        })
+    try:
+        limit, after = _queue_page_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    return jsonify(unfilled_prescriptions), 200
+    rows, next_cursor = _prescription_queue(pharmacy_id, 'unfilled', limit, after)
+    unfilled_prescriptions = [{
+        "prescription_id": row["prescription_id"],
+        "doctor_name": row["doctor_name"],
+        "patient_name": row["patient_name"],
+        "medication": row["medicine_name"],
+        "quantity": row["quantity"],
+        "filled": 0  # Marking unfilled prescriptions
+    } for row in rows]
+
+    response = jsonify(unfilled_prescriptions)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
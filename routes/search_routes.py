@@ -0,0 +1,141 @@
+from flask import Blueprint, request, jsonify
+from db import mysql
+from pagination import encode_cursor, decode_cursor, parse_limit
+
+search_bp = Blueprint('search_bp', __name__)
+
+# one MATCH ... AGAINST per searchable TEXT column; each needs the FULLTEXT index
+# from clinic_db_migrations.sql. Every branch yields (kind, id, title, body, score).
+SEARCH_SOURCES = {
+    'doctor': """
+        SELECT 'doctor' AS kind, d.doctor_id AS id,
+               CONCAT('Dr. ', d.first_name, ' ', d.last_name) AS title,
+               LEFT(d.description, 200) AS snippet,
+               MATCH(d.description) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score
+        FROM DOCTOR d
+        WHERE MATCH(d.description) AGAINST (%s IN NATURAL LANGUAGE MODE)
+    """,
+    'post': """
+        SELECT 'post' AS kind, cp.post_id AS id,
+               m.meal_name AS title,
+               LEFT(cp.description, 200) AS snippet,
+               MATCH(cp.description) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score
+        FROM COMMUNITY_POST cp
+        LEFT JOIN MEAL m ON m.meal_id = cp.meal_id
+        WHERE MATCH(cp.description) AGAINST (%s IN NATURAL LANGUAGE MODE)
+    """,
+    'meal': """
+        SELECT 'meal' AS kind, m.meal_id AS id,
+               m.meal_name AS title,
+               LEFT(m.meal_description, 200) AS snippet,
+               MATCH(m.meal_description) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score
+        FROM MEAL m
+        WHERE MATCH(m.meal_description) AGAINST (%s IN NATURAL LANGUAGE MODE)
+    """
+}
+
+
+@search_bp.route('/search', methods=['GET'])
+def search():
+    """
+    Full-text search over doctor descriptions, community posts and meals
+    ---
+    tags:
+      - Search
+    parameters:
+      - name: q
+        in: query
+        required: true
+        schema: { type: string }
+      - name: type
+        in: query
+        description: Comma-separated subset of doctor, post, meal (default all)
+        schema: { type: string }
+      - name: limit
+        in: query
+        schema: { type: integer, default: 20, maximum: 100 }
+      - name: cursor
+        in: query
+        description: next_cursor from the previous page
+        schema: { type: string }
+    responses:
+      200:
+        description: Matches ranked by relevance
+        content:
+          application/json:
+            example:
+              results:
+                - type: doctor
+                  id: 7
+                  title: "Dr. Alice Nguyen"
+                  snippet: "Board-certified cardiologist focused on heart-healthy diets..."
+                  score: 3.21
+                - type: post
+                  id: 42
+                  title: "Keto Salmon Bowl"
+                  snippet: "My go-to low carb lunch..."
+                  score: 1.87
+              next_cursor: "WzEuODcsInBvc3QiLDQyXQ=="
+      400:
+        description: Missing query or invalid type, limit or cursor
+    """
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({"error": "q is required."}), 400
+
+    types = request.args.get('type')
+    kinds = [t.strip() for t in types.split(',') if t.strip()] if types else list(SEARCH_SOURCES)
+    unknown = [k for k in kinds if k not in SEARCH_SOURCES]
+    if unknown:
+        return jsonify({"error": f"Unknown type(s): {', '.join(unknown)}"}), 400
+
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        after = decode_cursor(request.args.get('cursor'))
+        if after is not None and len(after) != 3:
+            raise ValueError("Invalid cursor.")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    params = []
+    branches = []
+    for kind in kinds:
+        branches.append(SEARCH_SOURCES[kind])
+        params.extend([q, q])
+
+    # keyset on (score DESC, kind, id) so equal scores still page deterministically
+    where = ""
+    if after is not None:
+        last_score, last_kind, last_id = after
+        where = "WHERE (score < %s OR (score = %s AND (kind > %s OR (kind = %s AND id > %s))))"
+        params.extend([last_score, last_score, last_kind, last_kind, last_id])
+
+    query = f"""
+        SELECT kind, id, title, snippet, score
+        FROM ({' UNION ALL '.join(branches)}) AS matches
+        {where}
+        ORDER BY score DESC, kind ASC, id ASC
+        LIMIT %s
+    """
+    params.append(limit + 1)
+
+    cursor = mysql.connection.cursor()
+    try:
+        cursor.execute(query, tuple(params))
+        rows = cursor.fetchall()
+
+        results = [
+            {"type": row[0], "id": row[1], "title": row[2], "snippet": row[3], "score": float(row[4])}
+            for row in rows[:limit]
+        ]
+
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor([float(last[4]), last[0], last[1]])
+
+        return jsonify({"results": results, "next_cursor": next_cursor}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        cursor.close()
@@ -0,0 +1,143 @@
+from pagination import parse_date
+
+# Daily and weekly surveys are keyed by (patient_id, date) / (patient_id, week_start).
+# Every write is an upsert on that key, so a client that retries, or replays an offline
+# backlog, can never create a second row for the same day or week.
+
+SURVEY_KINDS = {
+    'daily': {
+        'table': 'PATIENT_DAILY_SURVEY',
+        'key': 'date',
+        'required': ('date', 'water_intake', 'calories_consumed', 'heart_rate', 'exercise'),
+        'optional': {'mood': None, 'follow_plan': 0},
+    },
+    'weekly': {
+        'table': 'PATIENT_WEEKLY',
+        'key': 'week_start',
+        'required': ('week_start', 'blood_pressure', 'weight_change'),
+        'optional': {},
+    },
+}
+
+
+def survey_columns(kind):
+    spec = SURVEY_KINDS[kind]
+    return list(spec['required']) + list(spec['optional'])
+
+
+def survey_values(kind, record):
+    """
+    Column values for one submitted record, in survey_columns order.
+    Raises ValueError naming the problem if the record can't be stored.
+    """
+    spec = SURVEY_KINDS[kind]
+    if not isinstance(record, dict):
+        raise ValueError("Each record must be an object.")
+    missing = [f for f in spec['required'] if record.get(f) is None]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    key = parse_date(record[spec['key']])
+
+    values = []
+    for column in survey_columns(kind):
+        if column == spec['key']:
+            values.append(key)
+        elif column in spec['optional']:
+            values.append(record.get(column, spec['optional'][column]))
+        else:
+            values.append(record[column])
+    return values
+
+
+def upsert_sql(kind):
+    spec = SURVEY_KINDS[kind]
+    columns = survey_columns(kind)
+    updates = ', '.join(f"{c} = VALUES({c})" for c in columns if c != spec['key'])
+    return f"""
+        INSERT INTO {spec['table']} (patient_id, {', '.join(columns)})
+        VALUES ({', '.join(['%s'] * (len(columns) + 1))})
+        ON DUPLICATE KEY UPDATE {updates}
+    """
+
+
+def sync_surveys(cursor, patient_id, kind, records):
+    """
+    Upsert a batch of one patient's surveys with a single multi-row statement.
+    Returns one status per submitted record, in order: created, updated, duplicate
+    (a later record in the same batch has the same day/week and wins) or invalid.
+    The caller owns the transaction.
+    """
+    spec = SURVEY_KINDS[kind]
+    statuses = [None] * len(records)
+    rows = {}  # key -> (index, values); later records replace earlier ones
+
+    for index, record in enumerate(records):
+        try:
+            values = survey_values(kind, record)
+        except ValueError as e:
+            statuses[index] = {"status": "invalid", "error": str(e)}
+            continue
+        key = values[survey_columns(kind).index(spec['key'])]
+        if key in rows:
+            statuses[rows[key][0]] = {"status": "duplicate"}
+        rows[key] = (index, values)
+
+    if rows:
+        keys = sorted(rows)
+        placeholders = ', '.join(['%s'] * len(keys))
+        # lock the keys we're about to write so created/updated is accurate under concurrency
+        cursor.execute(f"""
+            SELECT {spec['key']}
+            FROM {spec['table']}
+            WHERE patient_id = %s AND {spec['key']} IN ({placeholders})
+            FOR UPDATE
+        """, (patient_id, *keys))
+        existing = {row[0] for row in cursor.fetchall()}
+
+        # MySQLdb turns this executemany into one multi-row INSERT ... ON DUPLICATE KEY UPDATE
+        cursor.executemany(upsert_sql(kind), [(patient_id, *rows[key][1]) for key in keys])
+
+        for key in keys:
+            index = rows[key][0]
+            statuses[index] = {"status": "updated" if key in existing else "created"}
+
+    for index, record in enumerate(records):
+        statuses[index] = {"index": index, **statuses[index]}
+        if isinstance(record, dict) and record.get(spec['key']) is not None:
+            statuses[index][spec['key']] = record[spec['key']]
+    return statuses
+
+
+# PATIENT_WEEKLY.weight is the running weight: the initial survey weight plus every
+# weight_change up to and including that week. bmi comes from it and the initial survey
+# height (lbs and inches, hence 703). Both are rewritten for the whole series whenever a
+# week or the initial survey changes, since a late or edited week shifts every later one.
+WEEKLY_SERIES_SQL = """
+    UPDATE PATIENT_WEEKLY w
+    JOIN (
+        SELECT pw.ws_id,
+               pis.weight + SUM(pw.weight_change) OVER (
+                   PARTITION BY pw.patient_id ORDER BY pw.week_start
+               ) AS weight,
+               pis.height
+        FROM PATIENT_WEEKLY pw
+        JOIN PATIENT_INIT_SURVEY pis
+          ON pis.is_id = (SELECT MAX(is_id) FROM PATIENT_INIT_SURVEY WHERE patient_id = pw.patient_id)
+        WHERE pw.patient_id IN ({placeholders})
+    ) series ON series.ws_id = w.ws_id
+    SET w.weight = series.weight,
+        w.bmi = IF(series.height > 0, ROUND(703 * series.weight / (series.height * series.height), 1), NULL)
+"""
+
+
+def refresh_weekly_series(cursor, patient_ids):
+    """
+    Recompute stored weight/bmi for every week of the given patients in one statement.
+    The caller owns the transaction.
+    """
+    patient_ids = sorted(set(patient_ids))
+    if not patient_ids:
+        return 0
+    placeholders = ', '.join(['%s'] * len(patient_ids))
+    cursor.execute(WEEKLY_SERIES_SQL.format(placeholders=placeholders), tuple(patient_ids))
+    return cursor.rowcount
@@ -0,0 +1,169 @@
+import pytest
+from contextlib import contextmanager
+from unittest.mock import patch, MagicMock
+import MySQLdb
+import dashboard
+from db import ConnectionPool
+
+
+class FakeCursor:
+    """
+    Answers each dashboard query from `rows`, keyed by the first table it reads (an exception
+    there is raised instead); every execute is recorded on the pool.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.description = None
+        self._rows = []
+
+    def execute(self, query, params):
+        self.pool.executed.append((query, params))
+        table = query.split("FROM", 1)[1].split()[0]
+        result = self.pool.rows.get(table, (("id",), []))
+        if isinstance(result, Exception):
+            raise result
+        columns, rows = result
+        self.description = [(c,) for c in columns]
+        self._rows = rows
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+        self.checkouts = 0
+
+    @contextmanager
+    def connection(self):
+        self.checkouts += 1
+        connection = MagicMock()
+        connection.cursor.side_effect = lambda: FakeCursor(self)
+        yield connection
+
+
+PROFILE = (("patient_id", "first_name"), [(5, "John")])
+
+
+def _appointments(count):
+    return (("patient_appt_id",), [(i,) for i in range(count)])
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    def install(rows):
+        fake = FakePool(rows)
+        monkeypatch.setattr(dashboard, 'pool', fake)
+        return fake
+    return install
+
+
+def test_load_dashboard_runs_every_section(fake_pool):
+    pool = fake_pool({"PATIENT": PROFILE})
+
+    result = dashboard.load_dashboard(5, limit=3)
+
+    assert result["profile"] == {"patient_id": 5, "first_name": "John"}
+    assert set(result) == {"profile", *dashboard.SECTION_SQL}
+    # profile plus one query per section, each on its own pooled connection
+    assert pool.checkouts == len(dashboard.SECTION_SQL) + 1
+    section_params = [params for query, params in pool.executed if "LIMIT" in query]
+    assert section_params == [(5, 4)] * len(dashboard.SECTION_SQL)
+
+def test_section_has_more_comes_from_the_extra_row(fake_pool):
+    fake_pool({"PATIENT": PROFILE, "PATIENT_APPOINTMENT": _appointments(3)})
+
+    result = dashboard.load_dashboard(5, limit=2)
+
+    # limit + 1 rows back: the page is trimmed to limit and there is more
+    assert result["upcoming_appointments"] == {
+        "items": [{"patient_appt_id": 0}, {"patient_appt_id": 1}],
+        "has_more": True
+    }
+    assert result["daily_surveys"] == {"items": [], "has_more": False}
+
+def test_section_exactly_limit_rows_has_no_more(fake_pool):
+    fake_pool({"PATIENT": PROFILE, "PATIENT_APPOINTMENT": _appointments(2)})
+
+    result = dashboard.load_dashboard(5, limit=2)
+
+    assert len(result["past_appointments"]["items"]) == 2
+    assert result["past_appointments"]["has_more"] is False
+
+def test_load_dashboard_defaults_to_configured_limit(fake_pool):
+    pool = fake_pool({"PATIENT": PROFILE})
+
+    with patch('dashboard.config.DASHBOARD_SECTION_LIMIT', 7):
+        dashboard.load_dashboard(5)
+
+    assert all(params == (5, 8) for query, params in pool.executed if "LIMIT" in query)
+
+def test_load_dashboard_missing_patient(fake_pool):
+    fake_pool({"PATIENT": (("patient_id",), [])})
+
+    assert dashboard.load_dashboard(404) is None
+
+def test_load_dashboard_reraises_section_failure(fake_pool):
+    fake_pool({"PATIENT": PROFILE, "PATIENT_LEDGER": MySQLdb.OperationalError(1205, "Lock wait timeout")})
+
+    with pytest.raises(MySQLdb.OperationalError):
+        dashboard.load_dashboard(5)
+
+
+def _pool(size, timeout=0.05):
+    pool = ConnectionPool(size, timeout=timeout)
+    pool._connect = MagicMock(side_effect=lambda: MagicMock())
+    return pool
+
+def test_pool_reuses_returned_connection():
+    pool = _pool(1)
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert second is first
+    first.ping.assert_called_once()
+    assert pool._connect.call_count == 1
+
+def test_pool_checkout_times_out_when_exhausted():
+    pool = _pool(1)
+
+    with pool.connection():
+        with pytest.raises(RuntimeError, match="Timed out waiting for a database connection"):
+            with pool.connection():
+                pass
+
+    # the slot came back once the first connection was returned
+    with pool.connection():
+        pass
+
+def test_pool_replaces_connection_that_fails_ping():
+    pool = _pool(1)
+    with pool.connection() as stale:
+        pass
+    stale.ping.side_effect = MySQLdb.OperationalError(2006, "MySQL server has gone away")
+
+    with pool.connection() as fresh:
+        pass
+
+    assert fresh is not stale
+    stale.close.assert_called_once()
+
+def test_pool_drops_connection_after_database_error():
+    pool = _pool(1)
+
+    with pytest.raises(MySQLdb.OperationalError):
+        with pool.connection() as broken:
+            raise MySQLdb.OperationalError(2013, "Lost connection")
+
+    broken.close.assert_called_once()
+    with pool.connection() as fresh:
+        assert fresh is not broken
@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import patch, MagicMock
 from app import app
+from cache import doctor_cache, cohort_cache, invalidate_patient_cohort
 import json
 import bcrypt
 import base64
@@ -8,6 +9,8 @@ import base64
 @pytest.fixture
 def client():
     app.config['TESTING'] = True
+    doctor_cache.clear()
+    cohort_cache.clear()
     with patch('routes.doctor_routes.mysql') as mock_mysql:
         # Mock cursor and commit
         mock_conn = MagicMock()
@@ -97,7 +100,7 @@ def test_login_doctor_success(client):
         hashed_pw = bcrypt.hashpw(raw_password.encode(), bcrypt.gensalt()).decode()
 
         # Use that exact hash as the one stored in the DB
-        mock_cursor.fetchone.return_value = (1, hashed_pw)
+        mock_cursor.fetchone.return_value = (1, hashed_pw, 7)
 
         mock_cursor_factory.return_value = mock_cursor
 
@@ -111,6 +114,24 @@ def test_login_doctor_success(client):
     data = response.get_json()
     assert data['message'].startswith("Login successful")
     assert data['doctor_id'] == 1
+    assert data['user_id'] == 7
+    assert data['token']
+
+def test_login_doctor_with_stale_token(client):
+    # a token signed with some other key (e.g. before a restart) must not lock the client out
+    with patch('routes.doctor_routes.mysql.connection.cursor') as mock_cursor_factory:
+        mock_cursor = MagicMock()
+        hashed_pw = bcrypt.hashpw(b"SecurePass123!", bcrypt.gensalt()).decode()
+        mock_cursor.fetchone.return_value = (1, hashed_pw, 7)
+        mock_cursor_factory.return_value = mock_cursor
+
+        response = client.post('/login-doctor', json={
+            "email": "alice.nguyen@example.com",
+            "password": "SecurePass123!"
+        }, headers={"Authorization": "Bearer not-a-valid-token"})
+
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.get_json()['token']
 
 def test_login_doctor_invalid_password(client):
     with patch('routes.doctor_routes.mysql.connection.cursor') as mock_cursor_factory:
@@ -120,7 +141,7 @@ def test_login_doctor_invalid_password(client):
 
         # Correct hash, but wrong input password
         valid_hash = "$2b$12$uiZUP4d61OgzBCVQ6GvZ6.4oX5zS53B3/OI25gxqdVddR5SS/OzWy"
-        mock_cursor.fetchone.return_value = (1, valid_hash)
+        mock_cursor.fetchone.return_value = (1, valid_hash, 7)
 
         mock_cursor_factory.return_value = mock_cursor
 
@@ -173,6 +194,99 @@ def test_get_all_doctors_empty(client):
         assert response.status_code == 200
         assert response.get_json() == []
 
+def test_get_all_doctors_served_from_cache(client):
+    with patch('routes.doctor_routes.mysql.connection.cursor') as mock_cursor_factory:
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = []
+        mock_cursor_factory.return_value = mock_cursor
+
+        client.get('/doctors')
+        response = client.get('/doctors')
+
+        assert response.status_code == 200
+        assert response.get_json() == []
+        assert mock_cursor.execute.call_count == 1
+
+def test_edit_doctor_invalidates_cached_doctor(client):
+    with patch('routes.doctor_routes.mysql.connection.cursor') as mock_cursor_factory:
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = (
+            1, "Alice", "Nguyen", "alice@example.com", "Expert cardiologist.",
+            "MD1234567", "2028-12-31", "1980-01-15", "Harvard Medical School",
+            "Cardiology", 15, 150.0, "Female", "1234567890", "123 Heartbeat Lane",
+            "10001", "New York", "NY", None, True, 4.8
+        )
+        mock_cursor_factory.return_value = mock_cursor
+
+        client.get('/doctor/1')
+        client.put('/edit-doctor', json={"doctor_id": 1, "first_name": "Alicia",
+                                         "last_name": "Nguyen", "email": "alice@example.com"})
+        client.get('/doctor/1')
+
+        selects = [c for c in mock_cursor.execute.call_args_list if "FROM DOCTOR" in c[0][0]]
+        assert len(selects) == 2
+
+def test_search_doctors_paginates(client):
+    with patch('routes.doctor_routes.mysql.connection.cursor') as mock_cursor_factory:
+        mock_cursor = MagicMock()
+        mock_cursor.description = [(c,) for c in (
+            "doctor_id", "first_name", "last_name", "specialty", "city", "state", "zipcode",
+            "payment_fee", "accepting_patients", "doctor_rating", "doctor_picture", "description")]
+        # limit=2 asks for 3 rows to know whether there is a next page
+        mock_cursor.fetchall.return_value = [
+            (9, "Alice", "Nguyen", "Cardiology", "Newark", "NJ", "07102", 200.0, 1, 4.9, None, "Heart"),
+            (4, "Bob", "Smith", "Cardiology", "Newark", "NJ", "07102", 150.0, 1, 4.5, None, "Heart"),
+            (2, "Carol", "Lee", "Cardiology", "Newark", "NJ", "07102", 100.0, 1, 4.1, None, "Heart"),
+        ]
+        mock_cursor_factory.return_value = mock_cursor
+
+        response = client.get('/doctors/search?specialty=Cardiology&state=NJ&accepting_patients=1&limit=2')
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert [d["doctor_id"] for d in data["doctors"]] == [9, 4]
+        assert data["next_cursor"]
+
+        query, params = mock_cursor.execute.call_args[0]
+        assert "specialty = %s" in query and "state = %s" in query
+        assert params == ("Cardiology", "NJ", 1, 3)
+
+        response = client.get(f'/doctors/search?specialty=Cardiology&limit=2&cursor={data["next_cursor"]}')
+        query, params = mock_cursor.execute.call_args[0]
+        assert "doctor_rating < %s" in query
+        assert params == ("Cardiology", 4.5, 4.5, 4, 3)
+
+def test_search_doctors_fee_pages_past_doctors_without_fee(client):
+    with patch('routes.doctor_routes.mysql.connection.cursor') as mock_cursor_factory:
+        mock_cursor = MagicMock()
+        mock_cursor.description = [(c,) for c in (
+            "doctor_id", "first_name", "last_name", "specialty", "city", "state", "zipcode",
+            "payment_fee", "accepting_patients", "doctor_rating", "doctor_picture", "description")]
+        # NULL fees sort first under payment_fee ASC
+        mock_cursor.fetchall.return_value = [
+            (3, "Dan", "Park", "Cardiology", "Newark", "NJ", "07102", None, 1, 4.0, None, "Heart"),
+            (5, "Eve", "Ross", "Cardiology", "Newark", "NJ", "07102", None, 1, 3.8, None, "Heart"),
+        ]
+        mock_cursor_factory.return_value = mock_cursor
+
+        response = client.get('/doctors/search?sort=fee&limit=1')
+        data = response.get_json()
+        assert [d["doctor_id"] for d in data["doctors"]] == [3]
+        assert data["next_cursor"]
+
+        response = client.get(f'/doctors/search?sort=fee&limit=1&cursor={data["next_cursor"]}')
+        assert response.status_code == 200
+        query, params = mock_cursor.execute.call_args[0]
+        assert "(payment_fee IS NULL AND doctor_id > %s) OR payment_fee IS NOT NULL" in query
+        assert "payment_fee > %s" not in query
+        assert params == (3, 2)
+
+def test_search_doctors_invalid_params(client):
+    assert client.get('/doctors/search?sort=name').status_code == 400
+    assert client.get('/doctors/search?min_fee=cheap').status_code == 400
+    assert client.get('/doctors/search?accepting_patients=yes').status_code == 400
+    assert client.get('/doctors/search?cursor=not-a-cursor').status_code == 400
+
 def test_get_appointments_by_doctor_success(client):
     with patch('routes.doctor_routes.mysql.connection.cursor') as mock_cursor_factory:
         mock_cursor = MagicMock()
@@ -235,6 +349,37 @@ def test_get_appointments_by_doctor_error(client):
         assert response.status_code == 400
         assert "error" in response.get_json()
 
+def test_doctor_appointment_buckets_groups_rows(client):
+    with patch('routes.doctor_routes.mysql.connection.cursor') as mock_cursor_factory:
+        mock_cursor = MagicMock()
+        mock_cursor.description = [("patient_appt_id",), ("appointment_datetime",), ("bucket",), ("bucket_row",)]
+        mock_cursor.fetchall.return_value = [
+            (5, "2030-01-01 09:00:00", "requested", 1),
+            (6, "2030-01-02 09:00:00", "requested", 2),
+            (2, "2020-01-01 09:00:00", "past", 1),
+        ]
+        mock_cursor_factory.return_value = mock_cursor
+
+        response = client.get('/doctor/1/appointments?status=requested,past&limit=1'
+                              '&fields=patient_appt_id')
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data["requested"]["appointments"] == [{"patient_appt_id": 5}]
+        assert data["requested"]["next_cursor"] is not None
+        assert data["past"] == {"appointments": [{"patient_appt_id": 2}], "next_cursor": None}
+        mock_cursor.execute.assert_called_once()
+
+def test_doctor_appointment_buckets_rejects_unknown_status(client):
+    response = client.get('/doctor/1/appointments?status=soon')
+    assert response.status_code == 400
+
+def test_doctor_appointment_buckets_cursor_needs_single_status(client):
+    from pagination import encode_cursor
+    cursor = encode_cursor(["past", "2020-01-01 09:00:00", 2])
+    response = client.get(f'/doctor/1/appointments?status=past,upcoming&cursor={cursor}')
+    assert response.status_code == 400
+
 def test_update_appointment_status_accept(client):
     with patch('routes.doctor_routes.mysql.connection.cursor') as mock_cursor_factory:
         mock_cursor = MagicMock()
@@ -257,6 +402,35 @@ def test_update_appointment_status_deny(client):
         data = response.get_json()
         assert data['message'] == "Appointment denied (status set to 0.5) successfully."
 
+def test_update_appointment_status_pushes_to_doctor_and_patient(client):
+    with patch('routes.doctor_routes.mysql.connection.cursor') as mock_cursor_factory, \
+         patch('routes.doctor_routes.push') as mock_push:
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = (7, 3)
+        mock_cursor_factory.return_value = mock_cursor
+
+        response = client.patch('/doc-appointments-status/42', json={"accepted": 1})
+
+        assert response.status_code == 200
+        mock_push.assert_called_once_with(
+            'appointment_status_changed', {"appt_id": 42, "accepted": 1}, 'doctor.7', 'patient.3'
+        )
+
+def test_update_appointment_status_survives_failed_push_lookup(client):
+    with patch('routes.doctor_routes.mysql.connection') as mock_conn, \
+         patch('routes.doctor_routes.push') as mock_push:
+        mock_cursor = MagicMock()
+        # the UPDATE goes through; the post-commit "who to tell" lookup fails
+        mock_cursor.execute.side_effect = [None, Exception("Lost connection")]
+        mock_conn.cursor.return_value = mock_cursor
+
+        response = client.patch('/doc-appointments-status/42', json={"accepted": 1})
+
+        assert response.status_code == 200
+        mock_conn.commit.assert_called_once()
+        assert not mock_conn.rollback.called
+        assert not mock_push.called
+
 def test_update_appointment_status_invalid_input(client):
     response = client.patch('/doc-appointments-status/42', json={"accepted": 2})
     assert response.status_code == 400
@@ -389,7 +563,7 @@ def test_add_appointment_note_db_error(client):
 def test_get_doctor_average_rating_success(client):
     with patch('routes.doctor_routes.mysql.connection.cursor') as mock_cursor_factory:
         mock_cursor = MagicMock()
-        mock_cursor.fetchone.return_value = (4.25,)  # average
+        mock_cursor.fetchone.return_value = (17.0, 4)  # rating_sum, rating_count
         mock_cursor_factory.return_value = mock_cursor
 
         response = client.get('/doctor/1/rating')
@@ -400,7 +574,7 @@ def test_get_doctor_average_rating_success(client):
 def test_get_doctor_average_rating_none(client):
     with patch('routes.doctor_routes.mysql.connection.cursor') as mock_cursor_factory:
         mock_cursor = MagicMock()
-        mock_cursor.fetchone.return_value = (None,)
+        mock_cursor.fetchone.return_value = (0, 0)
         mock_cursor_factory.return_value = mock_cursor
 
         response = client.get('/doctor/1/rating')
@@ -626,3 +800,31 @@ def test_get_top_doctors_error(client):
         response = client.get('/top-doctors')
         assert response.status_code == 400
         assert "DB crashed" in response.get_json()["error"]
+
+def test_doctor_cohort_summary_and_cache(client):
+    with patch('routes.doctor_routes.mysql.connection.cursor') as mock_cursor_factory:
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [
+            (4, "Jane", "Doe", 25, 0.8, 70.4, 62, None, 4, -2.4),
+            (9, "Sam", "Lee", 0, None, None, None, None, 0, None),
+        ]
+        mock_cursor_factory.return_value = mock_cursor
+
+        response = client.get('/doctor/1/cohort?days=30')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data["cohort"]["patients"] == 2
+        assert data["cohort"]["reporting"] == 1
+        assert data["cohort"]["not_reporting"] == [9]
+        assert data["patients"][0]["weekly_weight_trend"] == -0.6
+
+        # served from cache until one of the patients writes a survey
+        client.get('/doctor/1/cohort?days=30')
+        assert mock_cursor.execute.call_count == 1
+        invalidate_patient_cohort(4)
+        client.get('/doctor/1/cohort?days=30')
+        assert mock_cursor.execute.call_count == 2
+
+def test_doctor_cohort_rejects_bad_window(client):
+    response = client.get('/doctor/1/cohort?days=0')
+    assert response.status_code == 400
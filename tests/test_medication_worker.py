@@ -0,0 +1,174 @@
+import pytest
+import hashlib
+import json
+from unittest.mock import patch
+from metrics import Metrics
+from medication_worker import InvalidRequest, MedicationWorker, parse_request, request_key
+import MySQLdb
+
+
+class FakeChannel:
+    def __init__(self, log):
+        self.log = log
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.log.append(('ack', delivery_tag, multiple))
+
+    def basic_nack(self, delivery_tag, requeue=True):
+        self.log.append(('nack', delivery_tag, requeue))
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.log.append(('publish', routing_key, json.loads(body)))
+
+
+class FakeCursor:
+    """
+    Enough of a MySQLdb cursor for the worker: inserts for appt 99 hit a missing FK,
+    inserts whose request_key is already in `existing` hit the unique key.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self._rows = []
+
+    def execute(self, query, params=None):
+        if 'INSERT INTO PATIENT_PRESCRIPTION' in query:
+            appt_id, medicine_id, quantity, key = params
+            if self.connection.error:
+                raise self.connection.error
+            if appt_id == 99:
+                raise MySQLdb.IntegrityError(1452, "Cannot add or update a child row")
+            if key in self.connection.existing:
+                raise MySQLdb.IntegrityError(1062, "Duplicate entry")
+            self.connection.inserted.append((appt_id, medicine_id, quantity, key))
+        elif 'SELECT pp.prescription_id' in query:
+            self.description = [(c,) for c in ('prescription_id', 'appt_id', 'medicine_id', 'quantity',
+                                                'pharmacy_id', 'doctor_id', 'patient_id')]
+            self._rows = [(500 + i, appt_id, medicine_id, quantity, 3, 4, 5)
+                          for i, (appt_id, medicine_id, quantity, key) in enumerate(self.connection.inserted)
+                          if key in params]
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, log, existing=(), error=None):
+        self.log = log
+        self.existing = set(existing)
+        self.error = error
+        self.inserted = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.log.append(('commit',))
+
+    def rollback(self):
+        self.log.append(('rollback',))
+        self.inserted = []
+
+
+def _message(appt_id, medicine_id=2, quantity=1, request_id=None):
+    body = {"appt_id": appt_id, "medicine_id": medicine_id, "quantity": quantity}
+    if request_id:
+        body["request_id"] = request_id
+    return json.dumps(body).encode()
+
+
+@pytest.fixture(autouse=True)
+def metrics():
+    fresh = Metrics()
+    with patch('medication_worker.worker_metrics', fresh):
+        yield fresh
+
+
+def test_parse_request_uses_request_id_as_key():
+    request = parse_request(_message(10, 2, "3", request_id="abc123"))
+    assert request == {'appt_id': 10, 'medicine_id': 2, 'quantity': 3, 'request_key': "abc123"}
+
+def test_request_key_falls_back_to_prescription_digest():
+    key = request_key({'appt_id': 10, 'medicine_id': 2, 'quantity': 3})
+    assert key == hashlib.sha1(b"10:2:3").hexdigest()
+    # a redelivery of the same legacy message maps to the same row
+    assert parse_request(_message(10, 2, 3))['request_key'] == key
+
+@pytest.mark.parametrize("body", [
+    b"not json",
+    json.dumps([1, 2]).encode(),
+    json.dumps({"appt_id": 10, "medicine_id": 2}).encode(),
+    json.dumps({"appt_id": "ten", "medicine_id": 2, "quantity": 1}).encode(),
+    json.dumps({"appt_id": 10, "medicine_id": 2, "quantity": 0}).encode(),
+])
+def test_parse_request_rejects_unusable_messages(body):
+    with pytest.raises(InvalidRequest):
+        parse_request(body)
+
+def test_flush_acks_once_after_commit_and_dead_letters_rejects(metrics):
+    log = []
+    channel = FakeChannel(log)
+    connection = FakeConnection(log, existing={"dup"})
+    worker = MedicationWorker(lambda: connection, prefetch=10, batch_size=10, flush_after=1)
+    worker.pending = [
+        (1, _message(10, request_id="a")),
+        (2, b"not json"),
+        (3, _message(11, request_id="dup")),  # already processed on an earlier delivery
+        (4, _message(99, request_id="b")),    # unknown appointment
+        (5, _message(12, request_id="c")),
+    ]
+
+    worker.flush(channel)
+
+    settles = [entry for entry in log if entry[0] in ('ack', 'nack', 'commit')]
+    assert settles == [
+        ('nack', 2, False),   # unparseable: dead-lettered before anything is written
+        ('commit',),
+        ('nack', 4, False),   # rejected by the database: dead-lettered, never retried
+        ('ack', 5, True),     # one ack for 1, 3 and 5, only once the rows are committed
+    ]
+    assert [row[3] for row in connection.inserted] == ["a", "c"]
+    assert worker.pending == []
+
+    published = [entry for entry in log if entry[0] == 'publish']
+    assert [entry[1] for entry in published] == ["pharmacy.3", "pharmacy.3"]
+    assert published[0][2]["event"] == "prescription_queued"
+
+    counts = metrics.snapshot()["counts"]
+    assert counts["processed"] == 2
+    assert counts["duplicates"] == 1
+    assert counts["dead_lettered"] == 2
+
+def test_flush_with_only_rejects_never_acks():
+    log = []
+    worker = MedicationWorker(lambda: FakeConnection(log), prefetch=10, batch_size=10, flush_after=1)
+    worker.pending = [(1, b"{}"), (2, _message(99))]
+
+    worker.flush(FakeChannel(log))
+
+    assert [entry for entry in log if entry[0] in ('ack', 'nack')] == [('nack', 1, False), ('nack', 2, False)]
+
+def test_flush_requeues_batch_when_database_is_lost(metrics):
+    log = []
+    connection = FakeConnection(log, error=MySQLdb.OperationalError(2006, "MySQL server has gone away"))
+    worker = MedicationWorker(lambda: connection, prefetch=10, batch_size=10, flush_after=1)
+    worker.pending = [(1, _message(10)), (2, b"not json"), (3, _message(11))]
+
+    with pytest.raises(MySQLdb.OperationalError):
+        worker.flush(FakeChannel(log))
+
+    assert ('rollback',) in log
+    assert [entry for entry in log if entry[0] in ('ack', 'nack')] == [
+        ('nack', 2, False), ('nack', 1, True), ('nack', 3, True)
+    ]
+    # reconnect on the next batch
+    assert worker.db is None
+    assert metrics.snapshot()["counts"]["requeued"] == 2
+
+def test_batch_size_never_exceeds_prefetch():
+    worker = MedicationWorker(lambda: None, prefetch=20, batch_size=50, flush_after=1)
+    assert worker.batch_size == 20
@@ -1,13 +1,17 @@
 import pytest
 from unittest.mock import patch, MagicMock
 from app import app
+from cache import patient_cache
+from routes.patient_routes import GCS_BUCKET, _upload_patient_picture
 import json
 import bcrypt
-from datetime import datetime
+import base64
+from datetime import datetime, date
 
 @pytest.fixture
 def client():
     app.config['TESTING'] = True
+    patient_cache.clear()
     with patch('routes.patient_routes.mysql') as mock_mysql:
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
@@ -20,6 +24,7 @@ def test_register_patient_with_survey_success(client):
 
     # Simulate finding pharmacy
     mock_cursor.fetchone.side_effect = [(1,)]  # First fetch is pharmacy
+    mock_cursor.lastrowid = 10
 
     test_data = {
         "patient_email": "test@example.com",
@@ -58,6 +63,9 @@ def test_register_patient_with_survey_success(client):
 
     assert response.status_code == 201
     assert b"Patient registered successfully" in response.data
+    body = response.get_json()
+    assert body["patient_id"] == 10
+    assert body["profile_pic_pending"] is False
     assert mock_conn.commit.called
 
 def test_register_patient_with_survey_no_pharmacy(client):
@@ -104,6 +112,118 @@ def test_register_patient_with_survey_no_pharmacy(client):
     assert response.status_code == 400
     assert b"Pharmacy not found" in response.data
 
+def test_register_patient_with_pharmacy_id(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.lastrowid = 42
+
+    test_data = {
+        "patient_email": "id@example.com",
+        "patient_password": "secret123",
+        "first_name": "Jane",
+        "last_name": "Doe",
+        "pharmacy_id": 7,
+        "mobile_number": "1234567890",
+        "dob": "1990-01-01",
+        "blood_type": "B+",
+        "patient_address": "1 Oak St",
+        "patient_zipcode": "54321",
+        "patient_city": "Metropolis",
+        "patient_state": "NY"
+    }
+
+    response = test_client.post(
+        '/register-patient-with-survey',
+        data=json.dumps(test_data),
+        content_type='application/json'
+    )
+
+    assert response.status_code == 201
+    assert response.get_json()["patient_id"] == 42
+    # no pharmacy lookup: just the two inserts, in one transaction
+    assert mock_cursor.execute.call_count == 2
+    assert not mock_cursor.fetchone.called
+    assert mock_conn.commit.call_count == 1
+
+def _registration(**extra):
+    return {
+        "patient_email": "pic@example.com",
+        "patient_password": "secret123",
+        "first_name": "Jane",
+        "last_name": "Doe",
+        "pharmacy_id": 7,
+        "mobile_number": "1234567890",
+        "dob": "1990-01-01",
+        "blood_type": "B+",
+        "patient_address": "1 Oak St",
+        "patient_zipcode": "54321",
+        "patient_city": "Metropolis",
+        "patient_state": "NY",
+        **extra
+    }
+
+def test_register_patient_accepts_line_wrapped_picture(client):
+    test_client, mock_cursor, _ = client
+    mock_cursor.lastrowid = 42
+    image = bytes(range(256)) * 2
+    encoded = base64.encodebytes(image).decode()  # wrapped at 76 characters
+    assert "\n" in encoded
+
+    with patch('routes.patient_routes._upload_pool') as mock_upload_pool:
+        response = test_client.post(
+            '/register-patient-with-survey',
+            data=json.dumps(_registration(patient_picture=encoded)),
+            content_type='application/json'
+        )
+
+    assert response.status_code == 201
+    assert response.get_json()["profile_pic_pending"] is True
+    mock_upload_pool.submit.assert_called_once_with(_upload_patient_picture, 42, image)
+
+def test_register_patient_rejects_bad_picture(client):
+    test_client, mock_cursor, _ = client
+
+    response = test_client.post(
+        '/register-patient-with-survey',
+        data=json.dumps(_registration(patient_picture="not*base64!")),
+        content_type='application/json'
+    )
+
+    assert response.status_code == 400
+    assert b"patient_picture must be base64 encoded" in response.data
+    assert not mock_cursor.execute.called
+
+def test_upload_patient_picture_points_patient_at_blob():
+    pooled_cursor = MagicMock()
+    with patch('routes.patient_routes.storage_client') as mock_storage, \
+         patch('routes.patient_routes.pool') as mock_pool, \
+         patch('routes.patient_routes.invalidate_patient') as mock_invalidate, \
+         patch('routes.patient_routes.time.time', return_value=1700000000):
+        mock_pool.connection.return_value.__enter__.return_value.cursor.return_value = pooled_cursor
+
+        _upload_patient_picture(42, b"png bytes")
+
+    mock_storage.bucket.assert_called_once_with(GCS_BUCKET)
+    mock_storage.bucket.return_value.blob.assert_called_once_with("patients/42_1700000000.png")
+    blob = mock_storage.bucket.return_value.blob.return_value
+    blob.upload_from_string.assert_called_once_with(b"png bytes", content_type='image/png')
+    query, params = pooled_cursor.execute.call_args[0]
+    assert "UPDATE PATIENT SET profile_pic" in query
+    assert params == (f"https://storage.googleapis.com/{GCS_BUCKET}/patients/42_1700000000.png", 42)
+    pooled_cursor.close.assert_called_once()
+    mock_invalidate.assert_called_once_with(42)
+
+def test_upload_patient_picture_failure_leaves_profile_pic_unset():
+    with patch('routes.patient_routes.storage_client') as mock_storage, \
+         patch('routes.patient_routes.pool') as mock_pool, \
+         patch('routes.patient_routes.invalidate_patient') as mock_invalidate:
+        mock_storage.bucket.return_value.blob.return_value.upload_from_string.side_effect = Exception("GCS down")
+
+        # logged, never raised: the patient is already registered
+        _upload_patient_picture(42, b"png bytes")
+
+    assert not mock_pool.connection.called
+    assert not mock_invalidate.called
+
 def test_get_patient_success(client):
     test_client, mock_cursor, _ = client
     mock_cursor.fetchone.return_value = (
@@ -289,6 +409,32 @@ def test_get_daily_surveys_success(client):
     assert len(data) == 2
     assert data[0]["mood"] == "Happy"
 
+def test_get_daily_surveys_paged(client):
+    test_client, mock_cursor, _ = client
+
+    mock_cursor.description = [("ds_id",), ("patient_id",), ("date",), ("mood",)]
+    mock_cursor.fetchall.return_value = [
+        (1, 1, "2025-05-01", "Happy"),
+        (2, 1, "2025-05-02", "Tired"),
+        (3, 1, "2025-05-03", "Calm")
+    ]
+
+    response = test_client.get('/daily-surveys/1?from=2025-05-01&to=2025-05-31&limit=2')
+
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert [row["ds_id"] for row in data] == [1, 2]
+    assert response.headers.get('X-Next-Cursor')
+    query, params = mock_cursor.execute.call_args[0]
+    assert "SELECT *" not in query
+    assert params[-1] == 3
+    mock_cursor.close.assert_called_once()
+
+def test_get_daily_surveys_bad_date(client):
+    test_client, _, _ = client
+    response = test_client.get('/daily-surveys/1?from=05/01/2025')
+    assert response.status_code == 400
+
 def test_get_daily_surveys_exception(client):
     test_client, mock_cursor, _ = client
     mock_cursor.execute.side_effect = Exception("Query error")
@@ -312,7 +458,8 @@ def test_add_weekly_survey_success(client):
 
     assert response.status_code == 201
     assert b"Weekly survey submitted successfully" in response.data
-    mock_cursor.execute.assert_called_once()
+    # the upsert, then the weight/BMI series refresh
+    assert mock_cursor.execute.call_count == 2
     mock_conn.commit.assert_called_once()
 
 def test_add_weekly_survey_exception(client):
@@ -389,7 +536,7 @@ def test_appointment_post_endpoints(client, endpoint, data, expected_status, mes
 
     if endpoint == "/appointment/rate":
         mock_cursor.rowcount = 1
-        mock_cursor.fetchone.side_effect = [(2,), (4.5,)]
+        mock_cursor.fetchone.side_effect = [(2, None), (4.5,)]
         response = test_client.patch(endpoint, data=json.dumps(data), content_type='application/json')
     else:
         response = test_client.post(endpoint, data=json.dumps(data), content_type='application/json')
@@ -433,11 +580,29 @@ def test_get_single_appointment_by_id_success(client):
 def test_cancel_appointment_success(client):
     test_client, mock_cursor, mock_conn = client
     mock_cursor.rowcount = 1
+    mock_cursor.fetchone.return_value = (3, 5, None)  # doctor, patient, not rated
 
     response = test_client.delete("/cancel-appointment/10")
     assert response.status_code == 200
     assert b"Appointment cancelled successfully" in response.data
-    mock_cursor.execute.assert_called_once()
+    # looks up the doctor/patient to notify, then deletes
+    assert mock_cursor.execute.call_count == 2
+    mock_conn.commit.assert_called_once()
+
+def test_cancel_rated_appointment_takes_rating_back(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.rowcount = 1
+    mock_cursor.fetchone.return_value = (3, 5, 4.0)
+
+    response = test_client.delete("/cancel-appointment/10")
+    assert response.status_code == 200
+    assert mock_cursor.execute.call_count == 3
+    query, params = mock_cursor.execute.call_args_list[1][0]
+    assert "rating_sum = rating_sum - %s" in query and "rating_count = rating_count - 1" in query
+    # taking away the doctor's only rating must not null doctor_rating (matches reconcile-ratings)
+    assert "COALESCE(rating_sum / NULLIF(rating_count, 0), doctor_rating)" in query
+    assert params == (4.0, 3)
+    assert "DELETE FROM PATIENT_APPOINTMENT" in mock_cursor.execute.call_args_list[2][0][0]
     mock_conn.commit.assert_called_once()
 
 def test_cancel_appointment_not_found(client):
@@ -474,6 +639,189 @@ def test_get_all_bills_for_patient_failure(client):
     assert b"error" in response.data
 
 
+def test_get_patient_statement_paginates(client):
+    test_client, mock_cursor, _ = client
+    # entry_id, amount, then the statement columns; limit=2 fetches 3
+    mock_cursor.fetchall.return_value = [
+        (11, -120.0, 1, 'charge', 'Appt 1', datetime(2025, 5, 1), 75.0, 45.0, None, -120.0),
+        (12, 100.0, 2, 'credit', 'credit', datetime(2025, 5, 2), None, None, 100.0, -20.0),
+        (13, -50.0, 3, 'charge', 'Appt 2', datetime(2025, 5, 9), 50.0, 0.0, None, -70.0)
+    ]
+
+    response = test_client.get('/patient/1/statement?from=2025-05-01&to=2025-05-31&limit=2')
+
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data["opening_balance"] == 0.0
+    assert [e["current_bill"] for e in data["entries"]] == [-120.0, -20.0]
+    assert data["next_cursor"]
+
+    query, params = mock_cursor.execute.call_args[0]
+    assert "l.created_at >= %s" in query
+    assert params[-1] == 3
+
+def test_get_patient_statement_bad_date(client):
+    test_client, _, _ = client
+    response = test_client.get('/patient/1/statement?from=05/01/2025')
+    assert response.status_code == 400
+
+def test_add_patient_bills_batch(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.fetchall.side_effect = [
+        [(10, 1, 75.0, 45.0), (11, 1, 75.0, 0.0), (12, 2, 50.0, 0.0)],  # charges
+        [(1, -20.0), (2, 0.0)],                                         # locked balances
+        [],                                                             # billed meanwhile
+        [(1, 3)],                                                       # existing bill counts
+        [(10, 100), (11, 101), (12, 102)]                               # new bill ids
+    ]
+
+    response = test_client.post('/patient/bills/batch', json={"appt_ids": [10, 11, 12, 13]})
+
+    assert response.status_code == 201
+    data = json.loads(response.data)
+    assert data["billed"] == 3
+    assert data["total_charged"] == 245.0
+    assert data["balances"] == {"1": -215.0, "2": -50.0}
+    assert data["skipped_appt_ids"] == [13]
+
+    bill_rows = mock_cursor.executemany.call_args_list[0][0][1]
+    assert [row[4] for row in bill_rows] == ["Appt 4", "Appt 5", "Appt 1"]
+    assert mock_conn.commit.call_count == 1
+
+def test_add_patient_bills_batch_skips_appointments_billed_meanwhile(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.fetchall.side_effect = [
+        [(10, 1, 75.0, 45.0), (11, 1, 0.0, 20.0)],  # charges; 11's doctor has no fee
+        [(1, 0.0)],                                  # locked balances
+        [(10,)],                                     # 10 was billed after the first read
+        [(1, 3)],                                    # existing bill counts
+        [(11, 101)]                                  # new bill ids
+    ]
+
+    response = test_client.post('/patient/bills/batch', json={"appt_ids": [10, 11]})
+
+    assert response.status_code == 201
+    data = json.loads(response.data)
+    assert data["billed"] == 1
+    assert data["total_charged"] == 20.0
+    assert data["skipped_appt_ids"] == [10]
+
+    charges_query = mock_cursor.execute.call_args_list[0][0][0]
+    assert "IFNULL(d.payment_fee, 0)" in charges_query
+    recheck_query = mock_cursor.execute.call_args_list[2][0][0]
+    assert "FROM PATIENT_BILL" in recheck_query and "FOR SHARE" in recheck_query
+    bill_rows = mock_cursor.executemany.call_args_list[0][0][1]
+    assert [row[0] for row in bill_rows] == [11]
+
+def test_add_patient_bills_batch_reports_failed_chunk(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.fetchall.side_effect = [
+        # first chunk [10, 11] commits
+        [(10, 1, 75.0, 0.0), (11, 2, 50.0, 0.0)],
+        [(1, 0.0), (2, 0.0)],
+        [],
+        [],
+        [(10, 100), (11, 101)],
+        # second chunk [12] fails on its first read
+        Exception("Lock wait timeout exceeded"),
+    ]
+
+    with patch('billing.config.BILLING_BATCH_SIZE', 2):
+        response = test_client.post('/patient/bills/batch', json={"appt_ids": [10, 11, 12]})
+
+    assert response.status_code == 207
+    data = json.loads(response.data)
+    assert data["billed"] == 2
+    assert [b["bill_id"] for b in data["bills"]] == [100, 101]
+    assert data["failed"] == [{"appt_ids": [12], "error": "Lock wait timeout exceeded"}]
+    assert data["skipped_appt_ids"] == []
+    assert mock_conn.commit.call_count == 1
+    assert mock_conn.rollback.call_count == 1
+
+def test_add_patient_bills_batch_all_chunks_failed(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.fetchall.side_effect = Exception("Deadlock found")
+
+    response = test_client.post('/patient/bills/batch', json={"appt_ids": [10]})
+
+    assert response.status_code == 500
+    data = json.loads(response.data)
+    assert data["billed"] == 0 and data["bills"] == []
+    assert data["failed"] == [{"appt_ids": [10], "error": "Deadlock found"}]
+    assert not mock_conn.commit.called
+
+def test_add_patient_bill_success(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.fetchone.side_effect = [
+        (1, 75.0),   # patient, doctor fee
+        (-20.0,),    # locked balance
+        None,        # no bill for this appointment yet
+        (45.0,),     # prescriptions
+        (3,),        # bills so far
+    ]
+    mock_cursor.lastrowid = 100
+
+    response = test_client.post('/patient/bill', json={"appt_id": 42})
+
+    assert response.status_code == 201
+    data = json.loads(response.data)
+    assert data["current_bill"] == 120.0
+    assert data["article"] == "Appt 4"
+    assert data["balance"] == -140.0
+    mock_conn.commit.assert_called_once()
+
+def test_add_patient_bill_already_billed(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.fetchone.side_effect = [
+        (1, 75.0),
+        (-120.0,),
+        (100, 75.0, 45.0, 120.0, "Appt 2"),  # existing bill
+    ]
+
+    response = test_client.post('/patient/bill', json={"appt_id": 42})
+
+    assert response.status_code == 409
+    data = json.loads(response.data)
+    assert data["bill_id"] == 100
+    assert data["article"] == "Appt 2"
+    assert data["current_bill"] == 120.0
+    assert "FOR SHARE" in mock_cursor.execute.call_args_list[2][0][0]
+    assert not mock_cursor.executemany.called
+    assert not mock_conn.commit.called
+
+def test_add_patient_bills_batch_requires_input(client):
+    test_client, _, _ = client
+    response = test_client.post('/patient/bills/batch', json={"from": "2025-05-01"})
+    assert response.status_code == 400
+
+def test_make_general_payment_posts_to_ledger(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.fetchone.side_effect = [(-120.0,)]  # locked acct_balance
+    mock_cursor.lastrowid = 5
+
+    response = test_client.post('/patient/1/payment', json={"credit": 100.0})
+
+    assert response.status_code == 201
+    data = json.loads(response.data)
+    assert data["new_balance"] == -20.0
+
+    ledger_rows = mock_cursor.executemany.call_args[0][1]
+    assert ledger_rows[0][1:4] == ('credit', None, 5)
+    assert float(ledger_rows[0][5]) == -20.0
+    assert "FOR UPDATE" in mock_cursor.execute.call_args_list[0][0][0]
+    assert mock_conn.commit.called
+
+def test_make_general_payment_overpayment(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.fetchone.side_effect = [(-50.0,)]
+
+    response = test_client.post('/patient/1/payment', json={"credit": 100.0})
+
+    assert response.status_code == 400
+    assert b"exceeds outstanding balance" in response.data
+    assert not mock_cursor.executemany.called
+
+
 def test_edit_patient_success(client):
     test_client, mock_cursor, mock_conn = client
 
@@ -500,10 +848,13 @@ def test_edit_patient_success(client):
         "state": "NY"
     }
 
-    response = test_client.put('/edit-patient', data=json.dumps(payload), content_type='application/json')
+    with patch('routes.patient_routes.refresh_weekly_series') as mock_refresh:
+        response = test_client.put('/edit-patient', data=json.dumps(payload), content_type='application/json')
     assert response.status_code == 200
     assert b"updated successfully" in response.data
     assert mock_cursor.execute.call_count == 2
+    # height/weight may have changed, so the stored weekly weight/bmi series is recomputed
+    mock_refresh.assert_called_once_with(mock_cursor, [101])
     assert mock_conn.commit.called
 
 def test_edit_patient_failure(client):
@@ -522,3 +873,87 @@ def test_edit_patient_failure(client):
     assert response.status_code == 500
     assert b"error" in response.data
     assert mock_conn.rollback.called
+
+def test_patient_dashboard_success(client):
+    test_client, _, _ = client
+    payload = {"profile": {"patient_id": 5}, "daily_surveys": {"items": [], "has_more": False}}
+    with patch('routes.patient_routes.load_dashboard', return_value=payload) as mock_load:
+        response = test_client.get("/patient/5/dashboard?limit=50")
+    assert response.status_code == 200
+    assert response.get_json()["profile"]["patient_id"] == 5
+    # limit is capped per section
+    mock_load.assert_called_once_with(5, 20)
+
+def test_patient_dashboard_not_found(client):
+    test_client, _, _ = client
+    with patch('routes.patient_routes.load_dashboard', return_value=None):
+        response = test_client.get("/patient/999/dashboard")
+    assert response.status_code == 404
+
+def test_survey_analytics_columns(client):
+    test_client, mock_cursor, _ = client
+    mock_cursor.fetchall.return_value = [
+        ("2024-04-01", 7, 0.86, 6.14, 4, 8, 2010.5, 1800, 2300, 72.3, 65, 80, 31.4, 0, 60),
+        ("2024-04-08", 5, 0.6, 7.0, 5, 9, 1985.0, 1700, 2200, 70.8, 66, 77, 25.0, 10, 45),
+    ]
+
+    response = test_client.get("/patient/5/survey-analytics?bucket=week&from=2024-04-01")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["periods"] == ["2024-04-01", "2024-04-08"]
+    assert data["surveys"] == [7, 5]
+    assert data["heart_rate"] == {"mean": [72.3, 70.8], "min": [65, 66], "max": [80, 77]}
+    assert "WEEKDAY" in mock_cursor.execute.call_args[0][0]
+
+def test_survey_analytics_invalid_bucket(client):
+    test_client, _, _ = client
+    response = test_client.get("/patient/5/survey-analytics?bucket=year")
+    assert response.status_code == 400
+
+def test_sync_surveys_statuses(client):
+    test_client, mock_cursor, mock_conn = client
+    # 2025-05-01 already exists, 2025-05-02 doesn't
+    mock_cursor.fetchall.return_value = [(date(2025, 5, 1),)]
+    day = {"water_intake": 8, "calories_consumed": 2100, "heart_rate": 70, "exercise": 30}
+
+    response = test_client.post('/surveys/sync', json={
+        "patient_id": 5,
+        "daily": [
+            {"date": "2025-05-01", **day},
+            {"date": "2025-05-02", **day},
+            {"date": "2025-05-02", **day, "mood": "Tired"},
+            {"date": "2025-05-03"}
+        ]
+    })
+
+    assert response.status_code == 200
+    statuses = [r["status"] for r in response.get_json()["daily"]]
+    assert statuses == ["updated", "duplicate", "created", "invalid"]
+    assert response.get_json()["weekly"] == []
+    # one multi-row upsert for the two distinct days
+    rows = mock_cursor.executemany.call_args[0][1]
+    assert len(rows) == 2
+    mock_conn.commit.assert_called_once()
+
+def test_sync_surveys_requires_patient(client):
+    test_client, _, _ = client
+    response = test_client.post('/surveys/sync', json={"daily": []})
+    assert response.status_code == 400
+
+def test_get_patient_cached_until_edit(client):
+    test_client, mock_cursor, _ = client
+    mock_cursor.fetchone.return_value = (
+        7, "jane@example.com", "Jane", "Doe", 2, 3, None, "Acme", "P-1", "2026-01-01", 70
+    )
+
+    assert test_client.get('/patient/7').status_code == 200
+    second = test_client.get('/patient/7')
+    assert second.status_code == 200
+    assert second.get_json()["first_name"] == "Jane"
+    assert mock_cursor.execute.call_count == 1
+
+    test_client.put('/edit-patient', json={"patient_id": 7, "email": "jane@example.com",
+                                           "first_name": "Janet", "last_name": "Doe"})
+    calls = mock_cursor.execute.call_count
+    test_client.get('/patient/7')
+    assert mock_cursor.execute.call_count == calls + 1
@@ -0,0 +1,373 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from app import app
+from metrics import Metrics
+from jobs import refresh_stock_risk_once
+from pagination import DEFAULT_LIMIT, decode_cursor
+from datetime import datetime
+import MySQLdb
+from MySQLdb.cursors import SSCursor
+import json
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    with patch('routes.pharmacy_routes.mysql') as mock_mysql, \
+         patch('routes.pharmacy_routes.fill_metrics', Metrics()):
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_conn.cursor.return_value = mock_cursor
+        mock_mysql.connection = mock_conn
+        yield app.test_client(), mock_cursor, mock_conn
+
+def test_fill_prescription_success(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.rowcount = 1
+    mock_cursor.fetchone.return_value = (3, 8, 21, 2)  # pharmacy, patient, medicine, quantity
+
+    with patch('routes.pharmacy_routes.push') as mock_push:
+        response = test_client.put('/prescription/fill', json={"prescription_id": 15})
+
+    assert response.status_code == 200
+    assert b"Prescription filled" in response.data
+    # stock decrement and filled flag are one conditional UPDATE
+    fill_query, params = mock_cursor.execute.call_args_list[0][0]
+    assert "ms.stock_count >= pp.quantity" in fill_query and "pp.filled = 1" in fill_query
+    assert params == (15,)
+    mock_conn.commit.assert_called_once()
+    mock_push.assert_called_once()
+    assert mock_push.call_args[0][0] == 'prescription_ready'
+    assert mock_push.call_args[0][2:] == ("pharmacy.3", "patient.8")
+
+    counts = test_client.get('/prescription/fill/metrics').get_json()["counts"]
+    assert counts == {"attempts": 1, "filled": 1}
+
+def test_fill_prescription_survives_failed_push_lookup(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.rowcount = 1
+    mock_cursor.execute.side_effect = [None, Exception("Lost connection")]
+
+    response = test_client.put('/prescription/fill', json={"prescription_id": 15})
+
+    assert response.status_code == 200
+    mock_conn.commit.assert_called_once()
+    assert not mock_conn.rollback.called
+
+def test_fill_prescription_already_filled(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.rowcount = 0
+    mock_cursor.fetchone.return_value = (2, 1, 10)  # quantity, filled, stock
+
+    response = test_client.put('/prescription/fill', json={"prescription_id": 15})
+
+    assert response.status_code == 409
+    assert b"already been filled" in response.data
+    assert not mock_conn.commit.called
+    assert test_client.get('/prescription/fill/metrics').get_json()["counts"]["already_filled"] == 1
+
+def test_fill_prescription_insufficient_stock(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.rowcount = 0
+    mock_cursor.fetchone.return_value = (5, 0, 3)
+
+    response = test_client.put('/prescription/fill', json={"prescription_id": 15})
+
+    assert response.status_code == 400
+    data = response.get_json()
+    assert data["available_stock"] == 3
+    assert data["required_quantity"] == 5
+    assert not mock_conn.commit.called
+
+def test_fill_prescription_not_found(client):
+    test_client, mock_cursor, _ = client
+    mock_cursor.rowcount = 0
+    mock_cursor.fetchone.return_value = None
+
+    response = test_client.put('/prescription/fill', json={"prescription_id": 999})
+    assert response.status_code == 404
+    assert b"Prescription not found" in response.data
+
+def test_fill_prescription_not_stocked(client):
+    test_client, mock_cursor, _ = client
+    mock_cursor.rowcount = 0
+    mock_cursor.fetchone.return_value = (2, 0, None)
+
+    response = test_client.put('/prescription/fill', json={"prescription_id": 15})
+    assert response.status_code == 404
+    assert b"not found in pharmacy stock" in response.data
+
+def test_fill_prescription_retries_deadlock(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.rowcount = 1
+    mock_cursor.fetchone.return_value = None
+    mock_cursor.execute.side_effect = [MySQLdb.OperationalError(1213, "Deadlock found"), None, None]
+
+    with patch('routes.pharmacy_routes.push'):
+        response = test_client.put('/prescription/fill', json={"prescription_id": 15})
+
+    assert response.status_code == 200
+    # the deadlocked attempt is rolled back before the UPDATE runs again
+    mock_conn.rollback.assert_called_once()
+    mock_conn.commit.assert_called_once()
+    counts = test_client.get('/prescription/fill/metrics').get_json()["counts"]
+    assert counts["deadlock_retries"] == 1
+    assert counts["filled"] == 1
+
+def test_fill_prescription_gives_up_after_retries(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.execute.side_effect = MySQLdb.OperationalError(1205, "Lock wait timeout exceeded")
+
+    response = test_client.put('/prescription/fill', json={"prescription_id": 15})
+
+    assert response.status_code == 400
+    assert not mock_conn.commit.called
+    counts = test_client.get('/prescription/fill/metrics').get_json()["counts"]
+    assert counts["lock_timeout_retries"] == 2
+    assert counts["errors"] == 1
+
+def test_fill_prescription_requires_integer_id(client):
+    test_client, mock_cursor, _ = client
+    response = test_client.put('/prescription/fill', json={"prescription_id": "15"})
+    assert response.status_code == 400
+    assert not mock_cursor.execute.called
+
+def test_bulk_stock_json(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.fetchall.side_effect = [
+        [(1,)],                 # known pharmacies
+        [(3,), (7,)],           # known medicines
+        [(1, 3, 120), (1, 7, 10)],  # locked stock rows
+        [(1, 3, 170), (1, 7, 5)]    # counts after the upsert
+    ]
+
+    response = test_client.post('/stock/bulk', json={
+        "pharmacy_id": 1,
+        "items": [{"medicine_id": 3, "quantity": 50}, {"medicine_id": 7, "quantity": -5}]
+    })
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["applied"] == 2 and data["rejected"] == 0
+    assert [r["new_stock_count"] for r in data["results"]] == [170, 5]
+    upserts = mock_cursor.executemany.call_args[0][1]
+    assert sorted(upserts) == [(1, 3, 50), (1, 7, -5)]
+    mock_conn.commit.assert_called_once()
+
+def test_bulk_stock_csv(client):
+    test_client, mock_cursor, _ = client
+    mock_cursor.fetchall.side_effect = [
+        [(1,), (2,)],
+        [(3,)],
+        [],                     # no stock rows yet; the upsert creates them
+        [(1, 3, 20), (2, 3, 4)]
+    ]
+    body = "medicine_id,quantity,pharmacy_id\n3,20,\n3,4,2\n"
+
+    response = test_client.post('/stock/bulk?pharmacy_id=1', data=body, content_type='text/csv')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["applied"] == 2
+    # a blank pharmacy_id column falls back to ?pharmacy_id=
+    assert [(r["pharmacy_id"], r["new_stock_count"]) for r in data["results"]] == [(1, 20), (2, 4)]
+
+def test_bulk_stock_reports_invalid_rows(client):
+    test_client, mock_cursor, _ = client
+    mock_cursor.fetchall.side_effect = [
+        [(1,)],
+        [(3,)],                 # medicine 9 doesn't exist
+        [(1, 3, 2)],
+        []
+    ]
+
+    response = test_client.post('/stock/bulk', json={
+        "pharmacy_id": 1,
+        "items": [
+            {"medicine_id": 3, "quantity": 2.7},
+            {"medicine_id": 3, "quantity": "lots"},
+            {"medicine_id": 9, "quantity": 5},
+            {"medicine_id": 3, "quantity": -4},
+            "not an object"
+        ]
+    })
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["applied"] == 0 and data["rejected"] == 5
+    errors = [r["error"] for r in data["results"]]
+    assert errors[0] == errors[1] == errors[4] == "pharmacy_id, medicine_id and quantity must be integers."
+    assert errors[2] == "Unknown medicine_id."
+    assert errors[3] == "Would take stock below zero (current 2)."
+    assert not mock_cursor.executemany.called
+
+def test_bulk_stock_rejects_unreadable_body(client):
+    test_client, mock_cursor, _ = client
+    assert test_client.post('/stock/bulk', json={"pharmacy_id": 1}).status_code == 400
+    response = test_client.post('/stock/bulk', data="sku,count\n1,2\n", content_type='text/csv')
+    assert response.status_code == 400
+    assert not mock_cursor.execute.called
+
+QUEUE_COLUMNS = [(c,) for c in ("prescription_id", "created_at", "doctor_name", "patient_name",
+                                "medicine_name", "quantity", "filled", "picked_up")]
+
+def _queue_row(prescription_id, minute):
+    return (prescription_id, datetime(2025, 5, 15, 9, minute), "Jane Smith", "John Doe",
+            "Atorvastatin", 30, 0, 0)
+
+def test_prescription_queue_cursor_round_trip(client):
+    test_client, mock_cursor, _ = client
+    mock_cursor.description = QUEUE_COLUMNS
+    # limit=2 reads 3 rows to know there is another page
+    mock_cursor.fetchall.return_value = [_queue_row(101, 0), _queue_row(104, 5), _queue_row(107, 5)]
+
+    response = test_client.get('/pharmacy/5/queue?limit=2')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [p["prescription_id"] for p in data["prescriptions"]] == [101, 104]
+    # the cursor is the last row's (created_at, prescription_id)
+    assert decode_cursor(data["next_cursor"]) == ["2025-05-15 09:05:00", 104]
+    query, params = mock_cursor.execute.call_args[0]
+    assert "pp.filled = 0" in query and "IS NULL" not in query
+    assert params == (5, 3)
+
+    mock_cursor.fetchall.return_value = [_queue_row(107, 5)]
+    response = test_client.get(f'/pharmacy/5/queue?limit=2&cursor={data["next_cursor"]}')
+
+    data = response.get_json()
+    assert data["next_cursor"] is None
+    query, params = mock_cursor.execute.call_args[0]
+    assert "(pp.created_at > %s OR (pp.created_at = %s AND pp.prescription_id > %s))" in query
+    assert params == (5, "2025-05-15 09:05:00", "2025-05-15 09:05:00", 104, 3)
+
+def test_prescription_queue_invalid_params(client):
+    test_client, mock_cursor, _ = client
+    assert test_client.get('/pharmacy/5/queue?status=lost').status_code == 400
+    assert test_client.get('/pharmacy/5/queue?cursor=not-a-cursor').status_code == 400
+    assert not mock_cursor.execute.called
+
+def test_pickup_pages_through_header(client):
+    test_client, mock_cursor, _ = client
+    mock_cursor.description = QUEUE_COLUMNS
+    mock_cursor.fetchall.return_value = [_queue_row(101, 0), _queue_row(104, 5)]
+
+    response = test_client.get('/pickup/5?limit=1')
+
+    assert response.status_code == 200
+    # the body keeps its list shape; the next page's cursor rides in the header
+    assert response.get_json() == [{"patient_name": "John Doe", "medicine_name": "Atorvastatin", "quantity": 30}]
+    next_cursor = response.headers['X-Next-Cursor']
+    assert decode_cursor(next_cursor) == ["2025-05-15 09:00:00", 101]
+
+    mock_cursor.fetchall.return_value = [_queue_row(104, 5)]
+    response = test_client.get(f'/pickup/5?limit=1&cursor={next_cursor}')
+    assert 'X-Next-Cursor' not in response.headers
+    query, params = mock_cursor.execute.call_args[0]
+    assert "pp.filled = 1 AND pp.picked_up = 0" in query
+    assert params == (5, "2025-05-15 09:00:00", "2025-05-15 09:00:00", 101, 2)
+
+def test_unfilled_prescriptions_without_limit_returns_first_page(client):
+    test_client, mock_cursor, _ = client
+    mock_cursor.description = QUEUE_COLUMNS
+    mock_cursor.fetchall.return_value = [_queue_row(101, 0), _queue_row(104, 5)]
+
+    response = test_client.get('/unfilled_prescriptions/5')
+
+    assert response.status_code == 200
+    assert 'X-Next-Cursor' not in response.headers
+    data = response.get_json()
+    assert [p["prescription_id"] for p in data] == [101, 104]
+    assert data[0]["medication"] == "Atorvastatin" and data[0]["filled"] == 0
+    query, params = mock_cursor.execute.call_args[0]
+    # no limit still reads a bounded page, one extra row to tell whether there's more
+    assert "LIMIT %s" in query
+    assert params == (5, DEFAULT_LIMIT + 1)
+
+def test_all_prescriptions_streams_ndjson(client):
+    test_client, mock_cursor, mock_conn = client
+    mock_cursor.description = [(c,) for c in ("prescription_id", "appt_id", "medicine_id", "quantity",
+                                               "picked_up", "filled", "created_at", "updated_at")]
+    created = datetime(2025, 5, 15, 9, 12)
+    mock_cursor.__iter__.return_value = iter([
+        (101, 12, 3, 30, 0, 0, created, created),
+        (102, 12, 4, 10, 0, 1, created, created),
+    ])
+
+    response = test_client.get('/all_prescriptions')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).split("\n")
+    assert lines[-1] == ""  # every record, the last included, ends with a newline
+    records = [json.loads(line) for line in lines[:-1]]
+    assert [r["prescription_id"] for r in records] == [101, 102]
+    assert records[1] == {"prescription_id": 102, "appt_id": 12, "medicine_id": 4, "quantity": 10,
+                          "picked_up": 0, "filled": 1, "created_at": "Thu, 15 May 2025 09:12:00 GMT",
+                          "updated_at": "Thu, 15 May 2025 09:12:00 GMT"}
+    # read through an unbuffered server-side cursor, closed once the stream is done
+    assert mock_conn.cursor.call_args[0][0] is SSCursor
+    mock_cursor.close.assert_called_once()
+
+RISK_COLUMNS = [(c,) for c in ("medicine_id", "medicine_name", "stock_count", "pending_quantity",
+                               "pending_prescriptions", "projected_stock", "refreshed_at")]
+
+def test_stock_at_risk_worst_first(client):
+    test_client, mock_cursor, _ = client
+    mock_cursor.description = RISK_COLUMNS
+    refreshed = datetime(2025, 5, 16, 8, 0)
+    mock_cursor.fetchall.return_value = [
+        (3, "Metformin", 20, 90, 3, -70, refreshed),
+        (7, "Lisinopril", 12, 10, 1, 2, refreshed),
+    ]
+
+    response = test_client.get('/stock/at-risk/5')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [r["medicine_id"] for r in data] == [3, 7]
+    assert data[0]["projected_stock"] == -70
+    query, params = mock_cursor.execute.call_args[0]
+    assert "ORDER BY r.projected_stock ASC" in query
+    assert params == (5,)
+
+def test_stock_at_risk_empty(client):
+    test_client, mock_cursor, _ = client
+    mock_cursor.description = RISK_COLUMNS
+    mock_cursor.fetchall.return_value = []
+
+    response = test_client.get('/stock/at-risk/5')
+
+    assert response.status_code == 200
+    assert response.get_json() == []
+
+def test_refresh_stock_risk_rebuilds_in_one_transaction():
+    with patch('jobs.mysql') as mock_mysql, patch('jobs.config.STOCK_RISK_MARGIN', 5):
+        mock_cursor = MagicMock()
+        mock_cursor.rowcount = 4
+        mock_mysql.connection.cursor.return_value = mock_cursor
+
+        assert refresh_stock_risk_once() == 4
+
+        calls = mock_cursor.execute.call_args_list
+        assert len(calls) == 2
+        assert calls[0][0][0] == "DELETE FROM STOCK_AT_RISK"
+        insert_query, params = calls[1][0]
+        assert "INSERT INTO STOCK_AT_RISK" in insert_query
+        assert params == (5,)
+        mock_mysql.connection.commit.assert_called_once()
+        assert not mock_mysql.connection.rollback.called
+        mock_cursor.close.assert_called_once()
+
+def test_refresh_stock_risk_rolls_back_on_failure():
+    with patch('jobs.mysql') as mock_mysql:
+        mock_cursor = MagicMock()
+        # the DELETE went through, the rebuild didn't: the old set must survive
+        mock_cursor.execute.side_effect = [None, Exception("Lock wait timeout exceeded")]
+        mock_mysql.connection.cursor.return_value = mock_cursor
+
+        with pytest.raises(Exception, match="Lock wait timeout"):
+            refresh_stock_risk_once()
+
+        mock_mysql.connection.rollback.assert_called_once()
+        assert not mock_mysql.connection.commit.called
+        mock_cursor.close.assert_called_once()
@@ -0,0 +1,49 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from app import app
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    with patch('routes.search_routes.mysql') as mock_mysql:
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_conn.cursor.return_value = mock_cursor
+        mock_mysql.connection = mock_conn
+        yield app.test_client(), mock_cursor
+
+def test_search_ranks_and_paginates(client):
+    test_client, mock_cursor = client
+    mock_cursor.fetchall.return_value = [
+        ("doctor", 7, "Dr. Alice Nguyen", "Cardiologist", 3.2),
+        ("post", 42, "Keto Salmon Bowl", "Low carb lunch", 1.9),
+        ("meal", 5, "Salmon", "Baked salmon", 1.1),
+    ]
+
+    response = test_client.get('/search?q=salmon&limit=2')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [(r["type"], r["id"]) for r in data["results"]] == [("doctor", 7), ("post", 42)]
+    assert data["next_cursor"]
+
+    query, params = mock_cursor.execute.call_args[0]
+    assert query.count("MATCH(") == 6
+    assert params[-1] == 3
+
+def test_search_single_type(client):
+    test_client, mock_cursor = client
+    mock_cursor.fetchall.return_value = []
+
+    response = test_client.get('/search?q=salmon&type=meal')
+
+    assert response.status_code == 200
+    assert response.get_json() == {"results": [], "next_cursor": None}
+    query, params = mock_cursor.execute.call_args[0]
+    assert "FROM MEAL m" in query and "FROM DOCTOR d" not in query
+    assert params == ("salmon", "salmon", 21)
+
+def test_search_requires_query(client):
+    test_client, _ = client
+    assert test_client.get('/search').status_code == 400
+    assert test_client.get('/search?q=salmon&type=pharmacy').status_code == 400